@@ -1,6 +1,12 @@
+import os  # Import os to read the configuration from the environment
 from dash import Dash, html, dcc
 import dash
 import dash_bootstrap_components as dbc  # Import Bootstrap components for Dash
+from flask_compress import Compress  # Import Flask-Compress to compress the responses
+from utils.startup import time_page_imports, start_warmup, format_startup_report, REPORT_ENABLED  # Import the startup helpers
+from utils.metrics import instrument_app  # Import the callback instrumentation
+from utils.jobs import JOB_MANAGER, start_job_server  # Import the background job pool of the heavy callbacks
+from utils.memory_report import register_admin_routes  # Import the memory report endpoint
 
 # List of external CSS stylesheets to be used in the app, including Bootstrap for layout and custom CSS for additional styling
 external_css = [
@@ -9,8 +15,47 @@ external_css = [
     "assets/custom.css"  # 'custom.css' should be located in the 'assets' folder for custom styles
 ]
 
+# Set G21_COMPRESS=0 to send the responses uncompressed (e.g. when a reverse proxy already compresses them)
+COMPRESS_ENABLED = os.environ.get('G21_COMPRESS', '1') != '0'
+
+# Set G21_DEBUG=0 to run the development server without debug mode (and without its code reloader)
+DEBUG = os.environ.get('G21_DEBUG', '1') == '1'
+
+# With the debug reloader, 'python app.py' runs in a process watching the code and again in the serving process
+# it restarts (WERKZEUG_RUN_MAIN set). Only the serving process loads the data and starts the job server.
+SERVING = not (__name__ == '__main__' and DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true')
+
 # Initialize the Dash app with the specified external stylesheets and enable multi-page functionality using 'pages_folder' and 'use_pages'
-app = Dash(__name__, pages_folder='pages', use_pages=True, external_stylesheets=external_css)
+# (the import time of every page is measured for the startup report)
+with time_page_imports():
+    app = Dash(__name__, pages_folder='pages', use_pages=True, external_stylesheets=external_css, compress=False,
+               background_callback_manager=JOB_MANAGER)
+
+# Compress the responses with Brotli or gzip, whichever the browser accepts (Brotli for streamed responses).
+# Dash's compress option only enables gzip because Brotli's default level is slow; level 4 is about as fast as
+# gzip and still smaller. Flask-Compress reads the algorithms when it starts, so it is set up here after them
+# rather than through Dash. Tiny responses are left as they are.
+if COMPRESS_ENABLED:
+    app.server.config.update(COMPRESS_ALGORITHM=['br', 'gzip'], COMPRESS_ALGORITHM_STREAMING=['br'],
+                             COMPRESS_BR_LEVEL=4, COMPRESS_LEVEL=6, COMPRESS_MIN_SIZE=500)
+    Compress(app.server)
+
+# Time every callback (Server-Timing response header and Prometheus metrics on /metrics); G21_METRICS=0 switches it off
+instrument_app(app)
+
+# Memory used by the loaded datasets, by dataset, column and page, on /admin/memory
+register_admin_routes(app)
+
+# The pages only register their data at import; load it in a background thread so startup does not wait for it
+if SERVING:
+    start_warmup()
+
+# Run the heavy callbacks (network graph, word cloud) in a pool of worker processes, so they do not hold up the
+# cheap ones; a job is cancelled when the same callback is triggered again. G21_BACKGROUND=0 switches it off.
+if SERVING:
+    start_job_server()
+if REPORT_ENABLED and SERVING:
+    print(format_startup_report())
 
 # Create an image element for the brand logo (GrrenPulse), specifying the source, width, and margin classes for styling
 img_tag = html.Img(src="assets/greenpulse.png", width=25, className="m-1")
@@ -43,6 +88,7 @@ app.layout = html.Div([
     ], className="page-container")  # Center the main content with responsive column class
 ], style={"height": "100vh", "background-color": "#f8f9fa"})  # Set the overall background color and height of the page
 
-# Start the Dash app server in debug mode, allowing for live updates on code changes
+# Start the Dash development server, in debug mode by default (allowing for live updates on code changes).
+# For production use the WSGI entry point instead: gunicorn -c gunicorn.conf.py
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=DEBUG)
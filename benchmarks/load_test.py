@@ -0,0 +1,337 @@
+import argparse  # Import argparse for the command line interface
+import json  # Import json to build the requests and save the results
+import math  # Import math for the percentile rank
+import os  # Import os for file paths and environment variables
+import random  # Import random to vary the interactions of the virtual users
+import statistics  # Import statistics for the latency percentiles
+import subprocess  # Import subprocess to start the app under test
+import sys  # Import sys to find the Python interpreter
+import threading  # Import threading to share the results between the virtual users
+import time  # Import time to measure latencies and the test duration
+import urllib.error  # Import urllib.error to count failed requests
+import urllib.parse  # Import urllib.parse for the job polling URLs
+import urllib.request  # Import urllib.request to call the app (no extra dependency)
+from concurrent.futures import ThreadPoolExecutor  # Import ThreadPoolExecutor to run the virtual users
+from datetime import datetime  # Import datetime to name the result files
+
+from benchmarks.synthetic_data import COUNTRIES, ENERGY_SOURCES  # Import the values used by the datasets
+
+# Repository root, where the app is started from
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default folder of the result files
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+####################### SCENARIOS ###############################
+# Interaction sequences of each page. A step is (callback name, output of the callback, changed input,
+# input values); inputs that are not given are sent as None, like Dash does for unset properties.
+NETWORK_ENERGIES = ['All', 'solar', 'wind', 'hydropower']
+NETWORK_SENTIMENTS = ['All', 'positive', 'negative']
+TREND_OUTPUT = ('..country-filter.options...country-filter.value...energy-filter.options...energy-filter.value'
+                '...line-graph.figure...year-range-slider.min...year-range-slider.max...year-range-slider.marks..')
+TREND_RESOLUTIONS = ['day', 'week', 'month']
+TREND_ROLLING = [3, 7, 30]
+
+
+def average_sentiment_session(rng):
+    steps = [('average_sentiment.update_bar_chart', 'policy-sentiment-bar-chart.figure', 'country-dropdown.value',
+              {'country-dropdown.value': 'All'})]
+    for country in rng.sample(COUNTRIES, len(COUNTRIES)) + ['All']:
+        steps.append(('average_sentiment.update_bar_chart', 'policy-sentiment-bar-chart.figure',
+                      'country-dropdown.value', {'country-dropdown.value': country}))
+    return steps
+
+
+def stackbar_session(rng):
+    output = '..sentiment_type_checklist.value...sentiment_chart.figure...sentiment_pie_chart.figure..'
+    steps = [('stackbar.update_charts', output, 'energy_type_dropdown.value',
+              {'energy_type_dropdown.value': 'Wind', 'sentiment_type_checklist.value': ['positive']})]
+    for energy in rng.sample(ENERGY_SOURCES, len(ENERGY_SOURCES)):
+        steps.append(('stackbar.update_charts', output, 'energy_type_dropdown.value',
+                      {'energy_type_dropdown.value': energy, 'sentiment_type_checklist.value': ['positive']}))
+        sentiment = rng.choice(['negative', 'neutral'])
+        steps.append(('stackbar.update_charts', output, 'sentiment_type_checklist.value',
+                      {'energy_type_dropdown.value': energy, 'sentiment_type_checklist.value': ['positive', sentiment]}))
+    return steps
+
+
+def trend_session(rng):
+    steps = [('Trend_energy.update_graph', TREND_OUTPUT, 'year-range-slider.value', {
+        'year-range-slider.value': [2018, 2024], 'trend-resolution.value': 'year', 'trend-rolling.value': 0})]
+    country, energy, years = 'All', 'All', [2018, 2024]
+    for _ in range(4):
+        changed = rng.choice(['country-filter.value', 'energy-filter.value', 'year-range-slider.value'])
+        if changed == 'country-filter.value':
+            country = rng.choice(['All'] + COUNTRIES)
+        elif changed == 'energy-filter.value':
+            energy = rng.choice(['All'] + ENERGY_SOURCES)
+        else:
+            start = rng.randint(2018, 2023)
+            years = [start, rng.randint(start + 1, 2024)]
+        steps.append(('Trend_energy.update_graph', TREND_OUTPUT, changed, {
+            'country-filter.value': country, 'energy-filter.value': energy, 'year-range-slider.value': years,
+            'trend-resolution.value': 'year', 'trend-rolling.value': 0}))
+    return steps
+
+
+# Daily, weekly and monthly counts with a rolling average, reported per resolution (the rollups of the finer
+# resolutions are the longest series of the page)
+def trend_resolution_session(rng):
+    values = {'country-filter.value': rng.choice(COUNTRIES), 'energy-filter.value': rng.choice(ENERGY_SOURCES),
+              'year-range-slider.value': [2018, 2024], 'trend-resolution.value': 'year', 'trend-rolling.value': 0}
+    steps = [('Trend_energy.update_graph', TREND_OUTPUT, 'country-filter.value', dict(values))]
+    for resolution in rng.sample(TREND_RESOLUTIONS, len(TREND_RESOLUTIONS)):
+        name = f'Trend_energy.update_graph[{resolution}]'
+        values.update({'trend-resolution.value': resolution, 'trend-rolling.value': rng.choice(TREND_ROLLING)})
+        steps.append((name, TREND_OUTPUT, 'trend-resolution.value', dict(values)))
+        values['trend-rolling.value'] = rng.choice(TREND_ROLLING)
+        steps.append((name, TREND_OUTPUT, 'trend-rolling.value', dict(values)))
+        start = rng.randint(2018, 2023)
+        values['year-range-slider.value'] = [start, rng.randint(start + 1, 2024)]
+        steps.append((name, TREND_OUTPUT, 'year-range-slider.value', dict(values)))
+    return steps
+
+
+def network_session(rng):
+    energy, sentiment = 'All', 'All'
+    steps = [('network.update_graph', 'network-graph.figure', 'energy-dropdown.value',
+              {'energy-dropdown.value': energy, 'sentiment-dropdown.value': sentiment})]
+    for _ in range(3):
+        changed = rng.choice(['energy-dropdown.value', 'sentiment-dropdown.value'])
+        if changed == 'energy-dropdown.value':
+            energy = rng.choice(NETWORK_ENERGIES)
+        else:
+            sentiment = rng.choice(NETWORK_SENTIMENTS)
+        steps.append(('network.update_graph', 'network-graph.figure', changed,
+                      {'energy-dropdown.value': energy, 'sentiment-dropdown.value': sentiment}))
+    return steps
+
+
+def wordcloud_session(rng):
+    output = '..wordcloud-img.src...bar-chart.figure..'
+    return [('wordcloud.update_visualizations', output, 'source-selector.value', {'source-selector.value': source})
+            for source in ['reddit', 'twitter', 'reddit']]
+
+
+def dataset_session(rng):
+    output = ('..dataset-table.columns...dataset-table.data...dataset-table.page_count'
+              '...dataset-table-container.style...dataset-error.children..')
+    table = {'load-dataset-btn.n_clicks': 1, 'dataset-table.page_current': 0, 'dataset-table.page_size': 25,
+             'dataset-table.sort_by': [], 'dataset-table.filter_query': ''}
+    steps = [('dataset.update_table', output, 'load-dataset-btn.n_clicks', dict(table))]
+    for _ in range(2):
+        table['dataset-table.page_current'] += rng.randint(1, 5)
+        steps.append(('dataset.update_table', output, 'dataset-table.page_current', dict(table)))
+    table['dataset-table.sort_by'] = [{'column_id': rng.choice(['comment_date', 'country', 'energy_source']),
+                                      'direction': rng.choice(['asc', 'desc'])}]
+    steps.append(('dataset.update_table', output, 'dataset-table.sort_by', dict(table)))
+    table['dataset-table.filter_query'] = f'{{country}} eq "{rng.choice(COUNTRIES)}"'
+    table['dataset-table.page_current'] = 0
+    steps.append(('dataset.update_table', output, 'dataset-table.filter_query', dict(table)))
+    return steps
+
+
+SCENARIOS = {
+    'average_sentiment': average_sentiment_session,
+    'stackbar': stackbar_session,
+    'Trend_energy': trend_session,
+    'Trend_resolutions': trend_resolution_session,
+    'network': network_session,
+    'wordcloud': wordcloud_session,
+    'dataset': dataset_session,
+}
+
+
+####################### REQUESTS ###############################
+# Read the callback definitions of the app, by output, to send the inputs and state each callback expects
+def fetch_dependencies(url):
+    with urllib.request.urlopen(url + '/_dash-dependencies', timeout=30) as response:
+        return {dep['output']: dep for dep in json.load(response)}
+
+
+# Split an "id.property" string of the callback definitions
+def split_prop(prop_id):
+    component_id, prop = prop_id.rsplit('.', 1)
+    return {'id': component_id, 'property': prop}
+
+
+# Build the body Dash's renderer posts to /_dash-update-component for one step
+def callback_payload(dependency, changed, values):
+    output = dependency['output']
+    if output.startswith('..'):
+        outputs = [split_prop(prop_id) for prop_id in output[2:-2].split('...')]
+    else:
+        outputs = split_prop(output)
+    return {
+        'output': output,
+        'outputs': outputs,
+        'inputs': [dict(prop, value=values.get(f"{prop['id']}.{prop['property']}")) for prop in dependency['inputs']],
+        'state': [dict(prop, value=values.get(f"{prop['id']}.{prop['property']}")) for prop in dependency['state']],
+        'changedPropIds': [changed],
+    }
+
+
+# Post one callback request; returns (latency in seconds, response bytes, error or None).
+# A background callback answers with a job id first; its result is polled every 'poll_interval' seconds,
+# like the browser does, and the latency runs until the result arrives.
+def post_callback(url, payload, timeout, poll_interval=1.0):
+    data = json.dumps(payload).encode('utf-8')
+    endpoint = url + '/_dash-update-component'
+    start = time.perf_counter()
+    try:
+        while True:
+            request = urllib.request.Request(endpoint, data=data, headers={'Content-Type': 'application/json'},
+                                             method='POST')
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                body = response.read()
+            reply = json.loads(body) if body else {}
+            if 'cacheKey' in reply:
+                endpoint += '?' + urllib.parse.urlencode({'cacheKey': reply['cacheKey'], 'job': reply['job']})
+            elif not (reply.get('multi') and len(reply) == 1):
+                return time.perf_counter() - start, len(body), None
+            if time.perf_counter() - start > timeout:
+                return time.perf_counter() - start, 0, "Timeout"
+            time.sleep(poll_interval)  # The job is still running
+    except urllib.error.HTTPError as e:
+        return time.perf_counter() - start, 0, f"HTTP {e.code}"
+    except Exception as e:
+        return time.perf_counter() - start, 0, type(e).__name__
+
+
+####################### LOAD TEST ###############################
+# Run 'concurrency' virtual users for 'duration' seconds. Each user repeatedly picks a page and replays one
+# interaction sequence of it, waiting 'think_time' seconds (on average) between two interactions.
+def run_load_test(url, pages, concurrency, duration, think_time=0.0, timeout=60, seed=42):
+    dependencies = fetch_dependencies(url)
+    available = []
+    for page in pages:
+        sample = SCENARIOS[page](random.Random(0))
+        dependency = dependencies.get(sample[0][1])
+        if dependency is None or dependency.get('clientside_function'):
+            print(f"Skipping {page}: its callback does not run on the server")
+            continue
+        available.append(page)
+    if not available:
+        raise SystemExit("No server-side callback to test")
+
+    samples = {}  # callback name -> list of (latency, bytes, error)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def virtual_user(user):
+        rng = random.Random(seed + user)
+        while time.perf_counter() < deadline:
+            for name, output, changed, values in SCENARIOS[rng.choice(available)](rng):
+                if time.perf_counter() >= deadline:
+                    return
+                dependency = dependencies[output]
+                poll_interval = (dependency.get('long') or {}).get('interval', 1000) / 1000
+                result = post_callback(url, callback_payload(dependency, changed, values), timeout, poll_interval)
+                with lock:
+                    samples.setdefault(name, []).append(result)
+                if think_time:
+                    time.sleep(rng.expovariate(1 / think_time))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(virtual_user, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed)
+
+
+# Value at a percentile of sorted latencies (nearest rank)
+def percentile(latencies, q):
+    return latencies[max(0, math.ceil(q / 100 * len(latencies)) - 1)]
+
+
+# Latency percentiles, throughput and error rate of every callback, and of all of them together
+def summarize(samples, elapsed):
+    def stats(results):
+        latencies = sorted(latency * 1000 for latency, _, error in results if error is None)
+        errors = [error for _, _, error in results if error is not None]
+        summary = {
+            'requests': len(results),
+            'throughput_rps': len(results) / elapsed,
+            'error_rate': len(errors) / len(results),
+            'errors': {error: errors.count(error) for error in set(errors)},
+        }
+        if latencies:
+            summary.update({
+                'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99), 'mean_ms': statistics.fmean(latencies),
+                'mean_response_bytes': statistics.fmean(size for _, size, error in results if error is None),
+            })
+        return summary
+
+    callbacks = {name: stats(results) for name, results in sorted(samples.items())}
+    everything = [result for results in samples.values() for result in results]
+    return {'duration_s': elapsed, 'callbacks': callbacks, 'total': stats(everything) if everything else {}}
+
+
+# Print the summary as a table
+def print_summary(summary):
+    print(f"\n  {'callback':<36}{'requests':>9}{'req/s':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(summary['callbacks'].items()) + [('total', summary['total'])]
+    for name, stats in rows:
+        if not stats:
+            continue
+        print(f"  {name:<36}{stats['requests']:>9}{stats['throughput_rps']:>8.1f}{stats['error_rate']:>8.1%}"
+              f"{stats.get('p50_ms', 0):>9.0f}{stats.get('p95_ms', 0):>9.0f}{stats.get('p99_ms', 0):>9.0f}")
+
+
+####################### APP UNDER TEST ###############################
+# Start the production server (gunicorn) with the given number of workers and threads, and wait until it answers
+def start_app(url, workers, threads, wait=120):
+    bind = url.split('://', 1)[-1]
+    env = dict(os.environ, G21_BIND=bind, G21_WORKERS=str(workers), G21_THREADS=str(threads))
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=ROOT, env=env)
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The app exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(url + '/_dash-dependencies', timeout=5).close()
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"The app did not answer on {url} within {wait} seconds")
+
+
+# Command line entry point: python -m benchmarks.load_test [--start --workers 4] [--concurrency 1 8 32]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay page interactions against the Dash callback endpoint.")
+    parser.add_argument('--url', default='http://127.0.0.1:8050', help="Address of the app")
+    parser.add_argument('--pages', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS), help="Pages to replay")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help="Numbers of virtual users to run")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Mean pause between two interactions, in seconds")
+    parser.add_argument('--timeout', type=float, default=60, help="Request timeout, in seconds")
+    parser.add_argument('--start', action='store_true', help="Start the app with gunicorn before the test")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Gunicorn workers, with --start")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker, with --start")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+    url = args.url.rstrip('/')
+
+    process = start_app(url, args.workers, args.threads) if args.start else None
+    try:
+        results = {'created': datetime.now().isoformat(timespec='seconds'), 'url': url, 'pages': args.pages,
+                   'think_time': args.think_time, 'levels': {}}
+        if args.start:
+            results.update(workers=args.workers, threads=args.threads)
+        for concurrency in args.concurrency:
+            print(f"\n{concurrency} virtual user(s) for {args.duration:.0f}s")
+            summary = run_load_test(url, args.pages, concurrency, args.duration, args.think_time, args.timeout)
+            print_summary(summary)
+            results['levels'][str(concurrency)] = summary
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
@@ -0,0 +1,158 @@
+import argparse  # Import argparse for the command line interface
+import json  # Import json to save the results
+import os  # Import os for file paths and environment variables
+import platform  # Import platform to record the machine the benchmark ran on
+import statistics  # Import statistics for the latency percentiles
+import subprocess  # Import subprocess to run each scale in a fresh Python process
+import sys  # Import sys to find the Python interpreter and the repository
+import tempfile  # Import tempfile for the generated datasets
+import time  # Import time to measure latencies
+import tracemalloc  # Import tracemalloc to measure the peak memory of a call
+from datetime import datetime  # Import datetime to name the result files
+
+# Repository root, so the app can be imported whatever the current directory is
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default folder of the result files
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+####################### CASES ###############################
+# The page callbacks to measure, as (case name, function without arguments).
+# The app is imported here, so this only runs in the worker process of a scale.
+def benchmark_cases():
+    sys.path.insert(0, ROOT)
+    import app  # noqa: F401 (imports and registers every page)
+    average_sentiment = sys.modules['pages.average_sentiment']
+    stackbar = sys.modules['pages.stackbar']
+    trend = sys.modules['pages.Trend_energy']
+    network = sys.modules['pages.network']
+    wordcloud = sys.modules['pages.wordcloud']
+    dataset = sys.modules['pages.dataset']
+    return [
+        ('average_sentiment.update_bar_chart[All]', lambda: average_sentiment.update_bar_chart('All')),
+        ('average_sentiment.update_bar_chart[UK]', lambda: average_sentiment.update_bar_chart('UK')),
+        ('stackbar.create_sentiment_chart[Wind]', lambda: stackbar.create_sentiment_chart('Wind')),
+        ('stackbar.create_country_sentiment_pie_chart[Wind,positive]',
+         lambda: stackbar.create_country_sentiment_pie_chart('Wind', 'positive')),
+        ('Trend_energy.update_graph[default]', lambda: trend.update_graph(None, None, [2018, 2024])),
+        ('network.create_network_graph[all,all]',
+         lambda: network.create_network_graph(network.energy_types, ['positive', 'negative'])),
+        ('wordcloud.update_visualizations[reddit]', lambda: wordcloud.update_visualizations('reddit')),
+        ('wordcloud.get_wordcloud_png[reddit]', lambda: wordcloud.get_wordcloud_png('reddit')[1]),
+        ('dataset.update_table[first page]', lambda: dataset.update_table(1)),
+        ('dataset.update_table[filtered, sorted, page 10]', lambda: dataset.update_table(
+            1, 10, 25, [{'column_id': 'comment_date', 'direction': 'desc'}], '{sentiment} eq "positive"')),
+    ]
+
+
+# Size in bytes of the response Dash would send for a callback output
+def payload_size(output):
+    from plotly.utils import PlotlyJSONEncoder
+    if isinstance(output, bytes):
+        return len(output)
+    return len(json.dumps(output, cls=PlotlyJSONEncoder).encode('utf-8'))
+
+
+# Measure one case: the first (cold) call, 'repeats' warm calls and the peak memory allocated by a call
+def measure(func, repeats):
+    start = time.perf_counter()
+    output = func()
+    cold = time.perf_counter() - start
+
+    warm = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        warm.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'cold_ms': cold * 1000,
+        'warm_median_ms': statistics.median(warm) * 1000 if warm else None,
+        'warm_p95_ms': sorted(warm)[int(0.95 * (len(warm) - 1))] * 1000 if warm else None,
+        'peak_memory_bytes': peak,
+        'payload_bytes': payload_size(output),
+    }
+
+
+# Worker process: measure every case against the datasets of G21_ASSETS_DIR and write the results to a JSON file
+def run_worker(output_path, repeats):
+    results = {}
+    for name, func in benchmark_cases():
+        try:
+            results[name] = measure(func, repeats)
+        except Exception as e:
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+    with open(output_path, 'w') as f:
+        json.dump(results, f)
+
+
+####################### RUNNER ###############################
+# Generate the datasets of a scale and measure them in a fresh process (so caches and memory start empty)
+def run_scale(scale, repeats, work_dir):
+    from benchmarks.synthetic_data import generate
+    assets_dir = os.path.join(work_dir, f'scale_{scale}')
+    rows = generate(assets_dir, scale)
+
+    output_path = os.path.join(work_dir, f'results_{scale}.json')
+    env = dict(os.environ, G21_ASSETS_DIR=assets_dir, G21_MEMO_BACKEND='off', G21_WARMUP='0',
+               G21_PRECOMPUTE_LAYOUTS='0', G21_CLIENTSIDE='0', G21_BACKGROUND='0')
+    subprocess.run([sys.executable, '-m', 'benchmarks.run_benchmarks', '--worker', output_path,
+                    '--repeats', str(repeats)], cwd=ROOT, env=env, check=True)
+    with open(output_path) as f:
+        return {'rows': rows, 'cases': json.load(f)}
+
+
+# Print the results of a run, with the change of the warm latency against a previous run when given
+def print_results(results, previous=None):
+    for scale, scale_results in results['scales'].items():
+        print(f"\nScale {scale}x ({scale_results['rows']} comments)")
+        print(f"  {'case':<58}{'cold ms':>10}{'warm ms':>10}{'peak KB':>10}{'payload KB':>12}{'vs prev':>9}")
+        for name, case in scale_results['cases'].items():
+            if 'error' in case:
+                print(f"  {name:<58}  {case['error']}")
+                continue
+            change = ''
+            old = ((previous or {}).get('scales', {}).get(scale, {}).get('cases', {}).get(name) or {})
+            if old.get('warm_median_ms') and case['warm_median_ms']:
+                change = f"{case['warm_median_ms'] / old['warm_median_ms']:.2f}x"
+            print(f"  {name:<58}{case['cold_ms']:>10.1f}{case['warm_median_ms'] or 0:>10.1f}"
+                  f"{case['peak_memory_bytes'] / 1024:>10.0f}{case['payload_bytes'] / 1024:>12.1f}{change:>9}")
+
+
+# Command line entry point: python -m benchmarks.run_benchmarks [--scales 1 10 100 1000] [--compare OLD.json]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the page callbacks on synthetic data of several sizes.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000], help="Scale factors to run")
+    parser.add_argument('--repeats', type=int, default=5, help="Warm calls per case")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/benchmark-<time>.json)")
+    parser.add_argument('--compare', help="Previous result file to compare the warm latencies with")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)  # Internal: run the cases of one scale
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.repeats)
+        sys.exit(0)
+
+    results = {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+               'machine': platform.platform(), 'repeats': args.repeats, 'scales': {}}
+    with tempfile.TemporaryDirectory(prefix='g21-bench-') as work_dir:
+        for scale in args.scales:
+            results['scales'][str(scale)] = run_scale(scale, args.repeats, work_dir)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    print(f"\nResults saved to {output}")
@@ -0,0 +1,89 @@
+import argparse  # Import argparse for the command line interface
+import os  # Import os for file paths
+import numpy as np  # Import numpy for fast random data generation
+import pandas as pd  # Import pandas to write the CSV files
+
+# Number of comments of the 1x dataset; a scale factor multiplies it
+BASE_ROWS = 1000
+
+# Number of distinct words in the word frequency files of the 1x dataset
+BASE_VOCABULARY = 500
+
+COUNTRIES = ['Australia', 'UK', 'France']
+POLICIES = ['net zero', 'carbon tax', 'feed-in tariff', 'renewable energy target', 'emissions trading']
+ENERGY_SOURCES = ['Wind', 'Solar', 'Hydropower']
+SENTIMENTS = ['positive', 'neutral', 'negative']
+
+# Words the comments are made of: the keywords of the Network page, look-alike words that must not match
+# them on word boundaries ('window', 'glossy', ...) and filler words
+KEYWORDS = ['solar', 'wind', 'hydropower', 'growth', 'innovation', 'opportunity', 'progress', 'clean', 'advantage',
+            'crisis', 'loss', 'failure', 'challenge', 'risk', 'pollution']
+LOOKALIKES = ['window', 'windy', 'solaris', 'glossy', 'risky', 'cleaner', 'progressive']
+FILLERS = ['the', 'a', 'energy', 'policy', 'government', 'price', 'grid', 'tax', 'jobs', 'power', 'bill', 'farm',
+           'panel', 'turbine', 'dam', 'future', 'cost', 'support', 'plan', 'community']
+VOCABULARY = np.array(KEYWORDS + LOOKALIKES + FILLERS)
+
+
+# Random comments of 8 to 30 words
+def make_comments(rng, n):
+    lengths = rng.integers(8, 31, n)
+    words = VOCABULARY[rng.integers(0, len(VOCABULARY), lengths.sum())]
+    ends = np.cumsum(lengths)
+    return [' '.join(words[end - length:end]) for end, length in zip(ends, lengths)]
+
+
+# Random dates between 2018 and 2024 in the dd/mm/YYYY format of the source files
+def make_dates(rng, n):
+    days = rng.integers(0, (pd.Timestamp('2024-12-31') - pd.Timestamp('2018-01-01')).days + 1, n)
+    return (pd.Timestamp('2018-01-01') + pd.to_timedelta(days, unit='D')).strftime('%d/%m/%Y')
+
+
+# Write the five CSV files of the app (same schemas as the real ones) at a scale factor into assets_dir
+def generate(assets_dir, scale=1, seed=42):
+    os.makedirs(assets_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n = BASE_ROWS * scale
+    comments = make_comments(rng, n)
+    dates = make_dates(rng, n)
+
+    pd.DataFrame({
+        'Country': rng.choice(COUNTRIES, n),
+        'policy': rng.choice(POLICIES, n),
+        'comment': comments,
+        'compound': rng.uniform(-1, 1, n).round(4),
+    }).to_csv(os.path.join(assets_dir, 'reddit_comments.csv'), index=False)
+
+    pd.DataFrame({
+        'comment': comments,
+        'country': rng.choice(COUNTRIES, n),
+        'energy_source': rng.choice(ENERGY_SOURCES, n),
+        'sentiment': rng.choice(SENTIMENTS, n),
+        'comment_date': dates,
+    }).to_csv(os.path.join(assets_dir, 'energy_column_data.csv'), index=False)
+
+    pd.DataFrame({
+        'comment_date': dates,
+        'country': rng.choice(COUNTRIES, n),
+        'energy_source': rng.choice(ENERGY_SOURCES, n),
+        'sentiment': rng.choice(['positive', 'negative'], n),
+    }).to_csv(os.path.join(assets_dir, 'trend_data.csv'), index=False)
+
+    vocabulary_size = BASE_VOCABULARY * scale
+    words = list(VOCABULARY) + [f'word{i}' for i in range(vocabulary_size - len(VOCABULARY))]
+    for name in ['tweets_word_frequency.csv', 'reddit_word_frequency.csv']:
+        pd.DataFrame({
+            'word': words,
+            'frequency': rng.zipf(1.5, len(words)).clip(max=10 ** 6),  # Long-tailed like real word counts
+        }).to_csv(os.path.join(assets_dir, name), index=False)
+    return n
+
+
+# Command line entry point: python -m benchmarks.synthetic_data OUTPUT_DIR --scale 10
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic datasets with the schemas of the app.")
+    parser.add_argument('assets_dir', help="Folder to write the CSV files to")
+    parser.add_argument('--scale', type=int, default=1, help=f"Scale factor ({BASE_ROWS} comments at 1x)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rows = generate(args.assets_dir, args.scale, args.seed)
+    print(f"Wrote {rows} comments to {args.assets_dir}")
@@ -0,0 +1,14 @@
+import multiprocessing  # Import multiprocessing to count the CPU cores
+import os  # Import os to read the configuration from the environment
+
+# Production server settings, read from the environment: 'gunicorn -c gunicorn.conf.py'
+wsgi_app = 'wsgi:server'
+bind = os.environ.get('G21_BIND', '0.0.0.0:8050')  # Address and port to listen on
+workers = int(os.environ.get('G21_WORKERS', multiprocessing.cpu_count()))  # Worker processes (one per core by default)
+threads = int(os.environ.get('G21_THREADS', '4'))  # Threads per worker process
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('G21_TIMEOUT', '120'))  # Seconds before a busy worker is restarted
+
+# Import the app (and load the data) once in the master process before forking the workers,
+# so all workers share the loaded data copy-on-write
+preload_app = True
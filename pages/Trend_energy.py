@@ -1,13 +1,40 @@
 import plotly.graph_objs as go  # Import Plotly for creating interactive visualizations
 from dash import dcc, html  # Import Dash components for layout and interactivity
 from dash.dependencies import Input, Output  # Import Input and Output for callbacks
-import pandas as pd  # Import pandas for data manipulation
 import dash  # Import Dash framework for building the web app
 import dash_bootstrap_components as dbc  # Import Bootstrap components for better styling
+from utils.aggregates import RESOLUTIONS, get_aggregate, get_trend_cube, trend_rollup, trend_slice  # Import the cached sentiment cube
+from utils.clientside import CLIENTSIDE_MODE, figure_json  # Import the client-side mode settings
+from utils.compact_figures import compact_figure  # Import the compact figure encoding
+from utils.startup import register_warmup  # Import the background warm-up registry
 
 # Register the page in a multi-page Dash app
 dash.register_page(__name__, path='/Trend_energy', name="Trends", order=2)
 
+# Labels of the time resolutions and the rolling average windows (in periods of the resolution)
+resolution_labels = {'day': 'Day', 'week': 'Week', 'month': 'Month', 'year': 'Year'}
+rolling_options = [{'label': 'Off', 'value': 0}] + [{'label': f'{window} periods', 'value': window} for window in [3, 7, 30]]
+
+# Resolution and rolling average controls (the client-side mode only shows the yearly counts it stores)
+resolution_controls = [] if CLIENTSIDE_MODE else [
+    dbc.Label("Resolution", style={'font-size': '16px', 'font-weight': 'bold'}),
+    dbc.RadioItems(
+        id='trend-resolution',
+        options=[{'label': label, 'value': resolution} for resolution, label in resolution_labels.items()],
+        value='year',  # Default to yearly counts
+        inline=True,
+        className="mb-3"
+    ),
+    dbc.Label("Rolling Average", style={'font-size': '16px', 'font-weight': 'bold'}),
+    dcc.Dropdown(
+        id='trend-rolling',
+        options=rolling_options,
+        value=0,  # Default to the counts themselves
+        clearable=False,
+        style={'border-radius': '8px', 'background-color': '#f7f7f7'}
+    )
+]
+
 # Define the layout for this page
 layout = dbc.Container([
     # Title and description row
@@ -17,7 +44,7 @@ layout = dbc.Container([
     ]),
     dbc.Row([
         dbc.Col(html.P(
-            "Use the filters below to explore sentiment trends across countries and energy sources from 2018 to 2024.",
+            "Use the filters below to explore sentiment trends across countries and energy sources, by day, week, month or year.",
             className="text-center mb-4", style={'font-size': '18px', 'color': '#6c757d'}
         ), width=12),
     ]),
@@ -66,7 +93,7 @@ layout = dbc.Container([
                         tooltip={"placement": "bottom", "always_visible": True},
                         allowCross=False  # Disable crossing of year range handles
                     )
-                ])
+                ] + resolution_controls)
             )
         ], width=6),
     ], className="mb-4"),
@@ -93,75 +120,62 @@ layout = dbc.Container([
     ]),
 ], fluid=True)  # fluid=True ensures the layout is responsive and uses the full page width
 
-# Callback function to update the dropdown filters and the line graph
-@dash.callback(
-    [Output('country-filter', 'options'),  # Dropdown options for country
-     Output('country-filter', 'value'),  # Default value for country
-     Output('energy-filter', 'options'),  # Dropdown options for energy source
-     Output('energy-filter', 'value'),  # Default value for energy source
-     Output('line-graph', 'figure')],  # Line graph figure
-    [Input('country-filter', 'value'),  # Input from selected country
-     Input('energy-filter', 'value'),  # Input from selected energy source
-     Input('year-range-slider', 'value')]  # Input from selected year range
-)
-def update_graph(selected_country, selected_energy, selected_years):
-    # Load the data inside the callback function
-    file_path = 'assets/trend_data.csv'  # Path to the CSV file containing sentiment data
+# Callback function to update the dropdown filters, the line graph and the range of the year slider
+# (registered as a callback below)
+def update_graph(selected_country, selected_energy, selected_years, resolution=None, rolling=None):
+    import pandas as pd  # Import pandas here, it is only needed when the callback runs
+    # Load the pre-aggregated sentiment cube (built once and rebuilt only when trend_data.csv changes)
     try:
-        df = pd.read_csv(file_path)
+        cube = get_trend_cube()
     except Exception as e:
-        return [{'label': 'Error', 'value': 'Error'}], 'Error', [], 'Error', go.Figure()
-
-    # Convert 'comment_date' to datetime and extract year from it
-    df['comment_date'] = pd.to_datetime(df['comment_date'], format='%d/%m/%Y', errors='coerce')
-    df['year'] = df['comment_date'].dt.year
-
-    # Drop rows with missing year data and convert 'year' to integers
-    df = df.dropna(subset=['year'])
-    df['year'] = df['year'].astype(int)
-
-    # Group the data by year, country, energy source, and sentiment
-    sentiment_trends = df.groupby(['year', 'country', 'energy_source', 'sentiment']).size().unstack(fill_value=0).reset_index()
-
-    # Create country options for the dropdown
-    country_options = [{'label': country, 'value': country} for country in sentiment_trends['country'].unique()]
-    
-    # Create energy source options for the dropdown
-    energy_options = [{'label': energy, 'value': energy} for energy in sentiment_trends['energy_source'].unique()]
+        return [{'label': 'Error', 'value': 'Error'}], 'Error', [], 'Error', go.Figure(), 2018, 2024, {}
 
     # Set default values if none are selected
     if not selected_country:
-        selected_country = country_options[0]['value']  # Default to first available country
+        selected_country = cube['countries'][0]  # Default to first available country
 
     if not selected_energy:
-        selected_energy = energy_options[0]['value']  # Default to first available energy source
+        selected_energy = cube['energy_sources'][0]  # Default to first available energy source
 
-    # Filter the data based on selected country, energy source, and year range
-    filtered_data = sentiment_trends[
-        (sentiment_trends['country'] == selected_country) &
-        (sentiment_trends['energy_source'] == selected_energy) &
-        (sentiment_trends['year'] >= selected_years[0]) &
-        (sentiment_trends['year'] <= selected_years[1])
-    ]
+    # Create the dropdown options from the values stored in the cube (no scan of the data)
+    country_options = [{'label': country, 'value': country} for country in cube['countries']]
+    energy_options = [{'label': energy, 'value': energy} for energy in cube['energy_sources']]
+
+    # Counts of the selected country and energy source at the selected resolution (summed from the daily
+    # rollup once and cached), with their rolling average over the whole history so the first periods of the
+    # range average the periods before them, sliced to the selected year range
+    if resolution not in RESOLUTIONS:
+        resolution = 'year'
+    counts = trend_rollup(cube, selected_country, selected_energy, resolution)
+    if counts is None:
+        filtered_data = pd.DataFrame(columns=['year', 'positive', 'negative'])
+    else:
+        if rolling:
+            counts = counts[['positive', 'negative']].rolling(int(rolling), min_periods=1).mean()
+        counts = trend_slice(counts, resolution, selected_years)
+        filtered_data = counts.reset_index().rename(columns={counts.index.name: 'year'})
+    period = resolution_labels[resolution]
+    # Many points are drawn as plain lines (no markers or spline smoothing)
+    line_shape, mode = ('spline', 'lines+markers') if resolution in ('month', 'year') else ('linear', 'lines')
 
     # Create line traces for positive and negative sentiments, using smoothing for better visual
     fig = go.Figure()
     if not filtered_data.empty:
         # Trace for positive sentiment
         fig.add_trace(go.Scatter(
-            x=filtered_data['year'], y=filtered_data['positive'], mode='lines+markers',
-            name='Positive', 
-            line=dict(color='#28a745', width=4, shape='spline', smoothing=1.3),  # Green for positive sentiment
+            x=filtered_data['year'], y=filtered_data['positive'], mode=mode,
+            name='Positive' if not rolling else f'Positive ({rolling}-{period.lower()} average)', 
+            line=dict(color='#28a745', width=4, shape=line_shape, smoothing=1.3),  # Green for positive sentiment
             marker=dict(size=8),
-            hoverinfo='x+y+name', hovertemplate='<b>Year:</b> %{x}<br><b>Positive:</b> %{y}'
+            hoverinfo='x+y+name', hovertemplate=f'<b>{period}:</b> %{{x}}<br><b>Positive:</b> %{{y}}'
         ))
         # Trace for negative sentiment
         fig.add_trace(go.Scatter(
-            x=filtered_data['year'], y=filtered_data['negative'], mode='lines+markers',
-            name='Negative', 
-            line=dict(color='#dc3545', width=4, shape='spline', smoothing=1.3),  # Red for negative sentiment
+            x=filtered_data['year'], y=filtered_data['negative'], mode=mode,
+            name='Negative' if not rolling else f'Negative ({rolling}-{period.lower()} average)', 
+            line=dict(color='#dc3545', width=4, shape=line_shape, smoothing=1.3),  # Red for negative sentiment
             marker=dict(size=8),
-            hoverinfo='x+y+name', hovertemplate='<b>Year:</b> %{x}<br><b>Negative:</b> %{y}'
+            hoverinfo='x+y+name', hovertemplate=f'<b>{period}:</b> %{{x}}<br><b>Negative:</b> %{{y}}'
         ))
     else:
         fig.update_layout(title="No data for selected filters")
@@ -175,7 +189,7 @@ def update_graph(selected_country, selected_energy, selected_years):
         'yanchor': 'top',  # Anchor title to the top
     },
         title_font=dict(size=26, family='Arial', color='#1a3e72'),
-        xaxis_title="Year",
+        xaxis_title=period,
         xaxis_title_font=dict(size=18, family='Arial', color='#1a3e72'),
         yaxis_title="Sentiment Count",
         yaxis_title_font=dict(size=18, family='Arial', color='#1a3e72'),
@@ -183,7 +197,7 @@ def update_graph(selected_country, selected_energy, selected_years):
             tickmode='linear',
             dtick=1,    # Ensure ticks appear every year
             showgrid=True
-        ),
+        ) if resolution == 'year' else dict(type='date', showgrid=True),
         yaxis=dict(
             showgrid=True,  # Show gridlines for readability
             tickfont=dict(size=14, color='#1a3e72'),  # Font size for y-axis ticks
@@ -196,5 +210,95 @@ def update_graph(selected_country, selected_energy, selected_years):
         margin=dict(l=20, r=20, t=60, b=40)  # Margins around the figure
     )
 
-    # Return updated dropdown options, selected values, and the figure
-    return country_options, selected_country, energy_options, selected_energy, fig
+    # Range of the year slider: the years of the data
+    first_year, last_year = cube['years'] or (2018, 2024)
+    marks = {year: str(year) for year in range(first_year, last_year + 1)}
+
+    # Return updated dropdown options, selected values, the figure (compacted for the response) and the slider range
+    return (country_options, selected_country, energy_options, selected_energy, compact_figure(fig),
+            first_year, last_year, marks)
+
+####################### CLIENT-SIDE MODE ################################
+# Client-side version of update_graph: slices the stored yearly counts to the selected years
+# and fills the traces of the figure template
+UPDATE_GRAPH_JS = """
+function(selectedCountry, selectedEnergy, selectedYears, store) {
+    if (!store) {
+        return window.dash_clientside.no_update;
+    }
+    var country = selectedCountry || store.countries[0];
+    var energy = selectedEnergy || store.energy_sources[0];
+    var toOptions = function(values) { return values.map(function(value) { return {label: value, value: value}; }); };
+
+    var series = (store.series[country] || {})[energy] || {year: [], positive: [], negative: []};
+    var years = [], positive = [], negative = [];
+    series.year.forEach(function(year, i) {
+        if (year >= selectedYears[0] && year <= selectedYears[1]) {
+            years.push(year);
+            positive.push(series.positive[i]);
+            negative.push(series.negative[i]);
+        }
+    });
+
+    var figure = JSON.parse(JSON.stringify(store.figure));
+    if (years.length) {
+        figure.data[0].x = years;
+        figure.data[0].y = positive;
+        figure.data[1].x = years;
+        figure.data[1].y = negative;
+    } else {
+        figure.data = [];
+    }
+    figure.layout.title.text = 'Sentiment Trends in ' + country + ' for ' + energy;
+    return [toOptions(store.countries), country, toOptions(store.energy_sources), energy, figure];
+}
+"""
+
+# Compact data sent to the browser: the yearly positive and negative counts of each country and energy source,
+# and a figure of the server callback as a template
+def build_clientside_data(df):
+    cube = get_trend_cube()
+    series = {}
+    for country, energy in cube['daily']:
+        counts = trend_rollup(cube, country, energy, 'year')
+        series.setdefault(country, {})[energy] = {
+            'year': counts.index.tolist(), 'positive': counts['positive'].tolist(), 'negative': counts['negative'].tolist()}
+    country, energy = next(iter(cube['daily']), (None, None))
+    figure = figure_json(update_graph(country, energy, [2018, 2024])[4])
+    return {'countries': cube['countries'], 'energy_sources': cube['energy_sources'], 'series': series, 'figure': figure}
+
+# In client-side mode the graph is updated in the browser, otherwise by a server callback
+if CLIENTSIDE_MODE:
+    page_layout = layout
+
+    # Add the compact data to the page each time it is loaded
+    def layout(**kwargs):
+        data = get_aggregate('trend_clientside', 'trend_data', build_clientside_data)
+        return html.Div([page_layout, dcc.Store(id='trend-store', data=data)])
+
+    dash.clientside_callback(
+        UPDATE_GRAPH_JS,
+        [Output('country-filter', 'options'), Output('country-filter', 'value'), Output('energy-filter', 'options'),
+         Output('energy-filter', 'value'), Output('line-graph', 'figure')],
+        [Input('country-filter', 'value'), Input('energy-filter', 'value'), Input('year-range-slider', 'value'),
+         Input('trend-store', 'data')]
+    )
+else:
+    dash.callback(
+        [Output('country-filter', 'options'),  # Dropdown options for country
+         Output('country-filter', 'value'),  # Default value for country
+         Output('energy-filter', 'options'),  # Dropdown options for energy source
+         Output('energy-filter', 'value'),  # Default value for energy source
+         Output('line-graph', 'figure'),  # Line graph figure
+         Output('year-range-slider', 'min'),  # Range of the year slider
+         Output('year-range-slider', 'max'),
+         Output('year-range-slider', 'marks')],
+        [Input('country-filter', 'value'),  # Input from selected country
+         Input('energy-filter', 'value'),  # Input from selected energy source
+         Input('year-range-slider', 'value'),  # Input from selected year range
+         Input('trend-resolution', 'value'),  # Input from selected resolution
+         Input('trend-rolling', 'value')]  # Input from selected rolling average window
+    )(update_graph)
+
+# Build the sentiment cube in the background after startup
+register_warmup('Trend_energy', 'trend_cube', get_trend_cube)
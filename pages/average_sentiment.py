@@ -1,69 +1,68 @@
-import pandas as pd  # Import pandas for data manipulation
 import dash  # Import Dash for creating the web application
 from dash import dcc, html  # Import Dash components for layout
 from dash.dependencies import Input, Output  # Import Input and Output for creating callbacks
 import plotly.express as px  # Import Plotly Express for data visualization
 import dash_bootstrap_components as dbc  # Import Bootstrap components for styling
+from utils.data_store import get_dataset  # Import the shared dataset registry
+from utils.memo import memoize  # Import the callback output cache
+from utils.compact_figures import compact_figure  # Import the compact figure encoding
+from utils.aggregates import get_aggregate, get_policy_sentiment, CONFIDENCE  # Import the pre-computed sentiment moments
+from utils.clientside import CLIENTSIDE_MODE, figure_json  # Import the client-side mode settings
+from utils.startup import register_warmup  # Import the background warm-up registry
 
 # Registering the page for a multi-page Dash app with specific path and name
 dash.register_page(__name__, path='/average_sentiment', name="Average Sentiment", order=5)
 
-# Load the dataset containing Reddit comments with policy and sentiment analysis
-df = pd.read_csv("assets/reddit_comments.csv")
-
 ####################### PAGE LAYOUT #############################
 # Define the layout for the page using Dash Bootstrap Components for styling
-layout = dbc.Container([  # Create a responsive container for the page
-    # Header row with the title
-    dbc.Row([
-        dbc.Col(html.H1("Average Sentiment per Policy by Country", className="text-center text-primary mb-4"), width=12)
-    ]),
+# (a function, so the data is only needed when the page is displayed)
+def layout(**kwargs):
+    # Load the dataset containing Reddit comments with policy and sentiment analysis
+    df = get_dataset('reddit_comments')
+
+    return dbc.Container([  # Create a responsive container for the page
+        # Header row with the title
+        dbc.Row([
+            dbc.Col(html.H1("Average Sentiment per Policy by Country", className="text-center text-primary mb-4"), width=12)
+        ]),
     
-    # Row for the country selection dropdown
-    dbc.Row([ 
-        dbc.Col(dcc.Dropdown(
-            id='country-dropdown',  # Dropdown ID for use in the callback
-            options=[{'label': 'All', 'value': 'All'}] + [{'label': country, 'value': country} for country in df['Country'].unique()],  # Options: 'All' or individual countries
-            value='All',  # Default selected value is 'All'
-            clearable=False,  # Do not allow the user to clear the selection
-            style={'width': '50%'}  # Set the width of the dropdown
-        ), width=6)  # Set the dropdown width to 6 columns (half width)
-    ], justify="center", style={'margin-top': '20px'}),  # Center the dropdown and add margin for spacing
+        # Row for the country selection dropdown
+        dbc.Row([ 
+            dbc.Col(dcc.Dropdown(
+                id='country-dropdown',  # Dropdown ID for use in the callback
+                options=[{'label': 'All', 'value': 'All'}] + [{'label': country, 'value': country} for country in df['Country'].unique()],  # Options: 'All' or individual countries
+                value='All',  # Default selected value is 'All'
+                clearable=False,  # Do not allow the user to clear the selection
+                style={'width': '50%'}  # Set the width of the dropdown
+            ), width=6)  # Set the dropdown width to 6 columns (half width)
+        ], justify="center", style={'margin-top': '20px'}),  # Center the dropdown and add margin for spacing
     
-    # Row to display the bar chart for sentiment analysis
-    dbc.Row([ 
-        dbc.Col(dcc.Graph(id='policy-sentiment-bar-chart'), width=12)  # Create a column for the bar chart graph
-    ])
-], style={'backgroundColor': '#f8f9fa'})  # Set the background color for the page
+        # Row to display the bar chart for sentiment analysis
+        dbc.Row([ 
+            dbc.Col(dcc.Graph(id='policy-sentiment-bar-chart'), width=12)  # Create a column for the bar chart graph
+        ])
+    ], style={'backgroundColor': '#f8f9fa'})  # Set the background color for the page
 
 ####################### CALLBACKS ################################
-# Callback function to update the bar chart based on the selected country
-@dash.callback(
-    Output('policy-sentiment-bar-chart', 'figure'),  # The output is the figure for the bar chart
-    [Input('country-dropdown', 'value')]  # The input is the value from the country dropdown
-)
+# Hover text of a bar: average sentiment with its confidence interval (from the pre-computed moments) and comment count
+HOVER_TEMPLATE = f'<b>%{{y}}</b><br>Average Sentiment: %{{x:.3f}} ± %{{customdata[0]:.3f}} ({CONFIDENCE:.0%} CI)<br>Comments: %{{customdata[1]}}<extra></extra>'
+
+# Function to update the bar chart based on the selected country (registered as a callback below)
+@memoize('average_sentiment.update_bar_chart', ['reddit_comments'])  # Reuse the figure for the same country and data
 def update_bar_chart(selected_country):
-    # If 'All' is selected, use the entire dataset without filtering
-    if selected_country == 'All':
-        filtered_data = df
-    else:
-        # Filter the dataset based on the selected country
-        filtered_data = df[df['Country'] == selected_country]
-    
-    # Group the data by policy and calculate the average sentiment (compound score)
-    policy_avg_sentiment = filtered_data.groupby('policy')['compound'].mean().reset_index()
+    import pandas as pd  # Import pandas here, it is only needed when the callback runs
+    # Load the pre-computed policy averages of the selected country ('All' is the rollup of every comment):
+    # upper-case policy names, average compound score, number of comments and confidence interval, sorted
+    policy_avg_sentiment = get_policy_sentiment()['views'].get(selected_country)
+    if policy_avg_sentiment is None:
+        policy_avg_sentiment = pd.DataFrame(columns=['policy', 'compound', 'count', 'ci'])  # Unknown country
     
-    # Convert the policy names to uppercase for better readability
-    policy_avg_sentiment['policy'] = policy_avg_sentiment['policy'].str.upper()
-    
-    # Sort the data by the compound sentiment score in descending order
-    policy_avg_sentiment = policy_avg_sentiment.sort_values(by='compound', ascending=False)
-    
-    # Create a horizontal bar chart using Plotly Express
+    # Create a horizontal bar chart using Plotly Express, with the confidence interval as error bars
     fig = px.bar(
         policy_avg_sentiment,  # Data to visualize
         x='compound',  # X-axis is the average sentiment score
         y='policy',  # Y-axis is the policy name
+        error_x='ci',  # Half width of the confidence interval
         orientation='h',  # Create a horizontal bar chart
         labels={'compound': 'Average Sentiment (Compound Score)', 'policy': 'Policy'},  # Axis labels
         title=f'Average Sentiment per Policy in {selected_country}' if selected_country != 'All' else 'Average Sentiment per Policy for All Countries',  # Title based on selection
@@ -103,11 +102,64 @@ def update_bar_chart(selected_country):
         margin=dict(l=100, r=20, t=50, b=50)  # Set margins for the figure layout
     )
     
-    # Customize the hover info to show sentiment with 3 decimal places
+    # Customize the hover info to show sentiment with 3 decimal places, its confidence interval and the number of comments
     fig.update_traces(
-        hovertemplate='<b>%{y}</b><br>Average Sentiment: %{x:.3f}<extra></extra>',  # Set hover text format
-        marker_color='#3498db'  # Set the color of the bars
+        customdata=policy_avg_sentiment[['ci', 'count']].to_numpy(),
+        hovertemplate=HOVER_TEMPLATE,  # Set hover text format
+        marker_color='#3498db',  # Set the color of the bars
+        error_x_color='#2a3f5f'  # Set the color of the confidence intervals
     )
     
-    # Return the updated figure
-    return fig
+    # Return the updated figure, compacted for the response
+    return compact_figure(fig)
+
+####################### CLIENT-SIDE MODE ################################
+# Client-side version of update_bar_chart: fills the traces of the figure template with the stored averages
+UPDATE_BAR_CHART_JS = """
+function(selectedCountry, store) {
+    if (!store) {
+        return window.dash_clientside.no_update;
+    }
+    var rows = store.values[selectedCountry] || [];
+    var figure = JSON.parse(JSON.stringify(store.figure));
+    figure.data[0].x = rows.map(function(row) { return row[1]; });
+    figure.data[0].y = rows.map(function(row) { return row[0]; });
+    figure.data[0].error_x.array = rows.map(function(row) { return row[2]; });
+    figure.data[0].customdata = rows.map(function(row) { return [row[2], row[3]]; });
+    figure.layout.title.text = selectedCountry !== 'All' ?
+        'Average Sentiment per Policy in ' + selectedCountry : 'Average Sentiment per Policy for All Countries';
+    return figure;
+}
+"""
+
+# Compact data sent to the browser: the figure of 'All' as a template and the sorted policy averages of each country
+# (label, average, confidence interval half width, comment count), taken from the pre-computed moments
+def build_clientside_data(df):
+    values = {}
+    for country, averages in get_policy_sentiment()['views'].items():
+        rows = averages[['policy', 'compound', 'ci', 'count']].astype(object)
+        values[country] = rows.where(rows.notna(), None).values.tolist()  # Missing intervals become null
+    return {'figure': figure_json(update_bar_chart('All')), 'values': values}
+
+# In client-side mode the chart is updated in the browser, otherwise by a server callback
+if CLIENTSIDE_MODE:
+    page_layout = layout
+
+    # Add the compact data to the page each time it is loaded
+    def layout(**kwargs):
+        data = get_aggregate('average_sentiment_clientside', 'reddit_comments', build_clientside_data)
+        return html.Div([page_layout(**kwargs), dcc.Store(id='average-sentiment-store', data=data)])
+
+    dash.clientside_callback(
+        UPDATE_BAR_CHART_JS,
+        Output('policy-sentiment-bar-chart', 'figure'),
+        [Input('country-dropdown', 'value'), Input('average-sentiment-store', 'data')]
+    )
+else:
+    dash.callback(
+        Output('policy-sentiment-bar-chart', 'figure'),  # The output is the figure for the bar chart
+        [Input('country-dropdown', 'value')]  # The input is the value from the country dropdown
+    )(update_bar_chart)
+
+# Load the dataset in the background after startup
+register_warmup('average_sentiment', 'reddit_comments', lambda: get_dataset('reddit_comments'))
@@ -1,11 +1,23 @@
 import dash_bootstrap_components as dbc
-from dash import html, dcc
-import pandas as pd
+from dash import html, dcc, dash_table
 import dash
+import json
+from urllib.parse import urlencode
+from flask import Response, abort, request
 from dash.dependencies import Output, Input
+from utils.data_store import get_dataset
+from utils.table_query import EXPORT_FORMATS, export_view, get_page
+from utils.search_index import FACETS, STORED, search, update_index
+from utils.startup import register_warmup
 
 dash.register_page(__name__, path='/dataset', name="Dataset Explorer", order=6)
 
+# Number of rows sent to the browser for each page of the table
+PAGE_SIZE = 25
+
+# Dataset shown (and exported) by the page
+DATASET = "energy_column_data"
+
 ####################### PAGE LAYOUT #############################
 layout = html.Div(children=[
     html.Br(),
@@ -14,10 +26,56 @@ layout = html.Div(children=[
     # Add a button or dropdown to trigger the data loading
     dbc.Button("Load Dataset", id="load-dataset-btn", color="primary", className="d-block mx-auto"),
 
+    # Full-text search of the comments, best matches first, with the match count of every facet value
+    html.Div([
+        dbc.Row([
+            dbc.Col(dcc.Input(id="search-text", type="search", debounce=True, className="form-control",
+                              placeholder='Search comments: words, "exact phrases", prefix*'), md=6),
+        ] + [
+            dbc.Col(dcc.Dropdown(id=f"search-{facet}", placeholder=facet.replace("_", " ").capitalize()), md=2)
+            for facet in FACETS
+        ], className="g-2"),
+        html.Div(id="search-summary", className="text-muted small my-2"),
+        dash_table.DataTable(
+            id="search-results",
+            columns=[{"name": "comment", "id": "snippet", "presentation": "markdown"}]
+                    + [{"name": column, "id": column} for column in FACETS + STORED],
+            page_current=0,
+            page_size=PAGE_SIZE,
+            page_action="custom",
+            style_table={"overflowX": "auto"},
+            style_cell={"textAlign": "left", "maxWidth": "400px", "whiteSpace": "normal"},
+        ),
+    ], style={"margin-top": "30px"}),
+
     # Adding spinner while data is loading
     dbc.Spinner(  # Wrapping the content in dbc.Spinner
         children=[
-            html.Div(id="dataset-table", style={"margin-top": "70px"})  # Change ID to avoid conflict
+            html.Div(id="dataset-error", style={"margin-top": "20px"}),
+            # Table with paging, sorting and filtering done on the server: only the visible page is sent
+            html.Div([
+                # Download of the rows matching the current filters, in the current sort order
+                html.Div([
+                    dbc.RadioItems(id="export-format", value="csv", inline=True, className="me-3",
+                                   options=[{"label": "CSV", "value": "csv"},
+                                            {"label": "CSV (gzip)", "value": "csv.gz"},
+                                            {"label": "Parquet", "value": "parquet"}]),
+                    html.A("Download", id="export-link", className="btn btn-outline-primary btn-sm"),
+                ], className="d-flex align-items-center justify-content-end mb-2"),
+                dash_table.DataTable(
+                    id="dataset-table",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    page_action="custom",
+                    sort_action="custom",
+                    sort_mode="multi",
+                    sort_by=[],
+                    filter_action="custom",
+                    filter_query="",
+                    style_table={"overflowX": "auto"},
+                    style_cell={"textAlign": "left", "maxWidth": "400px", "whiteSpace": "normal"},
+                )
+            ], id="dataset-table-container", style={"display": "none", "margin-top": "50px"}),
         ],
         spinner_style={"width": "3rem", "height": "3rem"},  # Custom spinner size
         fullscreen=False  # Spinner is not full screen
@@ -26,31 +84,97 @@ layout = html.Div(children=[
 
 ####################### CALLBACK #############################
 @dash.callback(
-    Output("dataset-table", "children"),  # Change to "dataset-table" to avoid circular dependency
-    Input("load-dataset-btn", "n_clicks")  # Trigger when button is clicked
+    [Output("dataset-table", "columns"),
+     Output("dataset-table", "data"),
+     Output("dataset-table", "page_count"),
+     Output("dataset-table-container", "style"),
+     Output("dataset-error", "children")],
+    [Input("load-dataset-btn", "n_clicks"),  # Trigger when button is clicked
+     Input("dataset-table", "page_current"),
+     Input("dataset-table", "page_size"),
+     Input("dataset-table", "sort_by"),
+     Input("dataset-table", "filter_query")]
 )
-def update_table(n_clicks):
+def update_table(n_clicks, page_current=0, page_size=PAGE_SIZE, sort_by=None, filter_query=""):
     if n_clicks is None:
         # Return nothing if the button has not been clicked yet
-        return None
+        return [], [], 1, {"display": "none"}, None
 
-    # Load dataset in callback to avoid blocking the main thread
+    # Load dataset from the shared registry (parsed once per process)
     try:
-        df = pd.read_csv("assets/energy_column_data.csv", low_memory=False)
+        df = get_dataset(DATASET)
+        # Only the requested page of the filtered and sorted rows is sent to the browser
+        data, page_count, _ = get_page(DATASET, page_current or 0, page_size or PAGE_SIZE,
+                                       filter_query, sort_by)
     except Exception as e:
         # Return an error message if there's an issue with the dataset loading
-        return dbc.Alert(f"Error loading dataset: {str(e)}", color="danger")
-
-    # Creating Bootstrap Table header and body
-    table_header = [html.Thead(html.Tr([html.Th(col) for col in df.columns]))]
-    table_body = [html.Tbody([html.Tr([html.Td(df.iloc[i][col]) for col in df.columns])
-                              for i in range(min(len(df), 15000))])]  # Limit the number of rows
-
-    # Creating the table layout
-    table = dbc.Table(
-        table_header + table_body,
-        bordered=True,
-       
+        return [], [], 1, {"display": "none"}, dbc.Alert(f"Error loading dataset: {str(e)}", color="danger")
+
+    columns = [{"name": col, "id": col} for col in df.columns]
+    return columns, data, page_count, {"margin-top": "20px"}, None
+
+# Link of the download: the export route with the current format, filter query and sort order
+@dash.callback(
+    Output("export-link", "href"),
+    [Input("export-format", "value"),
+     Input("dataset-table", "filter_query"),
+     Input("dataset-table", "sort_by")]
+)
+def update_export_link(export_format, filter_query, sort_by):
+    query = urlencode({"filter_query": filter_query or "", "sort_by": json.dumps(sort_by or [])})
+    return dash.get_relative_path(f"/dataset-export/{DATASET}.{EXPORT_FORMATS[export_format][0]}") + "?" + query
+
+# Stream the filtered and sorted rows as a file. The rows are converted and sent in chunks, so exports of any
+# size run in constant memory; with threaded workers a long download does not trip the worker timeout.
+@dash.get_app().server.route(f"/dataset-export/{DATASET}.<extension>")
+def export_dataset(extension):
+    formats = {ext: (export_format, mimetype) for export_format, (ext, mimetype) in EXPORT_FORMATS.items()}
+    if extension not in formats:
+        abort(404)
+    export_format, mimetype = formats[extension]
+    try:
+        sort_by = json.loads(request.args.get("sort_by") or "[]")
+        stream = export_view(DATASET, export_format, request.args.get("filter_query"), sort_by)
+    except (ValueError, ImportError) as e:
+        abort(400, str(e))
+    response = Response(stream, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={DATASET}.{extension}"
+    return response
+
+# Search the comments: a new search or facet filter starts again from the first page of results. The facet
+# options show how many matches each value would give.
+@dash.callback(
+    [Output("search-results", "data"),
+     Output("search-results", "page_count"),
+     Output("search-results", "page_current"),
+     Output("search-summary", "children")]
+    + [Output(f"search-{facet}", "options") for facet in FACETS],
+    [Input("search-text", "value"),
+     Input("search-results", "page_current")]
+    + [Input(f"search-{facet}", "value") for facet in FACETS]
 )
+def update_search(text, page_current, *facet_values):
+    filters = dict(zip(FACETS, facet_values))
+    if dash.ctx.triggered_id != "search-results":
+        page_current = 0
+    no_options = [[] for _ in FACETS]
+    if not (text or "").strip():
+        return [], 1, 0, None, *no_options
+    try:
+        results = search(text, filters, limit=PAGE_SIZE, offset=(page_current or 0) * PAGE_SIZE)
+    except Exception as e:
+        return [], 1, 0, dbc.Alert(f"Search failed: {str(e)}", color="danger"), *no_options
+
+    options = []
+    for facet in FACETS:
+        counts = dict(results['facets'][facet])
+        if filters[facet] is not None:
+            counts.setdefault(filters[facet], 0)  # Keep the selected value listed
+        options.append([{"label": f"{value} ({count:,})", "value": value} for value, count in counts.items()])
+    summary = f"{results['total']:,} matching comments ({results['seconds'] * 1000:.0f} ms)"
+    page_count = max(1, -(-results['total'] // PAGE_SIZE))
+    return results['rows'], page_count, page_current or 0, summary, *options
 
-    return html.Div(table, style={"margin-top": "20px"})  # Add margin top to the table
\ No newline at end of file
+# Load the dataset and bring the search index up to date in the background after startup
+register_warmup('dataset', DATASET, lambda: get_dataset(DATASET))
+register_warmup('dataset', 'search_index', update_index)
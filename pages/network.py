@@ -1,102 +1,106 @@
+import os  # Import os to read the configuration from the environment
 import dash  # Import Dash framework for building web applications
 import dash_bootstrap_components as dbc  # Import Bootstrap components for styling
-from dash import dcc, html, Input, Output  # Import Dash components for layout, inputs, and outputs
+from dash import dcc, html, Input, Output, State  # Import Dash components for layout, inputs, and outputs
 import plotly.graph_objects as go  # Import Plotly for visualizations
 import networkx as nx  # Import NetworkX for creating network graphs
-import pandas as pd  # Import pandas for data manipulation
-from nltk.sentiment import SentimentIntensityAnalyzer  # Import sentiment analyzer
-import nltk  # Import NLTK for sentiment analysis
+from utils.startup import register_warmup  # Import the background warm-up registry
+from utils.memo import memoize  # Import the callback output cache
+from utils.jobs import BACKGROUND_ENABLED, POLL_INTERVAL_MS  # Import the background job settings
+from utils.compact_figures import compact_figure  # Import the compact figure encoding
+from utils.layout_cache import cached_spring_layout  # Import the cache of node positions
+from utils.network_index import ENERGY_TYPES, POSITIVE_WORDS, NEGATIVE_WORDS, DEFAULT_GROUPS, get_keyword_counts, keyword_cooccurrence, parse_keyword_groups  # Import the keyword counts
 
 # Register the page in Dash app for network visualization
 dash.register_page(__name__, path='/network', name="Network", order=4)
 
-# Load DataFrame from the CSV file containing Reddit comments
-df = pd.read_csv('assets/reddit_comments.csv')
-
-# Take a random sample of 20% of the records for performance reasons
-posts_df = df.sample(frac=0.2, random_state=42)
-
-# Initialize sentiment analyzer (NLTK VADER)
-nltk.download('vader_lexicon')
-sia = SentimentIntensityAnalyzer()
-
-# Add a new sentiment column to the DataFrame based on comment analysis
-def calculate_sentiment(comment):
-    if pd.isna(comment):
-        return 0  # Treat missing comments as neutral sentiment
-    comment = str(comment)
-    return sia.polarity_scores(comment)['compound']  # Get compound sentiment score (positive or negative)
-
-# Apply sentiment calculation to each comment
-posts_df['sentiment'] = posts_df['comment'].apply(calculate_sentiment)
-
-# Define energy types and sentiment-related words
-energy_types = ['solar', 'wind', 'hydropower']
-positive_words = ['growth', 'innovation', 'opportunity', 'progress', 'clean', 'advantage']
-negative_words = ['crisis', 'loss', 'failure', 'challenge', 'risk', 'pollution']
-
-# Function to calculate frequency of words in the comments
-def calculate_frequency(df, words):
-    frequency = {word: 0 for word in words}  # Initialize frequency dictionary
-    for comment in df['comment'].dropna():  # Iterate over comments, ignoring missing ones
-        comment_lower = comment.lower()  # Convert comment to lowercase
-        for word in words:
-            if word in comment_lower:  # Check if word is in the comment
-                frequency[word] += 1  # Increase frequency if the word is found
-    return frequency
-
-# Create network graph based on selected energy source and sentiment
-def create_network_graph(selected_energy, selected_sentiments):
+# Define energy types and sentiment-related words (shared with the keyword index)
+energy_types = ENERGY_TYPES
+positive_words = POSITIVE_WORDS
+negative_words = NEGATIVE_WORDS
+
+# Keyword groups shown in the editor before users change them, one 'name: word, word, ...' line per group
+default_keyword_text = '\n'.join(f"{group}: {', '.join(words)}" for group, words in DEFAULT_GROUPS.items())
+
+# Marker area of the most frequent energy type or word; the other nodes are sized in proportion to their
+# frequency, so the chart looks the same whatever the number of comments
+MAX_NODE_AREA = 6000
+
+# Node colors of the keyword groups: sentiment groups keep their colors, other groups take the next free color
+group_colors = {'positive': 'green', 'negative': 'red'}
+other_colors = ['orange', 'purple', 'brown', 'teal', 'magenta', 'olive', 'gold', 'gray']
+
+# Color of every keyword group, in order
+def keyword_group_colors(keyword_groups):
+    colors, others = {}, iter(other_colors * (len(keyword_groups) // len(other_colors) + 1))
+    for group, _ in keyword_groups:
+        colors[group] = group_colors.get(group) or next(others)
+    return colors
+
+# Hover text of a node: the number of comments mentioning it (countries only show their name)
+def node_hover_text(G, node):
+    frequency = G.nodes[node].get('frequency')
+    return f"{node} ({frequency} occurrences)" if frequency is not None else str(node)
+
+# Keyword groups of the graph as [(group, words)]: the groups of users, or the default positive and negative words
+def keyword_group_list(keyword_groups=None):
+    return [(group, list(words)) for group, words in keyword_groups] if keyword_groups is not None else list(DEFAULT_GROUPS.items())
+
+# Build the network graph of the selected energy types and keyword groups: energy types, countries and words
+# as nodes (with their size and color), linked when they appear in the same comments
+def build_network_graph(selected_energy, selected_sentiments, keyword_groups=None):
     G = nx.Graph()  # Initialize an empty network graph
 
-    # Combine positive and negative sentiment words based on user selection
-    words = []
-    if 'positive' in selected_sentiments:
-        words += positive_words
-    if 'negative' in selected_sentiments:
-        words += negative_words
-
-    # Filter the posts DataFrame to include only comments with the selected energy types
-    filtered_posts_df = posts_df[posts_df['comment'].str.contains('|'.join(selected_energy), case=False, na=False)]
-
-    # Calculate frequency of energy types and sentiment words in the comments
-    energy_frequency = calculate_frequency(filtered_posts_df, selected_energy)
-    sentiment_frequency = calculate_frequency(filtered_posts_df, words)
+    # Combine the words of the selected keyword groups, each word colored after the first group it is in
+    custom = keyword_groups is not None
+    keyword_groups = keyword_group_list(keyword_groups)
+    colors = keyword_group_colors(keyword_groups)
+    word_colors = {}
+    for group, group_words in keyword_groups:
+        if group in selected_sentiments:
+            for word in group_words:
+                word_colors.setdefault(word, colors[group])
+    words = list(word_colors)
+
+    # Calculate frequency of energy types and sentiment words, the countries and the co-occurrence edges
+    # of the comments mentioning the selected energy types, from the keyword counts of all comments
+    # (pre-computed for the default groups, matched once per keyword set for the groups of users)
+    counts = get_keyword_counts([word for _, group_words in keyword_groups for word in group_words]) if custom else get_keyword_counts()
+    energy_frequency, sentiment_frequency, countries, edges = keyword_cooccurrence(counts, selected_energy, words)
+    scale = MAX_NODE_AREA / max(list(energy_frequency.values()) + list(sentiment_frequency.values()) + [1])
 
     # Add energy types as nodes to the graph (only if they appear in the data)
     for energy in selected_energy:
         if energy_frequency[energy] > 0:
-            size = max(energy_frequency[energy] * 150, 200)  # Set node size based on frequency
-            G.add_node(energy, type='energy', color='skyblue', size=size)  # Add node with size and color
+            size = max(energy_frequency[energy] * scale, 200)  # Set node size based on frequency
+            G.add_node(energy, type='energy', color='skyblue', size=size, frequency=energy_frequency[energy])  # Add node with size and color
 
     # Add countries as nodes to the graph
-    for country in filtered_posts_df['Country'].unique():
+    for country in countries:
         G.add_node(country, type='Country', color='blue', size=600)  # Fixed size for countries
 
     # Add sentiment words as nodes to the graph (only if they appear in the data)
     for word in words:
-        if sentiment_frequency[word] > 0:
-            size = max(sentiment_frequency[word] * 100, 150)  # Set node size based on frequency
-            sentiment_color = 'green' if word in positive_words else 'red'  # Green for positive, red for negative
-            G.add_node(word, type='sentiment', color=sentiment_color, size=size)  # Add node with size and color
-
-    # Create edges (connections) between nodes based on co-occurrence in the comments
-    for idx, row in filtered_posts_df.iterrows():
-        comment = str(row['comment']).lower()
-        country = row['Country']
-
-        # Create an edge between the energy type and the country
-        for energy in selected_energy:
-            if energy in comment:
-                G.add_edge(energy, country)
-
-                # Create edges between energy type and sentiment words
-                for word in words:
-                    if word in comment:
-                        G.add_edge(energy, word)
-
-    # Define positions for the nodes using NetworkX's spring layout
-    pos = nx.spring_layout(G, k=1.2, seed=42)
+        if sentiment_frequency[word] > 0 and word not in G:
+            size = max(sentiment_frequency[word] * scale * 2 / 3, 150)  # Set node size based on frequency
+            G.add_node(word, type='sentiment', color=word_colors[word], size=size, frequency=sentiment_frequency[word])  # Add node with size and the color of its group
+
+    # Create edges (connections) between energy types and the countries and sentiment words they co-occur with
+    G.add_edges_from(edges)
+    return G
+
+# Create network graph based on selected energy source and keyword groups ([(group, words)], the default
+# positive and negative words when not given)
+def create_network_graph(selected_energy, selected_sentiments, keyword_groups=None):
+    G = build_network_graph(selected_energy, selected_sentiments, keyword_groups)
+    groups = keyword_group_list(keyword_groups)
+    colors = keyword_group_colors(groups)
+
+    # Define positions for the nodes using NetworkX's spring layout (cached per graph). It starts from the layout
+    # of the graph with every energy type and keyword group selected, so a selection looks the same in every
+    # worker process and nodes keep their place when the selection changes.
+    pos = cached_spring_layout(G, k=1.2, seed=42, reference=lambda: build_network_graph(
+        energy_types, [group for group, _ in groups], keyword_groups))
 
     # Prepare lists for node and edge coordinates, sizes, colors, and texts for Plotly
     node_x, node_y, node_sizes, node_colors, node_texts = [], [], [], [], []
@@ -107,7 +111,7 @@ def create_network_graph(selected_energy, selected_sentiments):
         node_y.append(y)
         node_sizes.append(G.nodes[node].get('size', 600))  # Default size if not specified
         node_colors.append(G.nodes[node]['color'])
-        node_texts.append(f"{node} ({G.nodes[node].get('size', 1)} occurrences)")  # Node text with occurrences
+        node_texts.append(node_hover_text(G, node))  # Node text with occurrences
 
     # Prepare lists for edge coordinates
     edge_x, edge_y = [], []
@@ -137,20 +141,20 @@ def create_network_graph(selected_energy, selected_sentiments):
         ),
         text=[node for node in G.nodes],  # Node labels
         textposition='middle center',  # Center the text on nodes
-        hovertext=[f"{node} ({G.nodes[node].get('size', 1)} occurrences)" for node in G.nodes()],  # Hover info
+        hovertext=[node_hover_text(G, node) for node in G.nodes()],  # Hover info
         hoverinfo='text',
         textfont=dict(color='#000000', size=12, family='Arial', weight='bold'),  # Node label styling
         showlegend=False  # Hide nodes from the legend
     )
     
-    # Add dummy traces for the legend (for energy, country, positive, and negative words)
+    # Add dummy traces for the legend (for energy, country, and the words of each keyword group)
     legend_energy = go.Scatter(x=[None], y=[None], mode='markers', marker=dict(size=15, color='skyblue'), name='Energy Source')
     legend_country = go.Scatter(x=[None], y=[None], mode='markers', marker=dict(size=15, color='blue'), name='Country')
-    legend_positive = go.Scatter(x=[None], y=[None], mode='markers', marker=dict(size=15, color='green'), name='Positive Word')
-    legend_negative = go.Scatter(x=[None], y=[None], mode='markers', marker=dict(size=15, color='red'), name='Negative Word')
+    legend_groups = [go.Scatter(x=[None], y=[None], mode='markers', marker=dict(size=15, color=colors[group]), name=f'{group.capitalize()} Word')
+                     for group, _ in groups]
 
     # Create the final Plotly figure layout
-    fig = go.Figure(data=[edge_trace, node_trace, legend_energy, legend_country, legend_positive, legend_negative],
+    fig = go.Figure(data=[edge_trace, node_trace, legend_energy, legend_country] + legend_groups,
                     layout=go.Layout(
                         title=f'Energy Types, Sentiment Words, and Countries Network for {", ".join(selected_energy)}',
                         titlefont_size=20,
@@ -228,14 +232,14 @@ layout = dbc.Container([
             )
         ], width=6),
 
-        # Dropdown for selecting sentiment type
+        # Dropdown for selecting the keyword group (sentiment type)
         dbc.Col([
             dbc.Card(
                 dbc.CardBody([                  
                     html.Label('Select Sentiment Type:', className='font-weight-bold'),
                     dcc.Dropdown(
                         id='sentiment-dropdown',
-                        options=[{'label': 'All', 'value': 'All'}, {'label': 'Positive', 'value': 'positive'}, {'label': 'Negative', 'value': 'negative'}],
+                        options=[{'label': 'All', 'value': 'All'}] + [{'label': group.capitalize(), 'value': group} for group in DEFAULT_GROUPS],
                         value='All',  # Default to 'All'
                         multi=False,  # Single selection
                         className='mb-3'
@@ -245,6 +249,21 @@ layout = dbc.Container([
         ], width=6)
     ]),
 
+    # Editor of the keyword groups: every group is matched in the comments at once when applied
+    dbc.Row([
+        dbc.Col([
+            dbc.Card(
+                dbc.CardBody([
+                    html.Label("Keyword groups (one per line, as 'name: word, word, ...'; phrases allowed):", className='font-weight-bold'),
+                    dcc.Textarea(id='keyword-groups-text', value=default_keyword_text, className='form-control mb-2', style={'height': '90px'}),
+                    dbc.Button('Apply Keywords', id='apply-keywords-btn', color='primary', size='sm'),
+                    html.Span(id='keyword-groups-status', className='text-muted small ms-3'),
+                    dcc.Store(id='keyword-groups')  # Applied groups as [[group, words]]; empty for the default groups
+                ])
+            )
+        ], width=12)
+    ], className='mt-3 mb-3'),
+
     # Display the network graph
     dbc.Row([
         dbc.Col([
@@ -266,19 +285,59 @@ layout = dbc.Container([
 @dash.callback(
     Output('network-graph', 'figure'),
     [Input('energy-dropdown', 'value'),
-     Input('sentiment-dropdown', 'value')]
+     Input('sentiment-dropdown', 'value'),
+     Input('keyword-groups', 'data')],
+    background=BACKGROUND_ENABLED,  # Computed by the job pool; a newer selection cancels the previous job
+    interval=POLL_INTERVAL_MS
 )
-def update_graph(selected_energy, selected_sentiment):
-    # Replace 'All' with all energy types or sentiment types
+@memoize('network.update_graph', ['reddit_comments'])  # Reuse the figure for the same selection and data
+def update_graph(selected_energy, selected_sentiment, keyword_groups=None):
+    # Replace 'All' with all energy types or keyword groups
     if selected_energy == 'All':
         selected_energy = energy_types
     else:
         selected_energy = [selected_energy]
     
+    keyword_groups = keyword_groups or None  # Default groups until users apply their own
     if selected_sentiment == 'All':
-        selected_sentiment = ['positive', 'negative']
+        selected_sentiment = [group for group, _ in keyword_groups or DEFAULT_GROUPS.items()]
     else:
         selected_sentiment = [selected_sentiment]
     
     # Return the updated network graph based on selected options
-    return create_network_graph(selected_energy, selected_sentiment)
+    return compact_figure(create_network_graph(selected_energy, selected_sentiment, keyword_groups))
+
+
+# Callback to apply the keyword groups typed by users: the groups are stored for the graph and listed in the dropdown
+@dash.callback(
+    [Output('keyword-groups', 'data'),
+     Output('sentiment-dropdown', 'options'),
+     Output('sentiment-dropdown', 'value'),
+     Output('keyword-groups-status', 'children')],
+    Input('apply-keywords-btn', 'n_clicks'),
+    State('keyword-groups-text', 'value'),
+    prevent_initial_call=True
+)
+def apply_keyword_groups(n_clicks, text):
+    keyword_groups = parse_keyword_groups(text)
+    if not keyword_groups:
+        return dash.no_update, dash.no_update, dash.no_update, "Type at least one keyword, e.g. 'storage: battery, grid storage'."
+    options = [{'label': 'All', 'value': 'All'}] + [{'label': group.capitalize(), 'value': group} for group, _ in keyword_groups]
+    keywords = sum(len(words) for _, words in keyword_groups)
+    return [[group, words] for group, words in keyword_groups], options, 'All', f"{len(keyword_groups)} groups, {keywords} keywords"
+
+
+# Pre-compute the layouts of every dropdown combination (4 energy options x 3 sentiment options),
+# so that visits are served from the layout cache
+def precompute_layouts():
+    for energy in ['All'] + energy_types:
+        for sentiment in ['All', 'positive', 'negative']:
+            update_graph(energy, sentiment)
+
+
+# Load the words and keyword counts of the comments in the background after startup
+register_warmup('network', 'keyword_counts', get_keyword_counts)
+
+# Set G21_PRECOMPUTE_LAYOUTS=0 to skip the pre-computation of the layouts during the warm-up
+if os.environ.get('G21_PRECOMPUTE_LAYOUTS', '1') != '0':
+    register_warmup('network', 'layouts', precompute_layouts)
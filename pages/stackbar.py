@@ -2,25 +2,35 @@ import dash  # Import Dash for building the web application
 from dash import dcc, html, callback, Input, Output  # Import Dash components for interactivity and callbacks
 import plotly.express as px  # Import Plotly Express for data visualizations
 import dash_bootstrap_components as dbc  # Import Bootstrap components for styling
-import pandas as pd  # Import pandas for data manipulation
+from utils.data_store import get_dataset  # Import the shared dataset registry
+from utils.memo import memoize  # Import the callback output cache
+from utils.compact_figures import compact_figure  # Import the compact figure encoding
+from utils.aggregates import get_aggregate, get_stackbar_counts  # Import the pre-grouped sentiment counts
+from utils.clientside import CLIENTSIDE_MODE, figure_json  # Import the client-side mode settings
+from utils.startup import register_warmup  # Import the background warm-up registry
 
 # Register the page in a multi-page Dash app
 dash.register_page(__name__, path='/stackbar', name="Overview", order=1)
 
-# Load the dataset from the CSV file
-df = pd.read_csv('assets/energy_column_data.csv')
+# Country x sentiment counts of an energy source from the pre-grouped table (empty when the energy source has no data)
+def energy_counts(energy_source):
+    import pandas as pd  # Import pandas here, it is only needed for the empty table
+    empty = pd.DataFrame(index=pd.Index([], dtype=object), columns=pd.Index([], dtype=object))
+    return get_stackbar_counts().get(energy_source, empty)
 
 ####################### STACKED BAR CHART ###############################
 # Function to create a stacked bar chart showing sentiment analysis for a given energy source
 def create_sentiment_chart(energy_source):
-    # Filter the dataframe based on the selected energy source
-    filtered_df = df[df['energy_source'] == energy_source]
+    import pandas as pd  # Import pandas here, it is only needed when a chart is built
+    # Look up the country x sentiment counts of the selected energy source in the pre-grouped table
+    counts = energy_counts(energy_source)
 
-    # Group the data by country and sentiment, and calculate the count
-    sentiment_count = filtered_df.groupby(['country', 'sentiment']).size().reset_index(name='count')
+    # Normalize the count to percentage for each country (vectorised division by the row totals)
+    percentages = counts.div(counts.sum(axis=1), axis=0) * 100
 
-    # Normalize the count to percentage for each country
-    sentiment_count['Percentage'] = sentiment_count.groupby('country')['count'].transform(lambda x: (x / x.sum()) * 100)
+    # Reshape to one row per country and sentiment, keeping only the combinations present in the data
+    sentiment_count = pd.DataFrame({'count': counts.stack(), 'Percentage': percentages.stack()})
+    sentiment_count = sentiment_count[sentiment_count['count'] > 0].rename_axis(['country', 'sentiment']).reset_index()
 
     # Create the stacked bar chart using Plotly Express
     fig = px.bar(
@@ -61,11 +71,11 @@ def create_sentiment_chart(energy_source):
 ####################### PIE CHART ###############################
 # Function to create a pie chart showing the distribution of a specific sentiment by country for a given energy source
 def create_country_sentiment_pie_chart(energy_source, sentiment_type):
-    # Filter the dataframe by both energy source and sentiment type
-    filtered_df = df[(df['energy_source'] == energy_source) & (df['sentiment'] == sentiment_type)]
-
-    # Group the data by country and calculate the count of each sentiment
-    country_summary = filtered_df.groupby('country').size().reset_index(name='count')
+    import pandas as pd  # Import pandas here, it is only needed when a chart is built
+    # Look up the count of the sentiment type for each country in the pre-grouped table
+    counts = energy_counts(energy_source)
+    country_count = counts[sentiment_type] if sentiment_type in counts.columns else pd.Series(dtype='int64')
+    country_summary = country_count[country_count > 0].rename('count').rename_axis('country').reset_index()
 
     # Normalize the count to percentage for the pie chart
     country_summary['Percentage'] = country_summary['count'] / country_summary['count'].sum() * 100
@@ -95,14 +105,17 @@ def create_country_sentiment_pie_chart(energy_source, sentiment_type):
     return fig
 
 ####################### WIDGETS ################################
-# Dropdown to select energy type
-dd = dcc.Dropdown(
-    id="energy_type_dropdown",
-    options=[{"label": et, "value": et} for et in df['energy_source'].unique()],  # Options are unique energy sources
-    value="Wind",  # Default value is Wind energy
-    clearable=False,  # User cannot clear the selection
-    style={'width': '100%'}  # Full width dropdown
-)
+# Dropdown to select energy type (created when the page is displayed, so the dataset is not loaded at import)
+def energy_type_dropdown():
+    # Load the dataset from the shared registry
+    df = get_dataset('energy_column_data')
+    return dcc.Dropdown(
+        id="energy_type_dropdown",
+        options=[{"label": et, "value": et} for et in df['energy_source'].unique()],  # Options are unique energy sources
+        value="Wind",  # Default value is Wind energy
+        clearable=False,  # User cannot clear the selection
+        style={'width': '100%'}  # Full width dropdown
+    )
 
 # Checklist to select sentiment types (positive, neutral, negative)
 sentiment_checkbox = dcc.Checklist(
@@ -131,38 +144,36 @@ summary_cards = dbc.Row([
 ], className="mb-4 justify-content-center")
 
 ####################### PAGE LAYOUT #############################
-# Main layout for the page
-layout = dbc.Container([
-    # Page title
-    dbc.Row([
-        dbc.Col(html.H2("Sentiment Analysis by Energy Type and Country", className="text-center mb-4"), width=12)
-    ]),
-    # Row with dropdown for energy type and checklist for sentiment type
-    dbc.Row([
-        dbc.Col(html.Label("Energy Type:", style={'font-size': '20px', 'padding-right': '0px'}), width='auto', style={'display': 'flex', 'align-items': 'center'}),  # Label for energy type
-        dbc.Col(dd, width=4, style={'margin-top': '30px', 'margin-left': '0px'}),  # Dropdown for energy type
-        dbc.Col(html.Label("Sentiment Type:", style={'font-size': '20px', 'padding-left': '90px'}), width='auto', style={'display': 'flex', 'align-items': 'center'}),  # Label for sentiment type
-        dbc.Col(sentiment_checkbox, width=2)  # Checklist for sentiment type
-    ], className='mb-4 justify-content-center'),
+# Main layout for the page (a function, so the data is only needed when the page is displayed)
+def layout(**kwargs):
+    return dbc.Container([
+        # Page title
+        dbc.Row([
+            dbc.Col(html.H2("Sentiment Analysis by Energy Type and Country", className="text-center mb-4"), width=12)
+        ]),
+        # Row with dropdown for energy type and checklist for sentiment type
+        dbc.Row([
+            dbc.Col(html.Label("Energy Type:", style={'font-size': '20px', 'padding-right': '0px'}), width='auto', style={'display': 'flex', 'align-items': 'center'}),  # Label for energy type
+            dbc.Col(energy_type_dropdown(), width=4, style={'margin-top': '30px', 'margin-left': '0px'}),  # Dropdown for energy type
+            dbc.Col(html.Label("Sentiment Type:", style={'font-size': '20px', 'padding-left': '90px'}), width='auto', style={'display': 'flex', 'align-items': 'center'}),  # Label for sentiment type
+            dbc.Col(sentiment_checkbox, width=2)  # Checklist for sentiment type
+        ], className='mb-4 justify-content-center'),
     
-    # Row to display the stacked bar chart and pie chart
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="sentiment_chart", config={'responsive': True}, style={'width': '100%', 'height': 'auto'}), width=5, className="d-flex justify-content-center"),  # Stacked bar chart
-        dbc.Col(dcc.Graph(id="sentiment_pie_chart", config={'responsive': True}, style={'width': '100%', 'height': 'auto'}), width=5, className="d-flex justify-content-center")  # Pie chart
-    ], className='justify-content-center'),
-
-    # Summary cards to display additional information
-    dbc.Row([
-        dbc.Col(summary_cards, width=12, style={'margin-top': '30px'})  # Added margin-top to summary cards
-    ])
-], fluid=True, className="p-4 bg-light")# Fluid layout for responsiveness
+        # Row to display the stacked bar chart and pie chart
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="sentiment_chart", config={'responsive': True}, style={'width': '100%', 'height': 'auto'}), width=5, className="d-flex justify-content-center"),  # Stacked bar chart
+            dbc.Col(dcc.Graph(id="sentiment_pie_chart", config={'responsive': True}, style={'width': '100%', 'height': 'auto'}), width=5, className="d-flex justify-content-center")  # Pie chart
+        ], className='justify-content-center'),
+
+        # Summary cards to display additional information
+        dbc.Row([
+            dbc.Col(summary_cards, width=12, style={'margin-top': '30px'})  # Added margin-top to summary cards
+        ])
+    ], fluid=True, className="p-4 bg-light")# Fluid layout for responsiveness
 
 ####################### CALLBACKS ##############################
-# Callback function to update the charts when user selects new energy type or sentiment types
-@callback(
-    [Output("sentiment_type_checklist", "value"), Output("sentiment_chart", "figure"), Output("sentiment_pie_chart", "figure")],
-    [Input("energy_type_dropdown", "value"), Input("sentiment_type_checklist", "value")]
-)
+# Callback function to update the charts when user selects new energy type or sentiment types (registered below)
+@memoize('stackbar.update_charts', ['energy_column_data'])  # Reuse the figures for the same selection and data
 def update_charts(energy_type, sentiment_types):
     # If no sentiment types are selected, default to 'positive'
     if not sentiment_types:
@@ -172,4 +183,110 @@ def update_charts(energy_type, sentiment_types):
         sentiment_types = [sentiment_types[-1]]
     
     # Update the stacked bar chart and pie chart based on the selected energy type and sentiment type
-    return sentiment_types, create_sentiment_chart(energy_type), create_country_sentiment_pie_chart(energy_type, sentiment_types[0])
+    return (sentiment_types, compact_figure(create_sentiment_chart(energy_type)),
+            compact_figure(create_country_sentiment_pie_chart(energy_type, sentiment_types[0])))
+
+####################### CLIENT-SIDE MODE ################################
+# Client-side version of update_charts: the same single-select logic, with the percentages computed
+# from the stored counts and drawn with the trace and layout templates of the server figures
+UPDATE_CHARTS_JS = """
+function(energyType, sentimentTypes, store) {
+    if (!store) {
+        return window.dash_clientside.no_update;
+    }
+    var types = (sentimentTypes && sentimentTypes.length) ? sentimentTypes : ['positive'];
+    if (types.length > 1) {
+        types = [types[types.length - 1]];
+    }
+    var sentimentType = types[0];
+    var table = store.counts[energyType] || {countries: [], sentiments: [], counts: []};
+    var copy = function(value) { return JSON.parse(JSON.stringify(value)); };
+
+    // Stacked bar chart: one trace per sentiment, in order of first appearance like Plotly Express
+    var traces = {};
+    var order = [];
+    table.countries.forEach(function(country, i) {
+        var row = table.counts[i];
+        var total = row.reduce(function(a, b) { return a + b; }, 0);
+        table.sentiments.forEach(function(sentiment, j) {
+            if (row[j] > 0) {
+                if (!traces[sentiment]) {
+                    traces[sentiment] = Object.assign(copy(store.bar_traces[sentiment] || {type: 'bar', name: sentiment}), {x: [], y: [], text: []});
+                    order.push(sentiment);
+                }
+                var percentage = row[j] / total * 100;
+                traces[sentiment].x.push(country);
+                traces[sentiment].y.push(percentage);
+                traces[sentiment].text.push(percentage);
+            }
+        });
+    });
+    var bar = {data: order.map(function(sentiment) { return traces[sentiment]; }), layout: copy(store.bar_layout)};
+    bar.layout.title.text = 'Sentiment Analysis on ' + energyType + ' Energy by Country';
+
+    // Pie chart: share of each country in the selected sentiment
+    var column = table.sentiments.indexOf(sentimentType);
+    var labels = [], values = [];
+    table.countries.forEach(function(country, i) {
+        if (column >= 0 && table.counts[i][column] > 0) {
+            labels.push(country);
+            values.push(table.counts[i][column]);
+        }
+    });
+    var sum = values.reduce(function(a, b) { return a + b; }, 0);
+    var pie = copy(store.pie);
+    pie.data[0].labels = labels;
+    pie.data[0].customdata = labels.map(function(label) { return [label]; });
+    pie.data[0].values = values.map(function(value) { return value / sum * 100; });
+    pie.data[0].marker = {colors: labels.map(function(label) { return store.colors[label]; })};
+    pie.layout.title.text = sentimentType.charAt(0).toUpperCase() + sentimentType.slice(1).toLowerCase() +
+        ' Sentiment Distribution for ' + energyType + ' Energy';
+    return [types, bar, pie];
+}
+"""
+
+# Compact data sent to the browser: the country x sentiment counts of each energy source,
+# the trace and layout templates of the server figures and the color of each country
+def build_clientside_data(df):
+    counts = {energy: {'countries': list(table.index), 'sentiments': list(table.columns), 'counts': table.values.tolist()}
+              for energy, table in get_stackbar_counts().items()}
+
+    bar_traces, bar_layout = {}, None
+    for energy in counts:
+        bar = figure_json(create_sentiment_chart(energy))
+        bar_layout = bar['layout']
+        for trace in bar['data']:
+            bar_traces[trace['name']] = {key: value for key, value in trace.items() if key not in ('x', 'y', 'text')}
+
+    pie = figure_json(create_country_sentiment_pie_chart(next(iter(counts), ''), 'positive'))
+    pie['data'] = [{key: value for key, value in pie['data'][0].items() if key not in ('labels', 'values', 'customdata', 'marker')}]
+
+    # Countries without a fixed color get the default Plotly colors, like Plotly Express does
+    country_colors = {'Australia': '#1f77b4', 'UK': '#ff7f0e', 'France': '#2ca02c'}
+    others = sorted(set(df['country'].dropna()) - set(country_colors))
+    country_colors.update({country: px.colors.qualitative.Plotly[i % 10] for i, country in enumerate(others)})
+
+    return {'counts': counts, 'bar_traces': bar_traces, 'bar_layout': bar_layout, 'pie': pie, 'colors': country_colors}
+
+# In client-side mode the charts are updated in the browser, otherwise by a server callback
+if CLIENTSIDE_MODE:
+    page_layout = layout
+
+    # Add the compact data to the page each time it is loaded
+    def layout(**kwargs):
+        data = get_aggregate('stackbar_clientside', 'energy_column_data', build_clientside_data)
+        return html.Div([page_layout(**kwargs), dcc.Store(id='stackbar-store', data=data)])
+
+    dash.clientside_callback(
+        UPDATE_CHARTS_JS,
+        [Output("sentiment_type_checklist", "value"), Output("sentiment_chart", "figure"), Output("sentiment_pie_chart", "figure")],
+        [Input("energy_type_dropdown", "value"), Input("sentiment_type_checklist", "value"), Input('stackbar-store', 'data')]
+    )
+else:
+    callback(
+        [Output("sentiment_type_checklist", "value"), Output("sentiment_chart", "figure"), Output("sentiment_pie_chart", "figure")],
+        [Input("energy_type_dropdown", "value"), Input("sentiment_type_checklist", "value")]
+    )(update_charts)
+
+# Load the dataset and its pre-grouped counts in the background after startup
+register_warmup('stackbar', 'stackbar_counts', get_stackbar_counts)
@@ -1,32 +1,133 @@
 import dash  # Import Dash framework for creating the web app
 from dash import dcc, html, Input, Output  # Import Dash components for layout and callbacks
-import pandas as pd  # Import pandas for data manipulation
-from wordcloud import WordCloud  # Import WordCloud for generating word clouds
 import plotly.express as px  # Import Plotly Express for easy data visualization
 import io  # Import io to handle in-memory image operations
-import base64  # Import base64 to encode image to base64 format for display in the app
+import hashlib  # Import hashlib to build the ETag of the word cloud images
+import threading  # Import threading to guard the image cache between request threads
+from urllib.parse import urlencode  # Import urlencode to put the filters in the image links
+from collections import OrderedDict  # Import OrderedDict for the least-recently-used image cache
+from flask import Response, abort, request  # Import Flask helpers for the image route
 import dash_bootstrap_components as dbc  # Import Bootstrap components for responsive design
+from utils.data_store import get_dataset, dataset_version  # Import the shared dataset registry
+from utils.memo import memoize  # Import the callback output cache
+from utils.compact_figures import compact_figure  # Import the compact figure encoding
+from utils.startup import register_warmup  # Import the background warm-up registry
+from utils.jobs import BACKGROUND_ENABLED, POLL_INTERVAL_MS, shared_cache  # Import the background job settings
+from utils.word_counts import DATASET as COMMENTS_DATASET, FILTERS, filter_choices, get_word_counts, word_frequencies  # Import the word counts of the comments
 
 # Register the page in the multi-page app, with a specific path and name
 dash.register_page(__name__, path='/wordcloud', name="WordInsight", order=3)
 
-# Load the word frequencies from CSV files (data from Twitter and Reddit)
-tweets_df = pd.read_csv('assets/tweets_word_frequency.csv')  # Load Twitter word frequency data
-reddit_df = pd.read_csv('assets/reddit_word_frequency.csv')  # Load Reddit word frequency data
+# Word frequency dataset of each data source (data from Twitter and Reddit; the words of the energy comments are
+# counted from the comments themselves, so they can be filtered)
+SOURCES = {'reddit': 'reddit_word_frequency', 'twitter': 'tweets_word_frequency', 'comments': COMMENTS_DATASET}
+
+# Word cloud rendering parameters (part of the image cache key)
+WORDCLOUD_PARAMS = {'width': 1200, 'height': 600, 'background_color': 'white'}
+
+# Maximum number of rendered word clouds kept in memory (least recently used ones are dropped first)
+MAX_CACHED_IMAGES = 16
+
+# Rendered word clouds: {ETag: PNG bytes}
+_images = OrderedDict()
+_images_lock = threading.Lock()
 
 # Function to create a word cloud image from word frequencies
 def create_wordcloud(frequencies):
+    from wordcloud import WordCloud  # Import WordCloud here, it is only needed when an image is rendered
     # Generate the word cloud image with a white background
-    wordcloud = WordCloud(width=1200, height=600, background_color='white').generate_from_frequencies(frequencies)
+    wordcloud = WordCloud(**WORDCLOUD_PARAMS).generate_from_frequencies(frequencies)
     # Convert the image to binary format for in-memory operations
     img = io.BytesIO()
     wordcloud.to_image().save(img, format='PNG')  # Save the word cloud as a PNG image
-    img.seek(0)  # Move to the start of the image buffer
-    # Return the image encoded in base64 to display in the web app
-    return base64.b64encode(img.getvalue()).decode()
+    # Return the PNG bytes
+    return img.getvalue()
+
+# Filters of the energy comments selected on the page, as ({column: value}, [first year, last year] or None).
+# The other sources have no filters. ValueError when the years are not a range of two years.
+def comment_filters(source, country=None, energy_source=None, sentiment=None, years=None):
+    if source != 'comments':
+        return {}, None
+    if years and len(years) != 2:
+        raise ValueError(f'Expected a first and a last year, got {years!r}')
+    filters = {column: value for column, value in zip(FILTERS, [country, energy_source, sentiment])
+               if value not in (None, '', 'All')}
+    return filters, [int(years[0]), int(years[1])] if years else None
+
+# Word frequencies of a data source, most frequent first (the energy comments matching the filters)
+def source_frequencies(source, filters=None, years=None):
+    if source == 'comments':
+        return word_frequencies(filters, years)
+    return get_dataset(SOURCES[source])
+
+# ETag of the word cloud of a data source: changes when the frequency file, the filters or the rendering
+# parameters change
+def wordcloud_etag(source, filters=None, years=None):
+    key = repr((source, dataset_version(SOURCES[source]), sorted((filters or {}).items()), years,
+                sorted(WORDCLOUD_PARAMS.items())))
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+# Link to the word cloud image of a data source and filters
+def wordcloud_src(source, filters=None, years=None):
+    query = dict(filters or {})
+    if years:
+        query['years'] = f"{years[0]}-{years[1]}"
+    query['v'] = wordcloud_etag(source, filters, years)
+    return dash.get_relative_path(f"/wordcloud-image/{source}.png") + "?" + urlencode(query)
+
+# Return the PNG of the word cloud of a data source, rendering it only when it is not in the cache.
+# Images rendered by the background jobs reach the app processes through the shared disk cache.
+def get_wordcloud_png(source, filters=None, years=None):
+    etag = wordcloud_etag(source, filters, years)
+    with _images_lock:
+        if etag in _images:
+            _images.move_to_end(etag)
+            return etag, _images[etag]
+
+    cache = shared_cache()
+    png = cache.get(('wordcloud', etag)) if cache is not None else None
+    if png is None:
+        df = source_frequencies(source, filters, years)
+        png = create_wordcloud(dict(zip(df['word'], df['frequency'])))
+        if cache is not None:
+            cache.set(('wordcloud', etag), png, expire=86400)
+
+    with _images_lock:
+        _images[etag] = png
+        while len(_images) > MAX_CACHED_IMAGES:
+            _images.popitem(last=False)
+    return etag, png
+
+# Serve the word cloud images as static files that browsers can cache
+@dash.get_app().server.route('/wordcloud-image/<source>.png')
+def wordcloud_image(source):
+    if source not in SOURCES:
+        abort(404)
+    try:
+        years = [int(year) for year in request.args['years'].split('-')] if 'years' in request.args else None
+        filters, years = comment_filters(source, *[request.args.get(column) for column in FILTERS], years)
+    except ValueError:
+        abort(400)  # 'years' is not 'first-last'
+
+    # Answer 'Not Modified' without rendering when the browser already has this version of the image
+    etag = wordcloud_etag(source, filters, years)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            etag, png = get_wordcloud_png(source, filters, years)
+        except ValueError:
+            abort(404)  # No words match the filters
+        response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    # The URL contains the version of the image, so it can be cached for a long time
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
 
 # Layout for the page (using Dash Bootstrap Components for styling)
 def layout():
+    choices, (first_year, last_year) = filter_choices()  # Values of the filters of the energy comments
     return dbc.Container([  # Use dbc.Container for a responsive layout
         dbc.Row([  # First row for the page title
             dbc.Col(html.H3("Most Frequently Used Words in Renewable Energy Policy Discussions", 
@@ -39,7 +140,8 @@ def layout():
                     id='source-selector',
                     options=[  # Dropdown options
                         {'label': 'Reddit', 'value': 'reddit'},
-                        {'label': 'Twitter', 'value': 'twitter'}
+                        {'label': 'Twitter', 'value': 'twitter'},
+                        {'label': 'Energy comments (filterable)', 'value': 'comments'}
                     ],
                     value='reddit',  # Set Reddit as the default option
                     style={'margin': '20px', 'width': '100%'}  # Full width dropdown with margin
@@ -49,6 +151,20 @@ def layout():
             )
         ]),
 
+        dbc.Row([  # Filters of the energy comments (disabled for the other sources)
+            dbc.Col(
+                dcc.Dropdown(id=f'wordcloud-{column}', options=['All'] + choices[column], value='All', disabled=True),
+                width=2
+            )
+            for column in FILTERS
+        ] + [
+            dbc.Col(
+                dcc.RangeSlider(id='wordcloud-years', min=first_year, max=last_year, step=1, value=[first_year, last_year],
+                                marks={year: str(year) for year in range(first_year, last_year + 1)}, disabled=True),
+                width=6
+            )
+        ], className="mb-3"),
+
         dbc.Row([  # Third row for the bar chart display
             dbc.Col(
                 dcc.Graph(id='bar-chart'),  # Bar chart to display top 10 word frequencies
@@ -67,22 +183,17 @@ def layout():
         ])
     ], fluid=True)  # Fluid container to ensure responsiveness
 
-# Callback to update both the word cloud and the bar chart based on the selected data source
-@dash.get_app().callback(
-    [Output('wordcloud-img', 'src'),  # Output for the word cloud image
-     Output('bar-chart', 'figure')],  # Output for the bar chart figure
-    [Input('source-selector', 'value')]  # Input from the dropdown selector (source-selector)
-)
-def update_visualizations(source):
-    # Select the appropriate data based on the user’s input (Reddit or Twitter)
-    if source == 'reddit':
-        df = reddit_df  # Use Reddit data
-    else:
-        df = tweets_df  # Use Twitter data
+# Link to the word cloud image and bar chart of the selected data source and filters
+@memoize('wordcloud.update_visualizations', lambda source, *filters: [SOURCES[source if source in SOURCES else 'twitter']])
+def wordcloud_outputs(source, country=None, energy_source=None, sentiment=None, years=None):
+    # Select the appropriate data based on the user’s input (Reddit, Twitter or the filtered energy comments)
+    if source not in SOURCES:
+        source = 'twitter'  # Use Twitter data
+    filters, years = comment_filters(source, country, energy_source, sentiment, years)
+    df = source_frequencies(source, filters, years)
 
-    # Generate the word cloud using word frequencies
-    word_freq_dict = dict(zip(df['word'], df['frequency']))  # Create a dictionary from the DataFrame
-    wordcloud_src = f"data:image/png;base64,{create_wordcloud(word_freq_dict)}"  # Generate base64 encoded image
+    # Link to the word cloud image, which is rendered and cached by the image route (not in this function)
+    image_src = None if df.empty else wordcloud_src(source, filters, years)  # None when no comment matches the filters
 
     # Create the bar chart for the top 10 most frequent words
     top_10_df = df.nlargest(10, 'frequency')  # Select top 10 words by frequency
@@ -96,4 +207,36 @@ def update_visualizations(source):
     )
     
     # Return the updated word cloud image source and bar chart figure
-    return wordcloud_src, bar_chart
+    return image_src, compact_figure(bar_chart)
+
+# Callback to update both the word cloud and the bar chart based on the selected data source
+@dash.get_app().callback(
+    [Output('wordcloud-img', 'src'),  # Output for the word cloud image
+     Output('bar-chart', 'figure')],  # Output for the bar chart figure
+    [Input('source-selector', 'value')]  # Input from the dropdown selector (source-selector)
+    + [Input(f'wordcloud-{column}', 'value') for column in FILTERS]  # Filters of the energy comments
+    + [Input('wordcloud-years', 'value')],
+    background=BACKGROUND_ENABLED,  # Computed by the job pool; a newer selection cancels the previous job
+    interval=POLL_INTERVAL_MS
+)
+def update_visualizations(source, country=None, energy_source=None, sentiment=None, years=None):
+    image_src, bar_chart = wordcloud_outputs(source, country, energy_source, sentiment, years)
+    # As a background job, render the image here (also when the outputs come from the cache) so the image
+    # request finds it in the shared cache instead of rendering it in the request thread
+    if BACKGROUND_ENABLED and image_src is not None:
+        source = source if source in SOURCES else 'twitter'
+        get_wordcloud_png(source, *comment_filters(source, country, energy_source, sentiment, years))
+    return image_src, bar_chart
+
+# Callback to enable the filters only for the energy comments (the other sources are global word counts)
+@dash.get_app().callback(
+    [Output(f'wordcloud-{column}', 'disabled') for column in FILTERS] + [Output('wordcloud-years', 'disabled')],
+    Input('source-selector', 'value')
+)
+def toggle_filters(source):
+    return [source != 'comments'] * (len(FILTERS) + 1)
+
+# Render the word clouds of both sources in the background after startup
+register_warmup('wordcloud', 'reddit_image', lambda: get_wordcloud_png('reddit'))
+register_warmup('wordcloud', 'twitter_image', lambda: get_wordcloud_png('twitter'))
+register_warmup('wordcloud', 'comment_word_counts', get_word_counts)
@@ -0,0 +1,27 @@
+import os  # Import os to point the app at the test data
+import threading  # Import threading to give each test its own SQLite connections
+import pytest  # Import pytest for the fixtures
+
+# The app modules read their settings at import time: no background jobs, cache or warm-up during the tests
+os.environ.setdefault('G21_BACKGROUND', '0')
+os.environ.setdefault('G21_MEMO_BACKEND', 'off')
+os.environ.setdefault('G21_WARMUP', '0')
+
+from benchmarks.synthetic_data import generate  # noqa: E402 Import the generator of the test datasets
+from utils import aggregates, data_store, network_index, search_index  # noqa: E402 Import the caches reset between tests
+
+
+# Folder of freshly generated datasets (1,000 comments), with empty dataset and aggregate caches and its own
+# search index, so every test starts from the files it sees and may append to them
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    generate(str(tmp_path))
+    monkeypatch.setattr(data_store, 'ASSETS_DIR', str(tmp_path))
+    monkeypatch.setattr(data_store, 'CACHE_ENABLED', False)
+    for cache in ['_frames', '_sources', '_history']:
+        monkeypatch.setattr(data_store, cache, {})
+    monkeypatch.setattr(aggregates, '_aggregates', {})
+    monkeypatch.setattr(network_index, '_keyword_sets', network_index.OrderedDict())
+    monkeypatch.setattr(search_index, 'INDEX_PATH', str(tmp_path / 'search_index.sqlite'))
+    monkeypatch.setattr(search_index, '_local', threading.local())
+    return tmp_path
@@ -0,0 +1,146 @@
+import numpy as np  # Import numpy to compare the arrays of the aggregates
+import pandas as pd  # Import pandas to build the batches and compare the frames
+import pytest  # Import pytest for the parametrized cases
+from utils import aggregates, network_index, word_counts  # Import the modules whose updaters are checked
+from utils.data_store import csv_path, dataset_changes, dataset_version, get_dataset  # Import the shared dataset registry
+from utils.ingest import append_batch, ingest_batch  # Import the ingestion of new rows
+from utils.search_index import search, update_index  # Import the full-text index of the Dataset Explorer
+
+
+# Batch of new rows for a dataset: its last rows again, with a country and a word not seen before (a new
+# country sorts between the known ones, so the categorical codes of the loaded frame shift)
+def new_batch(name, rows=50):
+    batch = pd.read_csv(csv_path(name), dtype=str).tail(rows).reset_index(drop=True)
+    country = 'Country' if 'Country' in batch.columns else 'country'
+    batch.loc[::3, country] = 'Germany'
+    if 'comment' in batch.columns:
+        batch.loc[::2, 'comment'] = batch.loc[::2, 'comment'] + ' geothermal heat pumps'
+    return batch
+
+
+def test_appended_rows_are_read_as_new_rows(assets):
+    loaded = get_dataset('energy_column_data')
+    version = dataset_version('energy_column_data')
+    batch = new_batch('energy_column_data')
+    assert append_batch('energy_column_data', batch) == len(batch)
+
+    _, df, new_rows = dataset_changes('energy_column_data', version)
+    assert len(df) == len(loaded) + len(batch)
+    assert new_rows is not None and len(new_rows) == len(batch)
+    assert list(new_rows['comment']) == list(batch['comment'])
+    assert 'Germany' in df['country'].cat.categories
+    expected = get_dataset('energy_column_data')
+    assert (df['country'].astype(str) == expected['country'].astype(str)).all()
+
+
+def test_rewritten_file_is_not_read_as_appended(assets):
+    get_dataset('trend_data')
+    version = dataset_version('trend_data')
+    path = csv_path('trend_data')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:  # The last row is replaced by another one
+        f.write(data[:data.rstrip(b'\r\n').rfind(b'\n') + 1] + b'01/01/2024,US,Wind,positive\n')
+
+    _, df, new_rows = dataset_changes('trend_data', version)
+    assert new_rows is None  # The file was edited, not only appended to: it is loaded again
+    assert 'US' in df['country'].cat.categories
+
+
+# Full rebuild of an aggregate from the whole dataset, to compare with its incrementally updated value
+def rebuilt(name, builder):
+    return builder(get_dataset(name))
+
+
+def assert_frames_equal(left, right):
+    pd.testing.assert_frame_equal(left.sort_index().sort_index(axis=1), right.sort_index().sort_index(axis=1),
+                                  check_dtype=False, check_index_type=False, check_categorical=False)
+
+
+def check_trend_cube(updated):
+    full = rebuilt('trend_data', aggregates.build_trend_cube)
+    assert updated['countries'] == full['countries'] and updated['years'] == full['years']
+    assert updated['daily'].keys() == full['daily'].keys()
+    for key, counts in full['daily'].items():
+        assert_frames_equal(updated['daily'][key], counts)
+
+
+def check_stackbar_counts(updated):
+    full = rebuilt('energy_column_data', aggregates.build_stackbar_counts)
+    assert updated.keys() == full.keys()
+    for energy, counts in full.items():
+        assert_frames_equal(updated[energy], counts)
+
+
+def check_policy_sentiment(updated):
+    full = rebuilt('reddit_comments', aggregates.build_policy_sentiment)
+    assert_frames_equal(updated['moments'], full['moments'])
+    assert updated['views'].keys() == full['views'].keys()
+    for country, averages in full['views'].items():
+        assert_frames_equal(updated['views'][country].set_index('policy'), averages.set_index('policy'))
+
+
+def check_keyword_counts(updated):
+    full = rebuilt('reddit_comments', lambda df: network_index.build_keyword_counts(df, updated['keywords']))
+    assert updated['countries'] == full['countries']
+    assert np.array_equal(updated['keyword_counts'], full['keyword_counts'])
+    assert np.array_equal(updated['country_counts'], full['country_counts'])
+
+
+def check_comment_tokens(updated):
+    full = rebuilt('reddit_comments', network_index.build_comment_tokens)
+    assert updated['rows'] == full['rows'] and updated['vocabulary'].equals(full['vocabulary'])
+    assert np.array_equal(updated['documents'], full['documents'])
+    assert np.array_equal(updated['codes'], full['codes'])
+
+
+def check_word_counts(updated):
+    full = rebuilt('energy_column_data', word_counts.build_word_counts)
+    assert updated['vocabulary'].equals(full['vocabulary'])
+    assert (updated['matrix'] != full['matrix']).nnz == 0
+    assert np.array_equal(updated['totals'], full['totals'])
+    assert np.array_equal(updated['ignored'], full['ignored'])
+
+
+# (dataset, aggregate, module and name of its updater, check against a full rebuild)
+AGGREGATES = {
+    'trend_cube': ('trend_data', aggregates.get_trend_cube, aggregates, 'update_trend_cube', check_trend_cube),
+    'stackbar_counts': ('energy_column_data', aggregates.get_stackbar_counts, aggregates, 'update_stackbar_counts',
+                        check_stackbar_counts),
+    'policy_sentiment': ('reddit_comments', aggregates.get_policy_sentiment, aggregates, 'update_policy_sentiment',
+                         check_policy_sentiment),
+    'keyword_counts': ('reddit_comments', network_index.get_keyword_counts, network_index, 'update_keyword_counts',
+                       check_keyword_counts),
+    'user_keyword_counts': ('reddit_comments', lambda: network_index.get_keyword_counts(['heat pumps', 'geothermal']),
+                            network_index, 'update_keyword_counts', check_keyword_counts),
+    'comment_tokens': ('reddit_comments', network_index.get_comment_tokens, network_index, 'update_comment_tokens',
+                       check_comment_tokens),
+    'word_counts': ('energy_column_data', word_counts.get_word_counts, word_counts, 'update_word_counts',
+                    check_word_counts),
+}
+
+
+@pytest.mark.parametrize('aggregate', sorted(AGGREGATES))
+def test_incremental_update_equals_full_rebuild(assets, monkeypatch, aggregate):
+    name, get, module, updater, check = AGGREGATES[aggregate]
+    get()
+    updates = []
+    update = getattr(module, updater)
+    monkeypatch.setattr(module, updater, lambda value, new_rows: updates.append(len(new_rows)) or update(value, new_rows))
+
+    batch = new_batch(name)
+    ingest_batch(name, batch)
+    updated = get()
+    assert updates == [len(batch)]  # Updated from the new rows, not rebuilt
+    check(updated)
+
+
+def test_search_index_adds_the_appended_rows(assets):
+    update_index()
+    batch = new_batch('energy_column_data')
+    append_batch('energy_column_data', batch)
+    df, added = update_index()
+    assert added == len(batch)  # Only the new rows were indexed
+    assert search('geothermal')['total'] == batch['comment'].str.contains('geothermal').sum()
+    assert search('geothermal', {'country': 'Germany'})['total'] == (
+        batch['comment'].str.contains('geothermal') & (batch['country'] == 'Germany')).sum()
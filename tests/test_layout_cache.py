@@ -0,0 +1,38 @@
+from collections import OrderedDict  # Import OrderedDict for an empty layout cache
+import networkx as nx  # Import NetworkX to build the graphs
+import numpy as np  # Import numpy to compare the positions
+from utils import layout_cache  # Import the cache of node positions
+
+
+# Graph of some energy types linked to countries and words, like the Network page builds
+def graph(energies, words):
+    G = nx.Graph()
+    G.add_edges_from((energy, country) for energy in energies for country in ['UK', 'France', 'Spain'])
+    G.add_edges_from((energy, word) for energy in energies for word in words)
+    return G
+
+
+def layout(monkeypatch, G, reference, history=()):
+    monkeypatch.setattr(layout_cache, '_layouts', OrderedDict())
+    for other in history:
+        layout_cache.cached_spring_layout(other, reference=reference)
+    return layout_cache.cached_spring_layout(G, reference=reference)
+
+
+def test_layout_only_depends_on_the_graph_and_its_reference(monkeypatch):
+    reference = lambda: graph(['solar', 'wind', 'hydropower'], ['growth', 'risk', 'clean', 'loss'])  # noqa: E731
+    G = graph(['solar', 'wind'], ['growth', 'risk', 'clean'])
+    fresh = layout(monkeypatch, G, reference)
+    # Other selections laid out before, in another order, do not change the positions
+    visited = layout(monkeypatch, G, reference, [graph(['solar', 'wind'], ['growth', 'risk']),
+                                                  graph(['wind', 'hydropower'], ['growth', 'risk', 'clean'])])
+    assert fresh.keys() == visited.keys()
+    assert all(np.array_equal(fresh[node], visited[node]) for node in fresh)
+    assert layout_cache.cached_spring_layout(G, reference=reference) is visited  # Served from the cache
+
+
+def test_reference_graph_is_laid_out_from_scratch(monkeypatch):
+    G = graph(['solar', 'wind', 'hydropower'], ['growth', 'risk'])
+    pos = layout(monkeypatch, G, lambda: graph(['solar', 'wind', 'hydropower'], ['growth', 'risk']))
+    expected = nx.spring_layout(G, k=1.2, seed=42)
+    assert all(np.array_equal(pos[node], expected[node]) for node in G)
@@ -0,0 +1,27 @@
+import flask  # Import flask for a test app serving the admin endpoint
+import pytest  # Import pytest for the fixtures
+from utils import memory_report  # Import the memory report endpoint
+
+
+# Flask test client of an app serving /admin/memory, in debug mode or not
+def admin_client(monkeypatch, token, debug):
+    monkeypatch.setattr(memory_report, 'ADMIN_TOKEN', token)
+    monkeypatch.setattr(memory_report, 'memory_report', lambda: {'datasets': []})
+    app = type('App', (), {'server': flask.Flask(__name__)})()
+    memory_report.register_admin_routes(app)
+    app.server.debug = debug
+    return app.server.test_client()
+
+
+@pytest.mark.parametrize('token, debug, header, status', [
+    (None, False, None, 403),  # Denied by default
+    (None, True, None, 200),  # Open in debug mode
+    ('secret', False, None, 403),
+    ('secret', False, 'Bearer wrong', 403),
+    ('secret', True, None, 403),  # The token is required even in debug mode once it is set
+    ('secret', False, 'Bearer secret', 200),
+])
+def test_admin_memory_requires_the_token_unless_debug(monkeypatch, token, debug, header, status):
+    client = admin_client(monkeypatch, token, debug)
+    response = client.get('/admin/memory', headers={'Authorization': header} if header else {})
+    assert response.status_code == status
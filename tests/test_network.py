@@ -0,0 +1,24 @@
+import pandas as pd  # Import pandas to read the comments again
+from utils.data_store import csv_path  # Import the path of the dataset files
+from utils.ingest import ingest_batch  # Import the ingestion of new rows
+
+
+# Marker sizes of the nodes of the Network graph, by node
+def node_sizes(energies, groups):
+    from pages.network import create_network_graph  # Import the page here, it needs the app to be created
+    figure = create_network_graph(energies, groups)
+    nodes = next(trace for trace in figure.data if trace.mode == 'markers+text')
+    return dict(zip(nodes.text, nodes.marker.size))
+
+
+def test_node_sizes_do_not_grow_with_the_number_of_comments(assets):
+    import app  # noqa: F401 Import the app, which registers the pages
+    from pages.network import MAX_NODE_AREA  # Import the marker area of the most frequent node
+    energies, groups = ['solar', 'wind', 'hydropower'], ['positive', 'negative']
+    before = node_sizes(energies, groups)
+    assert max(before.values()) == MAX_NODE_AREA
+
+    ingest_batch('reddit_comments', pd.read_csv(csv_path('reddit_comments'), dtype=str))  # Every comment twice
+    after = node_sizes(energies, groups)
+    assert after.keys() == before.keys()
+    assert all(abs(after[node] - size) < 1e-9 for node, size in before.items())
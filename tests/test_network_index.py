@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor  # Import a thread pool to match keywords from several threads
+import sys  # Import sys to switch between threads more often
+import pandas as pd  # Import pandas to build the comments
+import pytest  # Import pytest for the parametrized cases
+from utils import aggregates, network_index  # Import the aggregate cache and the keyword counts of the Network page
+from utils.network_index import build_comment_tokens, compile_matcher, get_keyword_counts, match_keywords, parse_keyword_groups  # Import the keyword matching of the Network page
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('positive: growth, Clean\nnegative: risk, heat  pumps',
+     [('positive', ['growth', 'clean']), ('negative', ['risk', 'heat pumps'])]),
+    ('solar, wind\n\nwater: hydropower', [('group 1', ['solar', 'wind']), ('water', ['hydropower'])]),
+    ('a: risk, growth\nb: growth, loss, risk', [('a', ['risk', 'growth']), ('b', ['loss'])]),  # Repeated keywords
+    ('  spaced name  :  cost-of-living , it\'s,', [('spaced name', ['cost of living', 'it s'])]),
+    ('time: 10:30, noon', [('time: 10', ['30', 'noon'])]),  # The last colon separates the name
+    ('empty: , ,\nonly: ;', []),
+    ('', []),
+    (None, []),
+])
+def test_parse_keyword_groups(text, expected):
+    assert parse_keyword_groups(text) == expected
+
+
+def test_keywords_match_whole_words_and_phrases_within_a_comment():
+    comments = pd.DataFrame({'comment': ['Heat pumps are great', 'more heat', 'pumps and heat', 'the window',
+                                         'wind, heat-pumps', None]})
+    matrix = match_keywords(build_comment_tokens(comments), ['wind', 'heat pumps', 'unknown word'])
+    assert matrix.toarray().tolist() == [[0, 1, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [1, 1, 0], [0, 0, 0]]
+
+
+def test_counts_of_user_keyword_sets_are_bounded(assets, monkeypatch):
+    monkeypatch.setattr(network_index, 'KEYWORD_SETS_CACHE_SIZE', 2)
+    for keyword in ['growth', 'risk', 'clean']:
+        get_keyword_counts([keyword])
+    cached = [name for name in aggregates._aggregates if isinstance(name, tuple)]
+    assert cached == [('keyword_counts', ('solar', 'wind', 'hydropower', 'risk')),
+                      ('keyword_counts', ('solar', 'wind', 'hydropower', 'clean'))]
+
+
+def test_compiled_keyword_sets_are_shared_between_threads(monkeypatch):
+    monkeypatch.setattr(network_index, 'MATCHER_CACHE_SIZE', 4)
+    tokens = build_comment_tokens(pd.DataFrame({'comment': ['wind and solar growth', 'heat pumps', 'risk']}))
+    keyword_sets = [('wind', 'solar', f'word{i % 12}') for i in range(2000)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often, so they interleave inside the cache updates
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            matrices = list(pool.map(lambda keywords: match_keywords(tokens, keywords), keyword_sets))
+    finally:
+        sys.setswitchinterval(interval)
+    assert all(matrix.toarray()[:, :2].tolist() == [[1, 1], [0, 0], [0, 0]] for matrix in matrices)
+    assert len(tokens['matchers']) == 4
+    matcher = compile_matcher(tokens, ('risk',))
+    assert compile_matcher(tokens, ('risk',)) is matcher  # Served from the cache
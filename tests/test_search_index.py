@@ -0,0 +1,52 @@
+import pytest  # Import pytest for the parametrized cases
+from utils.data_store import get_dataset  # Import the shared dataset registry
+from utils.search_index import build_match_query, search, _snippet_markdown  # Import the FTS5 query builder and the search
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('solar panel', 'comment : ("solar" "panel")'),
+    ('"wind farm" grid', 'comment : ("wind farm" "grid")'),
+    ('turb*', 'comment : ("turb"*)'),
+    ('"wind far"*', 'comment : ("wind far"*)'),
+    ('Énergie', 'comment : ("Énergie")'),
+    # FTS5 operators, column filters and special characters are searched as plain words
+    ('solar OR wind', 'comment : ("solar" "OR" "wind")'),
+    ('NOT grid', 'comment : ("NOT" "grid")'),
+    ('NEAR(solar wind)', 'comment : ("NEAR solar" "wind")'),
+    ('facets:f0v1', 'comment : ("facets f0v1")'),
+    ('^solar -wind +grid', 'comment : ("solar" "wind" "grid")'),
+    ('say "it\'s" now', 'comment : ("say" "it s" "now")'),
+    ('"wind farm', 'comment : ("wind" "farm")'),  # Unterminated quote
+    ('', None),
+    (None, None),
+    ('"" * - ()', None),
+])
+def test_build_match_query(text, expected):
+    assert build_match_query(text) == expected
+
+
+@pytest.mark.parametrize('text', ['solar OR', 'AND', '"', '*', 'a*b', 'comment:solar', 'facets : f0v1', 'solar)',
+                                  '(', 'NEAR(', '"wind" "', '\\'])
+def test_typed_operators_do_not_fail_the_search(assets, text):
+    result = search(text)
+    assert result['total'] >= 0 and len(result['rows']) <= 25
+
+
+def test_facet_tokens_are_not_searched_as_words(assets):
+    assert search('f0v0')['total'] == 0
+    assert search('solar')['total'] > 0
+
+
+def test_snippets_escape_markdown_and_mark_the_matches():
+    assert _snippet_markdown('a*b [x] \x02wind\x03_farm') == 'a\\*b \\[x\\] **wind**\\_farm'
+
+
+def test_facet_counts_match_the_comments(assets):
+    df = get_dataset('energy_column_data')
+    matches = df[df['comment'].str.lower().str.contains(r'\bsolar\b')]
+    result = search('solar', {'country': 'France'})
+    assert result['total'] == int((matches['country'] == 'France').sum())
+    # Each facet is counted with the other facets applied
+    assert dict(result['facets']['country']) == matches['country'].value_counts()[lambda counts: counts > 0].to_dict()
+    expected = matches[matches['country'] == 'France']['sentiment'].value_counts()
+    assert dict(result['facets']['sentiment']) == expected[expected > 0].to_dict()
@@ -0,0 +1,121 @@
+import io  # Import io to read the exported bytes
+import pandas as pd  # Import pandas to build the expected views
+import pytest  # Import pytest for the parametrized cases
+from utils.data_store import get_dataset  # Import the shared dataset registry
+from utils.table_query import export_view, filter_mask, get_page, split_filter_part, split_filter_query, view_index  # Import the server-side table queries
+
+DATASET = 'energy_column_data'
+
+
+def test_sort_by_date_orders_by_date_not_text(assets):
+    records, _, _ = get_page(DATASET, 0, 1000, sort_by=[{'column_id': 'comment_date', 'direction': 'desc'}])
+    dates = pd.to_datetime(pd.Series([record['comment_date'] for record in records]), format='%d/%m/%Y')
+    assert len(dates) == len(get_dataset(DATASET))
+    assert dates.is_monotonic_decreasing
+
+
+def test_pages_show_dates_in_the_file_format(assets):
+    records, _, _ = get_page(DATASET, 0, 5, sort_by=[{'column_id': 'comment_date', 'direction': 'asc'}])
+    raw = pd.read_csv(assets / 'energy_column_data.csv', dtype=str)['comment_date']
+    first = pd.to_datetime(raw, format='%d/%m/%Y').min().strftime('%d/%m/%Y')
+    assert records[0]['comment_date'] == first
+
+
+def test_sort_on_several_columns_is_stable(assets):
+    sort_by = [{'column_id': 'country', 'direction': 'asc'}, {'column_id': 'comment_date', 'direction': 'desc'}]
+    index = view_index(DATASET, sort_by=sort_by)
+    df = get_dataset(DATASET)
+    expected = df.sort_values(['country', 'comment_date'], ascending=[True, False], kind='stable').index
+    assert list(index) == list(expected)
+
+
+def test_sorted_filtered_view_keeps_the_positions_of_the_dataset(assets):
+    sort_by = [{'column_id': 'comment_date', 'direction': 'asc'}]
+    index = view_index(DATASET, "{sentiment} = 'positive'", sort_by)
+    df = get_dataset(DATASET)
+    expected = df[df['sentiment'] == 'positive'].sort_values('comment_date', kind='stable').index
+    assert list(index) == list(expected)
+
+
+@pytest.mark.parametrize('filter_part, expected', [
+    ("{country} eq 'UK'", ('country', 'eq', 'UK')),
+    ('{country} = "UK"', ('country', 'eq', 'UK')),
+    ('{country} eq UK', ('country', 'eq', 'UK')),
+    ('{compound} >= 0.5', ('compound', 'ge', '0.5')),  # Numbers are read by the comparisons of numeric columns
+    ("{compound} lt '0.5'", ('compound', 'lt', '0.5')),
+    ('{comment_date} contains 2020', ('comment_date', 'contains', '2020')),  # Not 2020.0
+    ('{comment_date} datestartswith 07', ('comment_date', 'datestartswith', '07')),
+    ("{comment} contains 'it\\'s'", ('comment', 'contains', "it's")),  # Escaped quote
+    ('{comment} contains "say \\"no\\""', ('comment', 'contains', 'say "no"')),
+    ('{comment} contains `a "b" c`', ('comment', 'contains', 'a "b" c')),
+    ("{comment} contains 'large energy'", ('comment', 'contains', 'large energy')),  # 'ge ' inside the value
+    ("{comment} icontains 'wind'", ('comment', 'contains', 'wind')),  # Case toggle of the filter cell
+    ("{energy source} ne 'Solar'", ('energy source', 'ne', 'Solar')),
+    ("{country} eq '", ('country', 'eq', "'")),  # A lone quote is not a quoted value
+    ("country eq 'UK'", (None, None, None)),
+    ("{country} like 'UK'", (None, None, None)),
+])
+def test_split_filter_part(filter_part, expected):
+    assert tuple(split_filter_part(filter_part)) == expected
+
+
+def test_split_filter_query_keeps_quoted_separators():
+    query = "{comment} contains 'wind && solar' && {country} eq \"U\\\" && K\" && {sentiment} eq positive"
+    assert split_filter_query(query) == [
+        "{comment} contains 'wind && solar'", '{country} eq "U\\" && K"', '{sentiment} eq positive']
+
+
+def test_filter_mask_matches_quoted_values():
+    df = pd.DataFrame({
+        'comment': ["it's a large energy plan", 'wind && solar', 'Wind farm', None],
+        'country': pd.Categorical(['UK', 'France', 'UK', None]),
+        'compound': [0.5, -0.25, 0.75, 0.0],
+    })
+    assert filter_mask(df, "{comment} contains 'it\\'s'").tolist() == [True, False, False, False]
+    assert filter_mask(df, "{comment} contains 'large energy'").tolist() == [True, False, False, False]
+    assert filter_mask(df, "{comment} contains 'wind && solar'").tolist() == [False, True, False, False]
+    assert filter_mask(df, "{comment} contains WIND && {country} eq UK").tolist() == [False, False, True, False]
+    assert filter_mask(df, "{country} ne 'UK'").tolist() == [False, True, False, False]
+    assert filter_mask(df, '{compound} ge 0.5 && {unknown} eq 1').tolist() == [True, False, True, False]
+    assert filter_mask(df, "{compound} gt '0'").tolist() == [True, False, True, False]
+
+
+@pytest.mark.parametrize('sort_by', [5, 'comment_date', [{}], [5], [{'column_id': 'country'}],
+                                     [{'column_id': 'country', 'direction': 'up'}]])
+def test_malformed_sort_by_fails_the_export_before_it_starts(assets, sort_by):
+    with pytest.raises(ValueError):
+        export_view(DATASET, 'csv', sort_by=sort_by)  # Raised by the call, not while the stream is read
+
+
+def test_export_streams_the_sorted_view(assets):
+    sort_by = [{'column_id': 'comment_date', 'direction': 'desc'}]
+    data = b''.join(export_view(DATASET, 'csv', "{sentiment} eq 'positive'", sort_by))
+    records, _, _ = get_page(DATASET, 0, 1000, "{sentiment} eq 'positive'", sort_by)
+    exported = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    assert exported.to_dict('records') == pd.DataFrame(records).astype(str).to_dict('records')
+
+
+def test_filter_mask_matches_unquoted_values():
+    df = pd.DataFrame({
+        'comment': ['prices of 2020', 'the 2021 plan', '1e3 panels', None],
+        'code': pd.Categorical(['07', '7', '1e3', None]),
+        'compound': [0.5, -0.25, 1000.0, 0.0],
+        'comment_date': pd.to_datetime(['07/03/2020', '15/07/2021', '01/12/2020', None], format='%d/%m/%Y'),
+    })
+    dates = {'comment_date': '%d/%m/%Y'}
+    assert filter_mask(df, '{comment} contains 2020').tolist() == [True, False, False, False]
+    assert filter_mask(df, '{comment} contains 1e3').tolist() == [False, False, True, False]
+    assert filter_mask(df, '{code} eq 07').tolist() == [True, False, False, False]  # Text, not the number 7
+    assert filter_mask(df, '{compound} eq 1e3').tolist() == [False, False, True, False]
+    assert filter_mask(df, '{compound} lt 0').tolist() == [False, True, False, False]
+    assert filter_mask(df, '{compound} gt abc').tolist() == [False, False, False, False]
+    assert filter_mask(df, '{comment_date} contains 2020', dates).tolist() == [True, False, True, False]
+    assert filter_mask(df, '{comment_date} datestartswith 07', dates).tolist() == [True, False, False, False]
+    assert filter_mask(df, '{comment_date} ge 2021', dates).tolist() == [False, True, False, False]
+
+
+def test_unquoted_date_filters_match_like_quoted_ones(assets):
+    for query in ['{comment_date} contains 2020', '{comment_date} datestartswith 07']:
+        unquoted = view_index(DATASET, query)
+        assert len(unquoted) > 0
+        assert list(unquoted) == list(view_index(DATASET, query.replace('2020', "'2020'").replace('07', "'07'")))
@@ -0,0 +1,47 @@
+import pandas as pd  # Import pandas to build the daily counts
+import pytest  # Import pytest for the parametrized cases
+from utils.aggregates import build_trend_cube, trend_rollup, trend_slice  # Import the Trends page rollups
+
+
+# Trend rows: one positive comment a day from 'start' to 'end'
+def daily_rows(start, end):
+    days = pd.date_range(start, end, freq='D')
+    return pd.DataFrame({'country': 'UK', 'energy_source': 'Wind', 'sentiment': 'positive', 'comment_date': days})
+
+
+def test_week_slice_keeps_the_week_holding_january_1():
+    cube = build_trend_cube(daily_rows('2022-12-01', '2024-01-31'))
+    weeks = trend_slice(trend_rollup(cube, 'UK', 'Wind', 'week'), 'week', [2023, 2023])
+    # January 1 2023 is a Sunday: its week starts on Monday December 26 2022
+    assert weeks.index[0] == pd.Timestamp('2022-12-26')
+    assert weeks.index[-1] == pd.Timestamp('2023-12-25')
+    assert weeks['positive'].sum() == 7 * len(weeks)
+
+
+def test_week_slice_starting_on_a_monday():
+    cube = build_trend_cube(daily_rows('2023-12-01', '2024-02-28'))
+    weeks = trend_slice(trend_rollup(cube, 'UK', 'Wind', 'week'), 'week', [2024, 2024])
+    assert weeks.index[0] == pd.Timestamp('2024-01-01')  # A Monday
+
+
+@pytest.mark.parametrize('resolution, first, last, periods', [
+    ('day', '2023-01-01', '2023-12-31', 365),
+    ('month', '2023-01-01', '2023-12-01', 12),
+    ('year', 2023, 2023, 1),
+])
+def test_slices_cover_the_year_range(resolution, first, last, periods):
+    cube = build_trend_cube(daily_rows('2022-06-01', '2024-06-30'))
+    counts = trend_slice(trend_rollup(cube, 'UK', 'Wind', resolution), resolution, [2023, 2023])
+    first = first if resolution == 'year' else pd.Timestamp(first)
+    last = last if resolution == 'year' else pd.Timestamp(last)
+    assert (counts.index[0], counts.index[-1], len(counts)) == (first, last, periods)
+    assert counts['positive'].sum() == 365
+
+
+def test_rollups_fill_periods_without_comments():
+    rows = pd.concat([daily_rows('2023-01-01', '2023-01-03'), daily_rows('2023-03-10', '2023-03-10')])
+    cube = build_trend_cube(rows)
+    months = trend_rollup(cube, 'UK', 'Wind', 'month')
+    assert months['positive'].tolist() == [3, 0, 1]  # February has no comments but is kept as 0
+    assert trend_rollup(cube, 'UK', 'Wind', 'month') is months  # Cached in the cube
+    assert trend_rollup(cube, 'France', 'Wind', 'month') is None
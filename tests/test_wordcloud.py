@@ -0,0 +1,19 @@
+import pytest  # Import pytest for the parametrized cases
+
+
+# Flask test client of the app (its pages register the word cloud image route; the layouts of the pages are
+# built on the first request, from the test datasets)
+@pytest.fixture
+def client(assets):
+    from app import app  # Import the app here, the test settings of conftest are set by then
+    return app.server.test_client()
+
+
+@pytest.mark.parametrize('years', ['2019', 'abc', '2019-2020-2021', '2019-', '-2019', ''])
+def test_malformed_years_are_rejected(client, years):
+    assert client.get(f'/wordcloud-image/comments.png?years={years}').status_code == 400
+
+
+def test_year_range_renders_the_image(client):
+    response = client.get('/wordcloud-image/comments.png?years=2018-2024')
+    assert response.status_code == 200 and response.mimetype == 'image/png'
@@ -0,0 +1,204 @@
+import threading  # Import threading to guard the cache between callback threads
+import numpy as np  # Import numpy for vector operations
+import pandas as pd  # Import pandas for data manipulation
+from scipy.special import stdtrit  # Import the Student's t quantile function for the confidence intervals
+from utils.data_store import get_dataset, dataset_version, dataset_changes  # Import the shared dataset registry
+from utils.metrics import phase  # Import the timer of the callback data-access phase
+
+# Pre-computed aggregates, keyed by aggregate name: {name: (dataset version, value)}
+_aggregates = {}
+_lock = threading.RLock()  # Re-entrant: an aggregate may be built from other aggregates
+
+
+# Return the aggregate built by 'builder' from a dataset, rebuilding it only when the dataset file changes
+# (or when 'extra_version' changes, for aggregates that also depend on another file).
+# When rows were only appended to the dataset, 'updater(aggregate, new_rows)' returns the updated aggregate
+# instead, so the work depends on the number of new rows only. It must return a new object, not modify
+# the aggregate in place, as other threads may be reading it.
+def get_aggregate(name, dataset, builder, extra_version=None, updater=None):
+    with phase('data'):
+        version = (dataset_version(dataset), extra_version)
+        cached = _aggregates.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with _lock:
+            cached = _aggregates.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            if cached is not None and updater is not None and cached[0][1] == extra_version:
+                loaded_version, _, new_rows = dataset_changes(dataset, cached[0][0])
+                if new_rows is not None:
+                    value = updater(cached[1], new_rows) if len(new_rows) else cached[1]
+                    _aggregates[name] = ((loaded_version, extra_version), value)
+                    return value
+            value = builder(get_dataset(dataset))
+            _aggregates[name] = (version, value)
+            return value
+
+
+# Drop a cached aggregate (for aggregates kept only while they are used, like the counts of user keyword sets)
+def discard_aggregate(name):
+    with _lock:
+        _aggregates.pop(name, None)
+
+
+####################### TRENDS ###############################
+# Add two count frames, keeping integer counts (rows and columns missing from one of them count as 0)
+def add_counts(counts, new_counts):
+    return counts.add(new_counts, fill_value=0).fillna(0).astype('int64')
+
+
+# Daily (country, energy_source) -> date x sentiment count frames of some trend rows (days without comments
+# are left out). This is the base rollup of the Trends page: the coarser resolutions are derived from it.
+def _trend_series(df):
+    df = df.assign(day=df['comment_date'].dt.normalize()).dropna(subset=['day'])
+
+    counts = df.groupby(['country', 'energy_source', 'day', 'sentiment'], observed=True).size().unstack(fill_value=0)
+    counts.columns = counts.columns.astype(object)  # Plain sentiment labels, so new sentiments can be added
+    counts = counts.reindex(columns=counts.columns.union(['positive', 'negative']), fill_value=0)
+    return {key: group.droplevel([0, 1])
+            for key, group in counts.groupby(level=['country', 'energy_source'], observed=True)}
+
+
+# Cube of daily counts, with the (country, energy source) values of the dropdowns, the range of years of the
+# slider and an empty cache of the coarser resolutions derived from it
+def _trend_cube(series):
+    days = [counts.index for counts in series.values() if len(counts)]
+    return {
+        'countries': sorted({country for country, _ in series}),  # Dropdown values
+        'energy_sources': sorted({energy for _, energy in series}),
+        'years': (min(index[0] for index in days).year, max(index[-1] for index in days).year) if days else None,
+        'daily': series,
+        'rollups': {},  # {(country, energy source, resolution): counts}
+    }
+
+
+# Build the date x country x energy_source x sentiment count cube of the Trends page.
+# The counts of each (country, energy source) pair are stored as a small date-indexed frame
+# with one column per sentiment, so a callback only needs a dictionary lookup and a date slice.
+def build_trend_cube(df):
+    return _trend_cube(_trend_series(df))
+
+
+# Add the counts of new trend rows to the cube (only the series of the new rows are rebuilt; the rollups
+# of the coarser resolutions are derived again when needed)
+def update_trend_cube(cube, new_rows):
+    series = dict(cube['daily'])
+    for key, counts in _trend_series(new_rows).items():
+        series[key] = add_counts(series[key], counts).sort_index() if key in series else counts
+    return _trend_cube(series)
+
+
+# Time resolutions of the Trends page: the pandas frequency each one is summed to, each period labelled by its
+# first day (weeks start on Monday), the years being indexed by their number
+RESOLUTIONS = {'day': 'D', 'week': 'W-MON', 'month': 'MS', 'year': None}
+
+
+# Counts of a (country, energy source) pair at a resolution, summed from the daily rollup once and cached in
+# the cube. Periods without comments count as 0, so lines and rolling averages are continuous. None when the
+# pair has no comments.
+def trend_rollup(cube, country, energy, resolution='year'):
+    key = (country, energy, resolution)
+    if key in cube['rollups']:
+        return cube['rollups'][key]
+    daily = cube['daily'].get((country, energy))
+    if daily is None:
+        return None
+    if resolution == 'year':
+        counts = daily.groupby(daily.index.year).sum()
+        counts.index.name = 'year'
+    else:
+        counts = daily.resample(RESOLUTIONS[resolution], label='left', closed='left').sum()
+    cube['rollups'][key] = counts
+    return counts
+
+
+# Periods of a rollup overlapping the year range [first, last]: a week is kept when any of its days is in the
+# range, so the week holding January 1 of the first year starts on the Monday on or before it
+def trend_slice(counts, resolution, years):
+    if resolution == 'year':
+        return counts.loc[years[0]:years[1]]
+    start = pd.Timestamp(int(years[0]), 1, 1)
+    if resolution == 'week':
+        start = pd.offsets.Week(weekday=0).rollback(start)
+    return counts.loc[start:pd.Timestamp(int(years[1]), 12, 31)]
+
+
+# Return the cached sentiment cube of the Trends page
+def get_trend_cube():
+    return get_aggregate('trend_cube', 'trend_data', build_trend_cube, updater=update_trend_cube)
+
+
+####################### OVERVIEW ###############################
+# Build the energy_source x country x sentiment count table of the Overview page,
+# stored as one country x sentiment count frame per energy source
+def build_stackbar_counts(df):
+    counts = df.groupby(['energy_source', 'country', 'sentiment'], observed=True).size().unstack(fill_value=0)
+    counts.columns = counts.columns.astype(object)
+    return {energy: group.droplevel(0) for energy, group in counts.groupby(level='energy_source', observed=True)}
+
+
+# Add the counts of new rows to the count table of the Overview page
+def update_stackbar_counts(counts, new_rows):
+    counts = dict(counts)
+    for energy, table in build_stackbar_counts(new_rows).items():
+        counts[energy] = add_counts(counts[energy], table) if energy in counts else table
+    return counts
+
+
+# Return the cached count table of the Overview page
+def get_stackbar_counts():
+    return get_aggregate('stackbar_counts', 'energy_column_data', build_stackbar_counts, updater=update_stackbar_counts)
+
+
+####################### AVERAGE SENTIMENT ###############################
+# Confidence level of the intervals shown around the average sentiments
+CONFIDENCE = 0.95
+
+
+# Count, sum and sum of squares of the compound scores of each (Country, policy) pair. Comments without a
+# country are kept (under a missing country) as they count towards 'All'. Sums are taken in float64.
+def build_policy_moments(df):
+    compound = df['compound'].astype('float64')
+    df = df.assign(compound=compound, compound_squared=compound ** 2)
+    return df.groupby(['Country', 'policy'], dropna=False, observed=True).agg(
+        count=('compound', 'count'), sum=('compound', 'sum'), sumsq=('compound_squared', 'sum'))
+
+
+# Average sentiment of each policy from its moments, with the half width of its confidence interval
+# (Student's t, missing below 2 comments) and the policy label of the chart, highest average first
+def policy_averages(moments):
+    moments = moments[moments.index.notna()]
+    count = moments['count'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = moments['sum'].to_numpy() / count
+        variance = np.clip((moments['sumsq'].to_numpy() - moments['sum'].to_numpy() * mean) / (count - 1), 0, None)
+        half_width = np.where(count > 1, stdtrit(count - 1, (1 + CONFIDENCE) / 2) * np.sqrt(variance / count), np.nan)
+    averages = pd.DataFrame({'policy': moments.index.str.upper(), 'compound': mean,
+                             'count': moments['count'].to_numpy(), 'ci': half_width})
+    return averages.sort_values(by='compound', ascending=False)
+
+
+# Policy averages of every country and of 'All' (the exact rollup of every comment), next to the moments
+def _policy_sentiment(moments):
+    views = {'All': policy_averages(moments.groupby(level='policy', observed=True).sum())}
+    for country, group in moments.groupby(level='Country', observed=True):
+        views[country] = policy_averages(group.droplevel('Country'))
+    return {'moments': moments, 'views': views}
+
+
+# Build the policy moments and averages of the Average Sentiment page
+def build_policy_sentiment(df):
+    return _policy_sentiment(build_policy_moments(df))
+
+
+# Add the moments of new comments (the averages are recomputed from the moments, not from the comments)
+def update_policy_sentiment(policy_sentiment, new_rows):
+    moments = pd.concat([policy_sentiment['moments'], build_policy_moments(new_rows)])
+    return _policy_sentiment(moments.groupby(level=['Country', 'policy'], dropna=False, observed=True).sum())
+
+
+# Return the cached policy moments and averages of the Average Sentiment page
+def get_policy_sentiment():
+    return get_aggregate('policy_sentiment', 'reddit_comments', build_policy_sentiment, updater=update_policy_sentiment)
@@ -0,0 +1,12 @@
+import json  # Import json to convert figures to plain data
+import os  # Import os to read the configuration from the environment
+
+# Set G21_CLIENTSIDE=1 to send the small aggregated views to the browser once (in a dcc.Store)
+# and update their figures with client-side callbacks instead of a server round trip per click
+CLIENTSIDE_MODE = os.environ.get('G21_CLIENTSIDE', '0') == '1'
+
+
+# Plain JSON data of a figure (memoized callbacks may already return plain data),
+# used as a template whose traces are filled in by the client-side callbacks
+def figure_json(fig):
+    return fig if isinstance(fig, dict) else json.loads(fig.to_json())
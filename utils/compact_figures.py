@@ -0,0 +1,97 @@
+import base64  # Import base64 to encode the typed arrays
+import os  # Import os to read the configuration from the environment
+import numpy as np  # Import numpy to round and pack the numeric arrays
+
+# Set G21_COMPACT_FIGURES=0 to send the figures exactly as Plotly serializes them
+COMPACT_ENABLED = os.environ.get('G21_COMPACT_FIGURES', '1') != '0'
+
+# Decimals kept in floating point data (coordinates, averages, percentages); far below what a chart can display
+DECIMALS = 4
+
+# Data arrays sent as typed binary arrays ({'dtype': ..., 'bdata': base64}, read natively by plotly.js >= 2.28),
+# when they have at least TYPED_ARRAY_MIN_LENGTH values; shorter arrays are smaller as plain JSON
+TYPED_ARRAY_KEYS = {'x', 'y', 'z', 'values', 'marker.size'}
+TYPED_ARRAY_MIN_LENGTH = 16
+
+
+# Numeric content of a list or 1-D array as a float or integer numpy array (None becomes NaN), or None if not
+# numeric. 2-D arrays (e.g. customdata) are left as they are.
+def _numeric_array(values):
+    if isinstance(values, np.ndarray):
+        return values if values.dtype.kind in 'iuf' and values.ndim == 1 else None
+    if not values or not all(value is None or (isinstance(value, (int, float, np.number)) and not isinstance(value, bool))
+                             for value in values):
+        return None
+    if any(value is None for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+    return np.asarray(values)
+
+
+# Plotly typed array of a numeric array: the smallest integer type that holds integers, float32 for rounded
+# floats small enough to keep DECIMALS exact digits in float32's 7 significant digits, float64 otherwise
+def typed_array(array):
+    if array.dtype.kind in 'iu':
+        for dtype in ('i1', 'u1', 'i2', 'u2', 'i4', 'u4'):
+            info = np.iinfo(dtype)
+            if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+                break
+        else:
+            dtype = 'f8'
+    else:
+        finite = array[np.isfinite(array)]
+        dtype = 'f4' if finite.size == 0 or np.abs(finite).max() < 10 ** (7 - DECIMALS) else 'f8'
+    packed = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': dtype, 'bdata': base64.b64encode(packed.tobytes()).decode('ascii')}
+
+
+# Compact one array of a trace: numeric data is rounded, and long data arrays become typed arrays
+def _compact_array(path, values):
+    array = _numeric_array(values)
+    if array is None:
+        return values
+    if array.dtype.kind == 'f':
+        array = np.round(array, DECIMALS)
+    if path in TYPED_ARRAY_KEYS and len(array) >= TYPED_ARRAY_MIN_LENGTH:
+        return typed_array(array)
+    if array.dtype.kind == 'f':
+        return [None if np.isnan(value) else value for value in array.tolist()]
+    return array.tolist()
+
+
+# Compact every array of a trace (nested attributes such as marker.size included)
+def _compact_trace(trace, prefix=''):
+    compact = {}
+    for key, value in trace.items():
+        path = prefix + key
+        if isinstance(value, dict):
+            compact[key] = _compact_trace(value, path + '.')
+        elif isinstance(value, (list, tuple, np.ndarray)):
+            compact[key] = _compact_array(path, value)
+        else:
+            compact[key] = value
+    return compact
+
+
+# Keep only the trace defaults of the template for the trace types the figure uses: the template holds
+# defaults for every Plotly trace type, which is most of the size of a small figure
+def _strip_template(template, trace_types):
+    template = dict(template)
+    if 'data' in template:
+        template['data'] = {trace_type: defaults for trace_type, defaults in template['data'].items()
+                            if trace_type in trace_types}
+    return template
+
+
+# Return the figure as plain data ready to be sent to the browser, with rounded numbers, typed arrays and
+# a template stripped to what the figure uses. The figure looks the same; it is only smaller.
+def compact_figure(fig):
+    if not COMPACT_ENABLED:
+        return fig
+    figure = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else dict(fig)
+    data = [_compact_trace(trace) for trace in figure.get('data', [])]
+    layout = dict(figure.get('layout', {}))
+    if 'template' in layout:
+        template = layout['template']
+        template = template.to_plotly_json() if hasattr(template, 'to_plotly_json') else template
+        layout['template'] = _strip_template(template, {trace.get('type', 'scatter') for trace in data})
+    return {'data': data, 'layout': layout}
@@ -0,0 +1,265 @@
+import hashlib  # Import hashlib to recognise the part of a CSV file that was already loaded
+import io  # Import io to parse CSV data read from the file
+import os  # Import os for file paths and file metadata
+import threading  # Import threading to guard the shared registry between callback threads
+import pandas as pd  # Import pandas for data manipulation
+from utils.metrics import phase  # Import the timer of the callback data-access phase
+
+# Folder containing the CSV files (can be pointed somewhere else with the G21_ASSETS_DIR environment variable)
+ASSETS_DIR = os.environ.get('G21_ASSETS_DIR', 'assets')
+
+# Set G21_DATA_CACHE=0 to always parse the CSV files and never write the binary cache
+CACHE_ENABLED = os.environ.get('G21_DATA_CACHE', '1') != '0'
+
+# Bytes at the end of the loaded part of a CSV file compared to tell an append (new rows) from an edit
+TAIL_BYTES = 4096
+
+# Number of recent versions of a dataset whose row count is kept, so aggregates can be updated with the new rows
+MAX_HISTORY = 32
+
+# Type of the free text columns: pyarrow strings (one buffer per column instead of a Python object per row),
+# or plain Python strings when pyarrow is missing
+try:
+    import pyarrow  # noqa: F401
+    TEXT = 'string[pyarrow]'
+except ImportError:
+    TEXT = str
+
+####################### DATASETS ###############################
+# Every dataset used by the pages, with explicit column types so pandas does not have to guess them.
+# Repeated labels (countries, policies, energy sources, sentiments, dates) are categorical, free text uses the
+# compact TEXT type and numbers the smallest type that holds them; sums and averages are computed in float64.
+# 'dates' lists columns that are parsed to datetimes once here instead of in every page.
+# 'pages' lists the pages reading the dataset (for the memory report).
+DATASETS = {
+    'reddit_comments': {
+        'file': 'reddit_comments.csv',
+        'dtype': {'Country': 'category', 'policy': 'category', 'comment': TEXT, 'compound': 'float32'},
+        'pages': ['average_sentiment', 'network'],
+    },
+    'energy_column_data': {
+        'file': 'energy_column_data.csv',
+        'dtype': {'comment': TEXT, 'country': 'category', 'energy_source': 'category', 'sentiment': 'category',
+                  'comment_date': str},
+        'dates': {'comment_date': '%d/%m/%Y'},
+        'pages': ['stackbar', 'dataset'],
+    },
+    'trend_data': {
+        'file': 'trend_data.csv',
+        'dtype': {'country': 'category', 'energy_source': 'category', 'sentiment': 'category', 'comment_date': str},
+        'dates': {'comment_date': '%d/%m/%Y'},
+        'pages': ['Trend_energy'],
+    },
+    'tweets_word_frequency': {
+        'file': 'tweets_word_frequency.csv',
+        'dtype': {'word': TEXT, 'frequency': 'int32'},
+        'pages': ['wordcloud'],
+    },
+    'reddit_word_frequency': {
+        'file': 'reddit_word_frequency.csv',
+        'dtype': {'word': TEXT, 'frequency': 'int32'},
+        'pages': ['wordcloud'],
+    },
+}
+
+# Loaded frames, keyed by dataset name: {name: (source signature, DataFrame)}
+_frames = {}
+_lock = threading.Lock()
+
+# Part of each CSV file the loaded frame was read from: {name: (bytes read, hash of the last TAIL_BYTES of them)}
+_sources = {}
+
+# Row count of the recent versions of each dataset reached by appending rows: {name: {version: rows}}
+_history = {}
+
+
+# Path of the CSV file for a dataset
+def csv_path(name):
+    return os.path.join(ASSETS_DIR, DATASETS[name]['file'])
+
+
+# Path of the binary (Parquet) cache stored next to the CSV file
+def cache_path(name):
+    return os.path.splitext(csv_path(name))[0] + '.parquet'
+
+
+# Signature of the CSV file on disk; it changes whenever the file is replaced or edited
+def dataset_version(name):
+    stat = os.stat(csv_path(name))
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+# Parse CSV data with the explicit types of the dataset ('columns' is given for rows without a header line)
+def _parse_csv(name, source, columns=None):
+    spec = DATASETS[name]
+    if columns is None:
+        df = pd.read_csv(source, dtype=spec['dtype'], low_memory=False)
+    else:
+        df = pd.read_csv(source, dtype=spec['dtype'], low_memory=False, header=None, names=columns)
+    for column, date_format in spec.get('dates', {}).items():
+        df[column] = pd.to_datetime(df[column], format=date_format, errors='coerce')
+    return df
+
+
+# Convert the columns of a frame that do not have the type of the dataset (e.g. a cache written before the
+# types changed); columns already of the right type are left as they are
+def _apply_dtypes(name, df):
+    spec = DATASETS[name]
+    dtypes = {column: pd.api.types.pandas_dtype(dtype) for column, dtype in spec['dtype'].items()
+              if column in df.columns and column not in spec.get('dates', {})}
+    changed = {column: dtype for column, dtype in dtypes.items()
+               if df[column].dtype != dtype and not (dtype == 'category' and df[column].dtype.name == 'category')}
+    df = df.astype(changed) if changed else df
+    dates = {column: pd.to_datetime(df[column].astype(str), format=date_format, errors='coerce')
+             for column, date_format in spec.get('dates', {}).items()
+             if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column])}
+    return df.assign(**dates) if dates else df
+
+
+# Copy of some rows of a dataset with its date columns written back in the format of its file, for display
+# and CSV files (dates are compared and sorted as datetimes, but shown as in the source data)
+def format_dates(name, df):
+    dates = {column: df[column].dt.strftime(date_format)
+             for column, date_format in DATASETS[name].get('dates', {}).items() if column in df.columns}
+    return df.assign(**dates) if dates else df
+
+
+# Append new rows to a frame. Categorical columns get the union of both category sets (sorted, like the
+# categories read from a file), so they stay categorical instead of falling back to Python strings.
+def _concat_rows(df, new_rows):
+    old_columns, new_columns = {}, {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            new = new_rows[column].astype('category')
+            categories = df[column].cat.categories.union(new.cat.categories)
+            if not categories.equals(df[column].cat.categories):
+                old_columns[column] = df[column].cat.set_categories(categories)
+            new_columns[column] = new.cat.set_categories(categories)
+    if old_columns:
+        df = df.assign(**old_columns)
+    return pd.concat([df, new_rows.assign(**new_columns)], ignore_index=True)
+
+
+# Parse the CSV file; returns the frame and the number of bytes it was parsed from
+def _read_csv(name):
+    with open(csv_path(name), 'rb') as f:
+        data = f.read()
+    return _parse_csv(name, io.BytesIO(data)), len(data)
+
+
+# Hash of the last TAIL_BYTES bytes of the first 'size' bytes of a CSV file
+def _tail_digest(name, size):
+    with open(csv_path(name), 'rb') as f:
+        f.seek(max(0, size - TAIL_BYTES))
+        return hashlib.blake2b(f.read(size - max(0, size - TAIL_BYTES)), digest_size=16).digest()
+
+
+# Parse the rows appended to a CSV file since it was loaded. Returns None when the file was not only appended to
+# (replaced, edited or truncated), so it must be loaded again. Only complete lines are read, as a writer may still
+# be appending; the rest is read next time.
+def _read_appended(name, columns):
+    size, digest = _sources[name]
+    with open(csv_path(name), 'rb') as f:
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read(size - max(0, size - TAIL_BYTES))
+        if hashlib.blake2b(tail, digest_size=16).digest() != digest or not tail.endswith(b'\n'):
+            return None
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    if not data:
+        return pd.DataFrame(columns=columns)  # Nothing new (or the first new line is not complete yet)
+    _sources[name] = (size + len(data), hashlib.blake2b((tail + data)[-TAIL_BYTES:], digest_size=16).digest())
+    return _parse_csv(name, io.BytesIO(data), columns)
+
+
+# Remember the row count of a version of a dataset (forgetting the oldest versions)
+def _remember(name, version, rows):
+    history = _history.setdefault(name, {})
+    history[version] = rows
+    while len(history) > MAX_HISTORY:
+        del history[next(iter(history))]
+
+
+# Read the Parquet cache if it was written from the current version of the CSV file, otherwise return None
+def _read_cache(name, version):
+    try:
+        import pyarrow.parquet as pq  # Optional dependency, the CSV file is used when it is missing
+        path = cache_path(name)
+        if not os.path.exists(path):
+            return None
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(b'g21_source_version') != version.encode():
+            return None  # The CSV file changed since the cache was written
+        return _apply_dtypes(name, pq.read_table(path).to_pandas())
+    except Exception:
+        return None  # A missing or unreadable cache is rebuilt from the CSV file
+
+
+# Write the Parquet cache, tagged with the version of the CSV file it was built from
+def _write_cache(name, df, version):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'g21_source_version'] = version.encode()
+        table = table.replace_schema_metadata(metadata)
+        # Write to a temporary file first so other processes never read a half-written cache
+        tmp_path = f"{cache_path(name)}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cache_path(name))
+    except Exception:
+        pass  # The cache is only an optimisation (e.g. pyarrow missing or read-only assets folder)
+
+
+# Return the DataFrame of a dataset, parsing it at most once per process and per version of the file.
+# When rows were only appended to the file, just the new rows are parsed and added to the loaded frame.
+# The same frame is shared by every page, so callers must not modify it in place.
+def get_dataset(name):
+    with phase('data'):
+        version = dataset_version(name)
+        cached = _frames.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with _lock:
+            # Another thread may have loaded the dataset while we were waiting for the lock
+            cached = _frames.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+            if cached is not None:
+                new_rows = _read_appended(name, list(cached[1].columns))
+                if new_rows is not None:
+                    df = _concat_rows(cached[1], new_rows) if len(new_rows) else cached[1]
+                    _frames[name] = (version, df)
+                    _remember(name, version, len(df))
+                    return df
+
+            df = _read_cache(name, version) if CACHE_ENABLED else None
+            if df is not None:
+                size = int(version.rsplit('-', 1)[1])  # The cache was written from this version of the file
+            else:
+                df, size = _read_csv(name)
+                if CACHE_ENABLED:
+                    _write_cache(name, df, version)
+            _frames[name] = (version, df)
+            _sources[name] = (size, _tail_digest(name, size))
+            _history[name] = {}
+            _remember(name, version, len(df))
+            return df
+
+
+# Frames of the datasets loaded in this process: {name: DataFrame}
+def loaded_datasets():
+    return {name: df for name, (_, df) in list(_frames.items())}
+
+
+# Return the current version and frame of a dataset, with the rows appended since an earlier version
+# (None when the dataset was replaced or edited since, or the version is too old to be remembered)
+def dataset_changes(name, since_version):
+    get_dataset(name)
+    with _lock:
+        version, df = _frames[name]
+        rows = _history.get(name, {}).get(since_version)
+        return version, df, (None if rows is None else df.iloc[rows:])
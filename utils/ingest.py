@@ -0,0 +1,100 @@
+import argparse  # Import argparse for the command line interface
+import pandas as pd  # Import pandas for data manipulation
+from utils.data_store import DATASETS, csv_path, get_dataset  # Import the shared dataset registry
+from utils.aggregates import get_policy_sentiment, get_stackbar_counts, get_trend_cube  # Import the maintained aggregates
+from utils.network_index import get_keyword_counts  # Import the keyword counts of the Network page
+from utils.search_index import update_index  # Import the full-text index of the Dataset Explorer
+
+try:
+    import fcntl  # Import fcntl to lock the file while a batch is appended (not available on Windows)
+except ImportError:
+    fcntl = None
+
+# Datasets that accept new rows, with the aggregates kept up to date from them. The pages notice the new rows
+# by themselves (only the appended part of the file is read and added to the aggregates).
+MAINTAINED = {
+    'reddit_comments': [get_policy_sentiment, get_keyword_counts],
+    'trend_data': [get_trend_cube],
+    'energy_column_data': [get_stackbar_counts],
+}
+
+# Indexes stored on disk and updated as soon as rows are appended (also by the command line, unlike the
+# aggregates held in memory by the app processes)
+INDEXES = {
+    'energy_column_data': [update_index],
+}
+
+
+# Column names and line ending of a CSV file, read from its header line
+def _read_header(path):
+    with open(path, 'rb') as f:
+        line = f.readline()
+    newline = '\r\n' if line.endswith(b'\r\n') else '\n'
+    return pd.read_csv(path, nrows=0).columns.tolist(), newline
+
+
+# Check a batch against the columns and types of a dataset and return it as CSV lines in the file's format
+def _format_batch(name, batch, columns, newline):
+    missing = [column for column in columns if column not in batch.columns]
+    extra = [column for column in batch.columns if column not in columns]
+    if missing or extra:
+        raise ValueError(f"Batch columns do not match {DATASETS[name]['file']}: missing {missing}, unexpected {extra}")
+
+    batch = batch[columns].copy()
+    spec = DATASETS[name]
+    for column, dtype in spec['dtype'].items():
+        if pd.api.types.pandas_dtype(dtype).kind in 'iuf' and column not in spec.get('dates', {}):
+            batch[column] = pd.to_numeric(batch[column], errors='raise')
+    for column, date_format in spec.get('dates', {}).items():
+        # Dates are written in the format of the file; invalid dates are rejected rather than stored
+        batch[column] = pd.to_datetime(batch[column], format=date_format if batch[column].dtype == object else None,
+                                       errors='raise').dt.strftime(date_format)
+    return batch.to_csv(index=False, header=False, lineterminator=newline)
+
+
+# Append a batch of new rows (a DataFrame or the path of a CSV file with a header line) to a dataset file.
+# The file only grows, so the app reads just the new rows. Returns the number of rows appended.
+def append_batch(name, batch):
+    if name not in MAINTAINED:
+        raise ValueError(f"Dataset {name!r} does not accept new rows (one of: {', '.join(MAINTAINED)})")
+    if not isinstance(batch, pd.DataFrame):
+        batch = pd.read_csv(batch, dtype=str)
+    if batch.empty:
+        return 0
+
+    path = csv_path(name)
+    columns, newline = _read_header(path)
+    data = _format_batch(name, batch, columns, newline).encode('utf-8')
+
+    with open(path, 'rb+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # One writer at a time
+        f.seek(0, 2)
+        if f.tell() > 0:
+            f.seek(-1, 2)
+            if f.read(1) != b'\n':
+                data = newline.encode('utf-8') + data  # The last line of the file was not terminated
+        f.write(data)  # A single write, so readers see whole lines as soon as possible
+    return len(batch)
+
+
+# Append a batch of new rows and update the aggregates of this process from them
+def ingest_batch(name, batch):
+    rows = append_batch(name, batch)
+    get_dataset(name)
+    for get_aggregate in MAINTAINED[name] + INDEXES.get(name, []):
+        get_aggregate()
+    return rows
+
+
+# Command line entry point: python -m utils.ingest reddit_comments new_comments.csv
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Append a batch of new rows to a dataset of the app.")
+    parser.add_argument('dataset', choices=sorted(MAINTAINED), help="Dataset receiving the rows")
+    parser.add_argument('batch', nargs='+', help="CSV files with the new rows (same columns as the dataset)")
+    args = parser.parse_args()
+    for batch in args.batch:
+        rows = append_batch(args.dataset, batch)
+        print(f"Appended {rows} rows from {batch} to {csv_path(args.dataset)}")
+    for update in INDEXES.get(args.dataset, []):
+        update()
@@ -0,0 +1,17 @@
+import gc  # Import gc to freeze the loaded objects before the workers are forked
+import os  # Import os to read the configuration from the environment
+
+# The data is loaded once here, before the workers are forked, and this process must not start another job server
+os.environ['G21_WARMUP'] = '0'
+os.environ['G21_STARTUP_REPORT'] = '0'
+os.environ['G21_JOB_SERVER'] = '0'
+
+import app  # noqa: E402 Import the Dash app (registers every page and its background callbacks)
+from utils.startup import run_warmup  # noqa: E402 Import the warm-up of the page data
+from utils.jobs import run_job_server  # noqa: E402 Import the worker pool
+
+# Job server of the background callbacks, started by the app (utils.jobs.start_job_server)
+if __name__ == '__main__':
+    run_warmup()
+    gc.freeze()
+    run_job_server(int(os.environ.get('G21_JOB_PARENT', os.getppid())))
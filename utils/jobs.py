@@ -0,0 +1,205 @@
+import functools  # Import functools to keep the name of the timed job functions
+import os  # Import os to read the configuration and manage the worker processes
+import signal  # Import signal to stop the worker of a cancelled job
+import subprocess  # Import subprocess to start the job server
+import sys  # Import sys to start the job server with the same Python interpreter
+import time  # Import time for the queue polling
+import uuid  # Import uuid to name the jobs
+from dash import DiskcacheManager  # Import Dash's background callback manager, extended with a worker pool
+from utils.data_store import ASSETS_DIR  # Import the data folder, under which the job queue is stored
+from utils.metrics import job_timings, report_job  # Import the timer of the jobs and the report of their timings
+
+try:
+    import diskcache  # Import diskcache for the job queue and results shared by the processes
+    import psutil  # noqa: F401 (required by Dash's DiskcacheManager)
+    import multiprocess  # noqa: F401 (required by Dash's DiskcacheManager)
+except ImportError:
+    diskcache = None
+
+# Set G21_BACKGROUND=0 to run the heavy callbacks (network graph, word cloud) in the request thread instead
+BACKGROUND_ENABLED = os.environ.get('G21_BACKGROUND', '1') != '0' and diskcache is not None
+
+# Folder of the job queue, job states and results (shared by every process of the host)
+JOBS_DIR = os.environ.get('G21_JOBS_DIR', os.path.join(ASSETS_DIR, 'jobs'))
+
+# Number of worker processes running the jobs
+JOB_WORKERS = int(os.environ.get('G21_JOB_WORKERS', 2))
+
+# How often the browser asks for the result of a running job (milliseconds)
+POLL_INTERVAL_MS = int(os.environ.get('G21_JOB_POLL_MS', 250))
+
+# How often an idle worker looks at the queue (seconds)
+QUEUE_POLL_SECONDS = 0.05
+
+# Job states, results and queue entries older than this are dropped (seconds)
+JOB_EXPIRE = 3600
+
+# The job server of this process (started once; forked processes do not start another one)
+_server = None
+
+
+####################### MANAGER ###############################
+# Background callback manager running the jobs in a fixed pool of worker processes fed from a queue on disk,
+# instead of one new process per job. A job waiting in the queue is dropped when it is cancelled (the browser
+# cancels the previous job of a callback when its inputs change), a running one has its worker stopped.
+# Job states: ('queued', None, result key), ('running', worker pid, result key), ('done', None, result key)
+class PoolJobManager(DiskcacheManager):
+    def __init__(self, directory):
+        super().__init__(diskcache.Cache(os.path.join(directory, 'results')), expire=JOB_EXPIRE)
+        self.queue = diskcache.Deque(directory=os.path.join(directory, 'queue'))
+        self.running_key = None  # Result key of the job running in this worker process
+
+    # Job functions remember their registry key, which the workers use to find them. The callback is timed in
+    # the worker, and its timings stored before its result, for the request that reads the result.
+    def make_job_fn(self, fn, progress, key=None):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            with job_timings() as timings:
+                output = fn(*args, **kwargs)
+            self.handle.set(_timings_key(self.running_key), timings, expire=JOB_EXPIRE)
+            return output
+
+        job_fn = super().make_job_fn(timed, progress, key)
+        job_fn.g21_key = key
+        return job_fn
+
+    # Queue a job and return its id
+    def call_job_fn(self, key, job_fn, args, context):
+        job = uuid.uuid4().hex
+        self.handle.set(_state_key(job), ('queued', None, key), expire=JOB_EXPIRE)
+        self.queue.append((job, job_fn.g21_key, key, args, context))
+        return job
+
+    # Cancel a job: drop it if it is still queued, stop its worker if it is running (the job server starts a
+    # new worker). A finished job is left alone, its result is still to be read.
+    def terminate_job(self, job):
+        if not job:
+            return
+        with self.handle.transact():
+            state = self.handle.get(_state_key(job))
+            if state is None or state[0] == 'done':
+                return
+            self.handle.delete(_state_key(job))
+            if state[0] == 'running' and self.handle.get(state[2]) is None:
+                try:
+                    os.kill(state[1], signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+    def terminate_unhealthy_job(self, job):
+        return False
+
+    # A job is running while it is queued or its worker is alive, and until its result is read
+    def job_running(self, job):
+        state = self.handle.get(_state_key(job)) if job else None
+        if state is None:
+            return False
+        if state[0] == 'running':
+            return psutil.pid_exists(state[1])
+        if state[0] == 'done':
+            return self.handle.get(state[2]) is not None
+        return True
+
+    # Return the result of a job if it is ready, reporting the timings of the job with the request reading it.
+    # Unlike Dash's manager, the worker is not stopped afterwards.
+    def get_result(self, key, job):
+        result = super().get_result(key, None)
+        if result is not self.UNDEFINED:
+            report_job(self.handle.get(_timings_key(key)))
+            self.clear_cache_entry(_timings_key(key))
+        return result
+
+    # Run one job from the queue in this worker process (skipped if it was cancelled while queued)
+    def run_job(self, entry):
+        job, func_key, key, args, context = entry
+        with self.handle.transact():
+            state = self.handle.get(_state_key(job))
+            if state is None or state[0] != 'queued':
+                return
+            self.handle.set(_state_key(job), ('running', os.getpid(), key), expire=JOB_EXPIRE)
+        self.running_key = key
+        self.func_registry[func_key](key, self._make_progress_key(key), args, context)
+        self.handle.set(_state_key(job), ('done', None, key), expire=JOB_EXPIRE)
+
+
+# Cache key of the state of a job
+def _state_key(job):
+    return f"g21-job-{job}"
+
+
+# Cache key of the timings of the job writing a result
+def _timings_key(key):
+    return f"{key}-g21-timings"
+
+
+# Background callback manager of the app (None when the heavy callbacks run in the request thread)
+JOB_MANAGER = PoolJobManager(JOBS_DIR) if BACKGROUND_ENABLED else None
+
+
+# Disk cache shared by the app processes and the job workers (None when background callbacks are off)
+def shared_cache():
+    return JOB_MANAGER.handle if JOB_MANAGER is not None else None
+
+
+####################### JOB SERVER ###############################
+# Start the job server (python -m utils.job_server) as a child of this process; it stops with this process
+def start_job_server():
+    global _server
+    if JOB_MANAGER is None or _server is not None or os.environ.get('G21_JOB_SERVER') == '0':
+        return
+    env = dict(os.environ, G21_JOB_SERVER='0', G21_JOB_PARENT=str(os.getpid()))
+    _server = subprocess.Popen([sys.executable, '-m', 'utils.job_server'], env=env,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Worker process: run the queued jobs one after the other until the job server stops
+def _work(manager, server_pid):
+    while os.getppid() == server_pid:
+        try:
+            entry = manager.queue.popleft()
+        except IndexError:
+            time.sleep(QUEUE_POLL_SECONDS)
+            continue
+        manager.run_job(entry)
+
+
+# Fork a worker process and return its pid
+def _fork_worker(manager):
+    server_pid = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            _work(manager, server_pid)
+        finally:
+            os._exit(0)
+    return pid
+
+
+# Keep JOB_WORKERS worker processes running (a worker stopped by a cancellation is replaced at once) until
+# the parent process of the job server exits. The app is already loaded, so forking a worker is quick.
+def run_job_server(parent_pid):
+    workers = set()
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while os.getppid() == parent_pid:
+            while len(workers) < JOB_WORKERS:
+                workers.add(_fork_worker(JOB_MANAGER))
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid:
+                workers.discard(pid)
+            else:
+                time.sleep(0.1)
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
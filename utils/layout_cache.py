@@ -0,0 +1,71 @@
+import hashlib  # Import hashlib to build the graph signatures
+import threading  # Import threading to guard the cache between callback threads
+from collections import OrderedDict  # Import OrderedDict for the least-recently-used cache
+import networkx as nx  # Import NetworkX for the spring layout
+
+# Maximum number of layouts kept in memory (least recently used ones are dropped first)
+MAX_LAYOUTS = 64
+
+# Iterations of a warm-started layout; the positions start close to the final ones so few are needed
+WARM_START_ITERATIONS = 15
+
+# Minimum share of the nodes of a graph that must be in its reference layout for it to be used as a warm start
+WARM_START_MIN_OVERLAP = 0.5
+
+# Cached layouts: {signature: (set of nodes, positions)}
+_layouts = OrderedDict()
+_lock = threading.Lock()
+
+
+# Signature of a graph and its layout parameters: a hash of the sorted node and edge sets
+def graph_signature(G, **params):
+    nodes = sorted(map(str, G.nodes()))
+    edges = sorted(tuple(sorted((str(u), str(v)))) for u, v in G.edges())
+    text = repr((nodes, edges, sorted(params.items())))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# Spring layout of a graph computed from scratch, cached by its signature
+def _full_layout(G, k, seed):
+    signature = graph_signature(G, k=k, seed=seed)
+    with _lock:
+        if signature in _layouts:
+            _layouts.move_to_end(signature)
+            return _layouts[signature][1]
+    pos = nx.spring_layout(G, k=k, seed=seed)
+    _store(signature, set(G.nodes()), pos)
+    return pos
+
+
+# Add a layout to the cache, dropping the least recently used ones
+def _store(signature, nodes, pos):
+    with _lock:
+        _layouts[signature] = (nodes, pos)
+        _layouts.move_to_end(signature)
+        while len(_layouts) > MAX_LAYOUTS:
+            _layouts.popitem(last=False)
+
+
+# Spring layout of a graph, served from the cache when the same graph was laid out before.
+# 'reference' gives a larger graph the graph is part of (e.g. every option of the page selected), which is laid
+# out once from scratch; a graph sharing enough nodes with it starts from its positions and only runs a few
+# iterations. The positions only depend on the graph and its reference, never on what was cached before, so
+# every process lays out the same graph the same way, and nodes keep their place between selections.
+def cached_spring_layout(G, k=1.2, seed=42, reference=None):
+    signature = graph_signature(G, k=k, seed=seed)
+    with _lock:
+        if signature in _layouts:
+            _layouts.move_to_end(signature)
+            return _layouts[signature][1]
+    nodes = set(G.nodes())
+    reference = reference() if reference is not None and nodes else None
+    if reference is None or graph_signature(reference, k=k, seed=seed) == signature:
+        return _full_layout(G, k, seed)
+
+    warm_start = _full_layout(reference, k, seed)
+    if len(nodes & set(warm_start)) / len(nodes) < WARM_START_MIN_OVERLAP:
+        return _full_layout(G, k, seed)
+    initial = {node: warm_start[node] for node in G.nodes() if node in warm_start}
+    pos = nx.spring_layout(G, k=k, pos=initial, iterations=WARM_START_ITERATIONS, seed=seed)
+    _store(signature, nodes, pos)
+    return pos
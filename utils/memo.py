@@ -0,0 +1,134 @@
+import functools  # Import functools to keep the name and signature of the decorated callbacks
+import hashlib  # Import hashlib to build the cache keys
+import json  # Import json to normalise the callback inputs and store their outputs
+import os  # Import os to read the configuration from the environment
+import sqlite3  # Import sqlite3 for the cache shared by all worker processes
+import threading  # Import threading for per-thread SQLite connections
+import time  # Import time for the TTL and LRU bookkeeping
+from collections import OrderedDict  # Import OrderedDict for the in-memory backend
+from plotly.utils import PlotlyJSONEncoder  # Import the JSON encoder Dash uses for callback outputs
+from utils.data_store import ASSETS_DIR, dataset_version  # Import the dataset version stamps
+
+# Cache backend: 'sqlite' (shared by the worker processes of a host), 'memory' (per process) or 'off'
+BACKEND = os.environ.get('G21_MEMO_BACKEND', 'sqlite')
+
+# SQLite database file of the shared cache
+SQLITE_PATH = os.environ.get('G21_MEMO_PATH', os.path.join(ASSETS_DIR, 'callback_cache.sqlite'))
+
+# Total size of the cached outputs; least recently used entries are dropped above it
+MAX_BYTES = int(os.environ.get('G21_MEMO_MAX_BYTES', 256 * 1024 * 1024))
+
+# Entries older than this number of seconds are computed again
+TTL = float(os.environ.get('G21_MEMO_TTL', 24 * 3600))
+
+# Per-thread SQLite connections and in-memory cache {key: (created, value bytes)}
+_local = threading.local()
+_memory = OrderedDict()
+_memory_bytes = 0
+_memory_lock = threading.Lock()
+
+
+# Cache key of a callback call: callback id, normalised inputs and the versions of the datasets it reads
+def cache_key(callback_id, args, datasets):
+    versions = [dataset_version(name) for name in datasets]
+    text = json.dumps([callback_id, args, versions], sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=20).hexdigest()
+
+
+####################### SQLITE BACKEND ###############################
+# SQLite connection of the current thread, creating the cache table on first use.
+# Connections are never reused in a forked worker process, as SQLite does not support that.
+def _connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None or getattr(_local, 'pid', None) != os.getpid():
+        connection = sqlite3.connect(SQLITE_PATH, timeout=5, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, size INTEGER, '
+                           'created REAL, accessed REAL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        _local.connection = connection
+        _local.pid = os.getpid()
+    return connection
+
+
+def _sqlite_get(key):
+    connection = _connection()
+    row = connection.execute('SELECT value, created FROM cache WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+    if time.time() - row[1] > TTL:
+        connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+        return None
+    connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (time.time(), key))
+    return row[0]
+
+
+def _sqlite_set(key, value):
+    connection = _connection()
+    now = time.time()
+    connection.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)', (key, value, len(value), now, now))
+    connection.execute('DELETE FROM cache WHERE created < ?', (now - TTL,))
+    # Drop the least recently used entries until the cache fits in its byte budget
+    total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+    if total > MAX_BYTES:
+        for old_key, size in connection.execute('SELECT key, size FROM cache ORDER BY accessed').fetchall():
+            if total <= MAX_BYTES:
+                break
+            connection.execute('DELETE FROM cache WHERE key = ?', (old_key,))
+            total -= size
+
+
+####################### MEMORY BACKEND ###############################
+def _memory_get(key):
+    global _memory_bytes
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > TTL:
+            del _memory[key]
+            _memory_bytes -= len(entry[1])
+            return None
+        _memory.move_to_end(key)
+        return entry[1]
+
+
+def _memory_set(key, value):
+    global _memory_bytes
+    with _memory_lock:
+        if key in _memory:
+            _memory_bytes -= len(_memory.pop(key)[1])
+        _memory[key] = (time.time(), value)
+        _memory_bytes += len(value)
+        while _memory_bytes > MAX_BYTES and _memory:
+            _memory_bytes -= len(_memory.popitem(last=False)[1][1])
+
+
+####################### DECORATOR ###############################
+# Decorator memoizing a deterministic callback: its output only depends on its inputs and on the given datasets.
+# 'datasets' is a list of dataset names, or a function of the callback inputs returning that list.
+def memoize(callback_id, datasets):
+    def decorator(func):
+        if BACKEND == 'off':
+            return func
+        get, set_ = (_sqlite_get, _sqlite_set) if BACKEND == 'sqlite' else (_memory_get, _memory_set)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            try:
+                key = cache_key(callback_id, args, datasets(*args) if callable(datasets) else datasets)
+                cached = get(key)
+                if cached is not None:
+                    # Plain JSON data is returned; Dash accepts it in place of the Plotly figure objects
+                    return json.loads(cached)
+            except Exception:
+                return func(*args)  # The cache is only an optimisation, never fail the callback because of it
+
+            output = func(*args)
+            try:
+                set_(key, json.dumps(output, cls=PlotlyJSONEncoder).encode('utf-8'))
+            except Exception:
+                pass
+            return output
+        return wrapper
+    return decorator
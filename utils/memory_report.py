@@ -0,0 +1,89 @@
+import hmac  # Import hmac to compare the admin token in constant time
+import os  # Import os to read the configuration from the environment
+import flask  # Import flask for the admin endpoint
+from utils.data_store import DATASETS, loaded_datasets  # Import the shared dataset registry
+
+try:
+    import resource  # Import resource for the peak memory of the process (not available on Windows)
+except ImportError:
+    resource = None
+
+# Token of the admin endpoints, sent in an "Authorization: Bearer <token>" header. Without it they are only
+# served by the development server in debug mode.
+ADMIN_TOKEN = os.environ.get('G21_ADMIN_TOKEN')
+
+
+# Resident memory of this process and its peak, in bytes (None when the system does not report it)
+def process_memory():
+    current = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Kilobytes on Linux
+    return {'rss_bytes': current, 'peak_rss_bytes': peak}
+
+
+# Memory used by the datasets loaded in this process, by dataset and column and by page (a dataset read by
+# several pages is counted for each of them, but held once)
+def memory_report():
+    datasets = {}
+    for name, df in loaded_datasets().items():
+        columns = {}
+        for column in df.columns:
+            values = df[column]
+            columns[column] = {'dtype': str(values.dtype), 'bytes': int(values.memory_usage(index=False, deep=True))}
+            if values.dtype.name == 'category':
+                columns[column]['categories'] = len(values.cat.categories)
+        datasets[name] = {'rows': len(df), 'bytes': sum(column['bytes'] for column in columns.values()),
+                          'columns': columns}
+
+    pages = {}
+    for name, spec in DATASETS.items():
+        for page in spec.get('pages', []):
+            usage = pages.setdefault(page, {'datasets': [], 'bytes': 0})
+            usage['datasets'].append(name)
+            usage['bytes'] += datasets.get(name, {}).get('bytes', 0)
+    return {'process': process_memory(), 'total_bytes': sum(dataset['bytes'] for dataset in datasets.values()),
+            'datasets': datasets, 'pages': pages}
+
+
+# Size in megabytes, aligned for the text report
+def _megabytes(size):
+    return f"{size / 1e6:9.1f} MB" if size is not None else '        n/a'
+
+
+# Text version of the memory report
+def format_memory_report(report=None):
+    report = report or memory_report()
+    process = report['process']
+    lines = [f"Memory: resident {_megabytes(process['rss_bytes'])}, peak {_megabytes(process['peak_rss_bytes'])}, "
+             f"datasets {_megabytes(report['total_bytes'])}"]
+    for name, dataset in report['datasets'].items():
+        lines.append(f"  {name:<30} {_megabytes(dataset['bytes'])}  ({dataset['rows']} rows)")
+        for column, usage in dataset['columns'].items():
+            lines.append(f"    {column:<28} {_megabytes(usage['bytes'])}  {usage['dtype']}")
+    lines.append('Memory by page:')
+    for page, usage in sorted(report['pages'].items(), key=lambda item: -item[1]['bytes']):
+        lines.append(f"  {page:<30} {_megabytes(usage['bytes'])}  ({', '.join(usage['datasets'])})")
+    return '\n'.join(lines)
+
+
+# True when the current request may read the admin endpoints: it has the admin token, or no token is set and
+# the app runs in debug mode
+def admin_allowed():
+    if not ADMIN_TOKEN:
+        return flask.current_app.debug
+    header = flask.request.headers.get('Authorization', '')
+    return hmac.compare_digest(header.encode('utf-8'), f"Bearer {ADMIN_TOKEN}".encode('utf-8'))
+
+
+# Serve the memory report of the answering worker process on /admin/memory (JSON)
+def register_admin_routes(app):
+    @app.server.route('/admin/memory')
+    def admin_memory():
+        if not admin_allowed():
+            flask.abort(403)
+        return flask.jsonify(memory_report())
@@ -0,0 +1,228 @@
+import os  # Import os to read the configuration from the environment
+import threading  # Import threading for the per-request timings and the metrics lock
+import time  # Import time to measure the callbacks
+from contextlib import contextmanager  # Import contextmanager for the phase timer
+import dash  # Import dash to check the version whose JSON serializer can be timed
+import flask  # Import flask for the request hooks, the response headers and the metrics endpoint
+
+# Set G21_METRICS=0 to switch off the callback instrumentation (no timing, no Server-Timing header, no /metrics)
+METRICS_ENABLED = os.environ.get('G21_METRICS', '1') != '0'
+
+# Upper bounds of the histogram buckets: durations in seconds and response sizes in bytes
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+# Phases of a callback: reading the datasets and cached aggregates, building the output, and JSON serialization
+PHASES = ('data', 'build', 'serialize')
+
+# Phases of a background job, timed in the worker running it (its output is serialized by the request reading it)
+JOB_PHASES = ('data', 'build')
+
+# Dash versions serializing the callback responses with dash._callback.to_json (requirements.txt pins 2.18.1).
+# It is not a public API: with other versions the serialization is not timed separately but counted as 'build'.
+SERIALIZER_DASH_VERSIONS = ('2.17.', '2.18.')
+
+# Path of the Dash endpoint running the callbacks
+CALLBACK_PATH = '/_dash-update-component'
+
+# Timings of the callback or job running in the current thread: {'data': seconds, 'serialize': seconds, 'depth': n}
+_local = threading.local()
+
+# Collected histograms: {(metric, labels): [bucket counts..., sum, count]}
+_histograms = {}
+_errors = {}
+_lock = threading.Lock()
+
+
+####################### TIMING ###############################
+# Add the time spent inside the 'with' block to a phase of the running callback (only the outermost block counts,
+# so a dataset read by an aggregate is not counted twice). Outside a callback this does nothing.
+@contextmanager
+def phase(name):
+    timings = getattr(_local, 'timings', None)
+    if timings is None or timings['depth']:
+        yield
+        return
+    timings['depth'] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] += time.perf_counter() - start
+        timings['depth'] -= 1
+
+
+# Dash serializes the callback output with _callback.to_json; time it as the 'serialize' phase where the
+# installed Dash version is known to do so. Returns False when serialization cannot be timed.
+def _time_serializer():
+    if not dash.__version__.startswith(SERIALIZER_DASH_VERSIONS):
+        return False
+    from dash import _callback  # Import Dash's callback module here, only for the versions it is known for
+    to_json = getattr(_callback, 'to_json', None)
+    if to_json is None:
+        return False
+    if not getattr(to_json, 'g21_timed', False):
+        def timed_to_json(obj):
+            with phase('serialize'):
+                return to_json(obj)
+
+        timed_to_json.g21_timed = True
+        _callback.to_json = timed_to_json
+    return True
+
+
+# Start timing a callback or job in the current thread, and return its timings
+def _start_timings():
+    _local.timings = timings = {'data': 0.0, 'serialize': 0.0, 'depth': 0, 'start': time.perf_counter()}
+    return timings
+
+
+# Stop timing the callback or job of the current thread: its total time, and the build time as the rest of it
+def _stop_timings():
+    timings, _local.timings = getattr(_local, 'timings', None), None
+    if timings is not None:
+        timings['total'] = time.perf_counter() - timings.pop('start')
+        timings['build'] = max(0.0, timings['total'] - timings['data'] - timings['serialize'])
+    return timings
+
+
+# Time a background job in the worker process running it; the timings are filled in when the block ends
+@contextmanager
+def job_timings():
+    timings = _start_timings()
+    try:
+        yield timings
+    finally:
+        _stop_timings()
+
+
+# Report the timings of a background job (measured in its worker) with the request returning its result
+def report_job(timings):
+    if timings is not None and flask.has_request_context():
+        flask.g.g21_job_timings = timings
+
+
+# Page and callback id of a callback function, e.g. ('network', 'network.update_graph')
+def callback_labels(func):
+    func = getattr(func, '__wrapped__', func)
+    module = func.__module__ or ''
+    page = module.split('.', 1)[1] if module.startswith('pages.') else module
+    return page, f"{page}.{func.__name__}"
+
+
+# Page and callback id of the callback run by the current request, read from the output ids it asks for
+def _request_labels(app):
+    body = flask.request.get_json(silent=True) or {}
+    callback = app.callback_map.get(body.get('output'), {}).get('callback')
+    return callback_labels(callback) if callback is not None else ('unknown', str(body.get('output')))
+
+
+####################### METRICS ###############################
+# Add an observation to a histogram
+def _observe(metric, labels, value, buckets):
+    key = (metric, labels)
+    values = _histograms.get(key)
+    if values is None:
+        values = _histograms[key] = [0] * len(buckets) + [0.0, 0]
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            values[i] += 1
+    values[-2] += value
+    values[-1] += 1
+
+
+# Record the timings and response size of one callback call, and the timings of the background job whose result
+# it returned
+def record_callback(page, callback_id, timings, response_bytes, failed=False, job=None):
+    labels = (('page', page), ('callback', callback_id))
+    with _lock:
+        _observe('g21_callback_duration_seconds', labels, timings['total'], DURATION_BUCKETS)
+        for name in PHASES:
+            _observe('g21_callback_phase_seconds', labels + (('phase', name),), timings[name], DURATION_BUCKETS)
+        if response_bytes:
+            _observe('g21_callback_response_bytes', labels, response_bytes, BYTES_BUCKETS)
+        if failed:
+            _errors[labels] = _errors.get(labels, 0) + 1
+        if job is not None:
+            _observe('g21_job_duration_seconds', labels, job['total'], DURATION_BUCKETS)
+            for name in JOB_PHASES:
+                _observe('g21_job_phase_seconds', labels + (('phase', name),), job[name], DURATION_BUCKETS)
+
+
+# Format a label set for the Prometheus text format
+def _format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+# Render the collected metrics in the Prometheus text exposition format
+def format_metrics():
+    descriptions = {
+        'g21_callback_duration_seconds': ("Wall time of the page callbacks", DURATION_BUCKETS),
+        'g21_callback_phase_seconds': ("Time of the page callbacks by phase (data, build, serialize)", DURATION_BUCKETS),
+        'g21_callback_response_bytes': ("Size of the page callback responses", BYTES_BUCKETS),
+        'g21_job_duration_seconds': ("Wall time of the background callbacks in the job workers", DURATION_BUCKETS),
+        'g21_job_phase_seconds': ("Time of the background callbacks in the job workers by phase (data, build)",
+                                  DURATION_BUCKETS),
+    }
+    with _lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        errors = dict(_errors)
+
+    lines = []
+    for metric, (description, buckets) in descriptions.items():
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} histogram"]
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            label_text = _format_labels(labels)
+            for bound, count in zip(buckets, values):
+                lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {values[-1]}')
+            lines.append(f"{metric}_sum{{{label_text}}} {values[-2]}")
+            lines.append(f"{metric}_count{{{label_text}}} {values[-1]}")
+    lines += ["# HELP g21_callback_errors_total Page callbacks that raised an error",
+              "# TYPE g21_callback_errors_total counter"]
+    for labels, count in sorted(errors.items()):
+        lines.append(f"g21_callback_errors_total{{{_format_labels(labels)}}} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+####################### APP ###############################
+# Time every request to the Dash callback endpoint (through Flask's request hooks), add the Server-Timing header
+# to the callback responses and serve /metrics. A background callback is timed in its job worker as well, and
+# reported with the request returning its result.
+def instrument_app(app):
+    if not METRICS_ENABLED:
+        return
+    serializer_timed = _time_serializer()
+
+    @app.server.before_request
+    def start_callback_timing():
+        if flask.request.path.endswith(CALLBACK_PATH):
+            _start_timings()
+
+    @app.server.after_request
+    def add_server_timing(response):
+        timings = _stop_timings() if flask.request.path.endswith(CALLBACK_PATH) else None
+        if timings is None:
+            return response
+        page, callback_id = _request_labels(app)
+        job = flask.g.pop('g21_job_timings', None)
+        record_callback(page, callback_id, timings, 0 if response.is_streamed else response.calculate_content_length(),
+                        response.status_code >= 500, job)
+        phases = PHASES if serializer_timed else ('data', 'build')
+        response.headers['Server-Timing'] = ', '.join(
+            [f"{name};dur={timings[name] * 1000:.1f}" for name in phases]
+            + [f'total;dur={timings["total"] * 1000:.1f};desc="{callback_id}"']
+            + ([f"job-{name};dur={job[name] * 1000:.1f}" for name in JOB_PHASES]
+               + [f'job;dur={job["total"] * 1000:.1f};desc="background job"'] if job is not None else []))
+        return response
+
+    # A request whose error is propagated (debug mode) does not reach the after_request hooks; stop its timing anyway
+    @app.server.teardown_request
+    def stop_callback_timing(error=None):
+        _local.timings = None
+
+    @app.server.route('/metrics')
+    def metrics():
+        return flask.Response(format_metrics(), mimetype='text/plain; version=0.0.4')
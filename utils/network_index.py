@@ -0,0 +1,242 @@
+from collections import OrderedDict  # Import OrderedDict for the cache of compiled keyword matchers
+import re  # Import re to split the comments and keywords into words
+import threading  # Import threading to guard the caches of keyword sets between callback threads
+import numpy as np  # Import numpy for vector operations
+import pandas as pd  # Import pandas for data manipulation
+import scipy.sparse as sp  # Import scipy sparse matrices for the document x keyword index
+from utils.aggregates import get_aggregate, discard_aggregate  # Import the cache of pre-computed aggregates
+
+# Define energy types and sentiment-related words
+ENERGY_TYPES = ['solar', 'wind', 'hydropower']
+POSITIVE_WORDS = ['growth', 'innovation', 'opportunity', 'progress', 'clean', 'advantage']
+NEGATIVE_WORDS = ['crisis', 'loss', 'failure', 'challenge', 'risk', 'pollution']
+KEYWORDS = ENERGY_TYPES + POSITIVE_WORDS + NEGATIVE_WORDS
+
+# Keyword groups of the page before users edit them: {group: keywords}
+DEFAULT_GROUPS = {'positive': POSITIVE_WORDS, 'negative': NEGATIVE_WORDS}
+
+# Words of a comment or keyword: keywords match whole words only, so 'wind' does not match 'window'
+WORD = r'\w+'
+
+# Number of compiled keyword sets kept with the words of the comments, and the lock guarding them
+MATCHER_CACHE_SIZE = 64
+_matchers_lock = threading.Lock()
+
+# Number of user keyword sets whose counts are kept as aggregates, and the cached sets, least recently used first
+KEYWORD_SETS_CACHE_SIZE = 16
+_keyword_sets = OrderedDict()
+_keyword_sets_lock = threading.Lock()
+
+
+####################### TOKENS ###############################
+# Split every comment into lowercase words, stored as integer codes into a vocabulary (one entry per word of
+# the text, in order, with the row position of its comment). This is the only pass over the text: keywords of
+# any set are then matched on the codes.
+def build_comment_tokens(df, vocabulary=None):
+    words = df['comment'].str.lower().str.findall(WORD).reset_index(drop=True).explode().dropna()
+    if vocabulary is None:
+        codes, vocabulary = pd.factorize(words.to_numpy())
+    else:
+        # Known words keep their codes, new words are added at the end of the vocabulary
+        codes = vocabulary.get_indexer(words.to_numpy())
+        new_words = pd.unique(words.to_numpy()[codes < 0])
+        vocabulary = vocabulary.append(pd.Index(new_words))
+        codes[codes < 0] = vocabulary.get_indexer(words.to_numpy()[codes < 0])
+    return {
+        'rows': len(df),
+        'documents': words.index.to_numpy(dtype=np.int32),
+        'codes': np.asarray(codes, dtype=np.int32),
+        'vocabulary': pd.Index(vocabulary),
+        'matchers': OrderedDict(),  # Compiled keyword sets, by keyword set
+    }
+
+
+# Add the words of new comments (numbered after the known ones)
+def update_comment_tokens(tokens, new_rows):
+    new = build_comment_tokens(new_rows, tokens['vocabulary'])
+    return {
+        'rows': tokens['rows'] + new['rows'],
+        'documents': np.concatenate([tokens['documents'], new['documents'] + tokens['rows']]),
+        'codes': np.concatenate([tokens['codes'], new['codes']]),
+        'vocabulary': new['vocabulary'],
+        'matchers': OrderedDict(),  # Compiled against the new vocabulary when needed
+    }
+
+
+# Return the cached words of the Reddit comments (updated with the new rows when comments are appended)
+def get_comment_tokens():
+    return get_aggregate('comment_tokens', 'reddit_comments', build_comment_tokens, updater=update_comment_tokens)
+
+
+####################### KEYWORD MATCHING ###############################
+# Keyword groups typed by users, one group per line as 'name: keyword, keyword, ...' (a line without a name
+# is named after its position). Keywords are lowercased and may be phrases of several words.
+# Returns [(group, keywords)] in the order typed, without empty groups or repeated keywords.
+def parse_keyword_groups(text):
+    groups, seen = [], set()
+    for number, line in enumerate((text or '').splitlines(), start=1):
+        name, _, words = line.rpartition(':')
+        keywords = []
+        for keyword in words.split(','):
+            keyword = ' '.join(re.findall(WORD, keyword.lower()))
+            if keyword and keyword not in seen:
+                seen.add(keyword)
+                keywords.append(keyword)
+        if keywords:
+            groups.append((name.strip() or f"group {number}", keywords))
+    return groups
+
+
+# Compile a keyword set into lookups of the vocabulary of some comment words: the keyword of each single word,
+# and the phrases of several words grouped by their first word. Keywords with a word that never appears in the
+# comments cannot match and are left out. The last MATCHER_CACHE_SIZE keyword sets are kept with the words.
+def compile_matcher(tokens, keywords):
+    matchers = tokens['matchers']
+    with _matchers_lock:
+        if keywords in matchers:
+            matchers.move_to_end(keywords)
+            return matchers[keywords]
+
+    vocabulary = tokens['vocabulary']
+    single = np.full(len(vocabulary) + 1, -1, dtype=np.int64)  # Code -1 (unknown word) looks up the last entry
+    phrases = {}
+    for column, keyword in enumerate(keywords):
+        codes = vocabulary.get_indexer(keyword.split())
+        if (codes < 0).any():
+            continue
+        if len(codes) == 1:
+            single[codes[0]] = column
+        else:
+            phrases.setdefault(codes[0], []).append((column, codes[1:]))
+    matcher = (single, phrases)
+    with _matchers_lock:
+        matchers[keywords] = matcher
+        matchers.move_to_end(keywords)
+        while len(matchers) > MATCHER_CACHE_SIZE:
+            matchers.popitem(last=False)
+    return matcher
+
+
+# Sparse document x keyword matrix of a keyword set (1 when the comment contains the keyword as whole words),
+# matched in one pass over the word codes whatever the number of keywords: single words by an array lookup,
+# phrases by checking the words that follow the occurrences of their first word.
+def match_keywords(tokens, keywords):
+    single, phrases = compile_matcher(tokens, tuple(keywords))
+    codes, documents = tokens['codes'], tokens['documents']
+
+    columns = single[codes]
+    rows, cols = [documents[columns >= 0]], [columns[columns >= 0]]
+    if phrases:
+        first = np.zeros(len(single), dtype=bool)
+        first[list(phrases)] = True
+        starts = np.flatnonzero(first[codes])
+        for first_code, candidates in phrases.items():
+            positions = starts[codes[starts] == first_code]
+            for column, rest in candidates:
+                found = positions[positions + len(rest) < len(codes)]
+                for offset, code in enumerate(rest, start=1):
+                    found = found[(codes[found + offset] == code) & (documents[found + offset] == documents[found])]
+                rows.append(documents[found])
+                cols.append(np.full(len(found), column, dtype=np.int64))
+
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    matrix = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                           shape=(tokens['rows'], len(keywords)))
+    matrix.data[:] = 1  # Count each keyword once per comment, like the original 'word in comment' test
+    return matrix
+
+
+####################### KEYWORD COUNTS ###############################
+# Sparse document x keyword matrix (from the words of the comments, split here unless given) and sparse
+# document x country matrix of some comments
+def build_network_index(df, keywords=KEYWORDS, tokens=None):
+    if tokens is None or tokens['rows'] != len(df):
+        tokens = build_comment_tokens(df)
+    matrix = match_keywords(tokens, keywords)
+
+    # Country codes in order of first appearance, -1 for comments without a country
+    country_codes, countries = pd.factorize(df['Country'])
+    has_country = country_codes >= 0
+    country_matrix = sp.csr_matrix(
+        (np.ones(has_country.sum(), dtype=np.int32), (np.flatnonzero(has_country), country_codes[has_country])),
+        shape=(len(df), len(countries)))
+
+    return {
+        'columns': {keyword: i for i, keyword in enumerate(keywords)},
+        'matrix': matrix.tocsc(),  # Column slicing is the common operation
+        'countries': list(countries),
+        'country_matrix': country_matrix.tocsc(),
+    }
+
+
+# Count the comments containing each keyword and each country, separately for every combination of energy types
+# a comment mentions (a bit mask over 'energies'). Every frequency and co-occurrence of the Network page can be
+# read from these small tables, and the tables of new comments are simply added to them.
+def build_keyword_counts(df, keywords=KEYWORDS, energies=ENERGY_TYPES, tokens=None):
+    index = build_network_index(df, keywords, tokens)
+    bits = 1 << np.arange(len(energies))
+    masks = index['matrix'][:, [index['columns'][energy] for energy in energies]] @ bits
+    by_mask = sp.csr_matrix((np.ones(len(df), dtype=np.int64), (masks, np.arange(len(df)))),
+                            shape=(2 ** len(energies), len(df)))
+    return {
+        'energies': list(energies),
+        'keywords': list(keywords),
+        'countries': index['countries'],  # In order of first appearance
+        'keyword_counts': (by_mask @ index['matrix']).toarray(),
+        'country_counts': (by_mask @ index['country_matrix']).toarray(),
+    }
+
+
+# Add the counts of new comments (new countries are added after the known ones, as in a full build)
+def update_keyword_counts(counts, new_rows):
+    new = build_keyword_counts(new_rows, counts['keywords'], counts['energies'])
+    countries = counts['countries'] + [country for country in new['countries'] if country not in counts['countries']]
+    country_counts = np.zeros((len(counts['country_counts']), len(countries)), dtype=np.int64)
+    country_counts[:, :len(counts['countries'])] = counts['country_counts']
+    country_counts[:, [countries.index(country) for country in new['countries']]] += new['country_counts']
+    return dict(counts, countries=countries, country_counts=country_counts,
+                keyword_counts=counts['keyword_counts'] + new['keyword_counts'])
+
+
+# Return the cached keyword counts of the Reddit comments for the energy types and some keywords (the default
+# keywords of the page unless given), updated with the new rows when comments are appended. Each keyword set
+# is matched on the cached words of the comments once, then kept like the other aggregates; only the counts of
+# the last KEYWORD_SETS_CACHE_SIZE user keyword sets are kept.
+def get_keyword_counts(keywords=None):
+    if keywords is None:
+        return get_aggregate('keyword_counts', 'reddit_comments',
+                             lambda df: build_keyword_counts(df, tokens=get_comment_tokens()),
+                             updater=update_keyword_counts)
+    keywords = list(dict.fromkeys(ENERGY_TYPES + list(keywords)))
+    with _keyword_sets_lock:
+        _keyword_sets[tuple(keywords)] = True
+        _keyword_sets.move_to_end(tuple(keywords))
+        while len(_keyword_sets) > KEYWORD_SETS_CACHE_SIZE:
+            discard_aggregate(('keyword_counts', _keyword_sets.popitem(last=False)[0]))
+    return get_aggregate(('keyword_counts', tuple(keywords)), 'reddit_comments',
+                         lambda df: build_keyword_counts(df, keywords, tokens=get_comment_tokens()),
+                         updater=update_keyword_counts)
+
+
+# Compute the node frequencies and edges of the network graph from the keyword counts:
+# - comments mentioning at least one of the selected energy types are kept,
+# - keyword frequencies are the number of kept comments containing each keyword,
+# - an energy type is linked to a country or a word when they appear in the same comment.
+def keyword_cooccurrence(counts, energies, words):
+    columns = {keyword: i for i, keyword in enumerate(counts['keywords'])}
+    bits = {energy: 1 << i for i, energy in enumerate(counts['energies'])}
+    masks = np.arange(len(counts['keyword_counts']))
+    keyword_counts, country_counts = counts['keyword_counts'], counts['country_counts']
+    kept = (masks & sum(bits[energy] for energy in energies)) > 0
+
+    energy_frequency = {energy: int(keyword_counts[:, columns[energy]].sum()) for energy in energies}
+    word_frequency = {word: int(keyword_counts[kept, columns[word]].sum()) for word in words}
+    countries = [country for country, count in zip(counts['countries'], country_counts[kept].sum(axis=0)) if count > 0]
+
+    with_energy = {energy: (masks & bits[energy]) > 0 for energy in energies}
+    edges = [(energy, country) for energy in energies
+             for country, count in zip(counts['countries'], country_counts[with_energy[energy]].sum(axis=0)) if count > 0]
+    edges += [(energy, word) for energy in energies for word in words
+              if keyword_counts[with_energy[energy], columns[word]].sum() > 0]
+
+    return energy_frequency, word_frequency, countries, edges
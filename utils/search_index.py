@@ -0,0 +1,206 @@
+import argparse  # Import argparse for the command line interface
+import os  # Import os to read the configuration from the environment
+import re  # Import re to split the search text into words and phrases
+import sqlite3  # Import sqlite3 for the FTS5 full-text index
+import threading  # Import threading for per-thread SQLite connections
+import time  # Import time to report the build time
+import pandas as pd  # Import pandas to recognise missing values
+from utils.data_store import ASSETS_DIR, dataset_changes, format_dates  # Import the shared dataset registry
+
+# Dataset whose comments are indexed (the one of the Dataset Explorer), and its facet columns
+DATASET = 'energy_column_data'
+FACETS = ['country', 'energy_source', 'sentiment']
+STORED = ['comment_date']  # Shown with the results
+
+# SQLite database file of the index (persistent, shared by every process of the host)
+INDEX_PATH = os.environ.get('G21_SEARCH_PATH', os.path.join(ASSETS_DIR, 'search_index.sqlite'))
+
+# Rows inserted per statement batch while the index is built
+BATCH_ROWS = 50_000
+
+# Snippet markers, replaced by Markdown bold once the text around them is escaped
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+# Per-thread SQLite connections
+_local = threading.local()
+
+
+####################### INDEX ###############################
+# SQLite connection of the current thread, creating the index tables on first use (not reused after a fork)
+def _connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None or getattr(_local, 'pid', None) != os.getpid():
+        connection = sqlite3.connect(INDEX_PATH, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # The row id of a comment is its row position in the dataset. Its facet values are indexed as tokens
+        # ('f0v3': value 3 of facet 0), so a facet filter narrows the match before ranking. Porter stemming lets
+        # 'panels' match 'panel'.
+        connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS comments USING fts5(comment, facets, "
+                           "tokenize='porter unicode61 remove_diacritics 2')")
+        connection.execute('CREATE TABLE IF NOT EXISTS facet_values (facet TEXT, value TEXT, token TEXT, '
+                           'PRIMARY KEY (facet, value))')
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        _local.connection = connection
+        _local.pid = os.getpid()
+    return connection
+
+
+# Read the version of the dataset the index was built from and its number of rows
+def _indexed_state(connection):
+    meta = dict(connection.execute('SELECT key, value FROM meta').fetchall())
+    return meta.get('version'), int(meta.get('rows', 0))
+
+
+# Tokens of the facet values: {(facet, value): token}
+def _facet_tokens(connection):
+    return {(facet, value): token for facet, value, token in connection.execute('SELECT * FROM facet_values')}
+
+
+# Token of each row's value of a facet column, adding a token for values not seen before (None when missing)
+def _facet_column_tokens(connection, tokens, column, values):
+    facet = FACETS.index(column)
+    for value in values.dropna().unique():
+        if (column, str(value)) not in tokens:
+            token = f"f{facet}v{sum(1 for key in tokens if key[0] == column)}"
+            tokens[(column, str(value))] = token
+            connection.execute('INSERT INTO facet_values VALUES (?, ?, ?)', (column, str(value), token))
+    return [None if pd.isna(value) else tokens[(column, str(value))] for value in values]
+
+
+# Insert rows of the dataset, numbered from their position 'start'
+def _insert_rows(connection, rows, start):
+    tokens = _facet_tokens(connection)
+    for offset in range(0, len(rows), BATCH_ROWS):
+        chunk = rows.iloc[offset:offset + BATCH_ROWS]
+        facet_tokens = zip(*[_facet_column_tokens(connection, tokens, column, chunk[column]) for column in FACETS])
+        comments = [None if pd.isna(comment) else str(comment) for comment in chunk['comment']]
+        connection.executemany('INSERT INTO comments (rowid, comment, facets) VALUES (?, ?, ?)',
+                               zip(range(start + offset, start + offset + len(chunk)), comments,
+                                   (' '.join(token for token in row if token) for row in facet_tokens)))
+
+
+# True when the last indexed row is still the same row of the dataset (the file was only appended to)
+def _same_prefix(connection, df, rows):
+    if rows == 0 or rows > len(df):
+        return rows == 0
+    indexed = connection.execute('SELECT comment FROM comments WHERE rowid = ?', (rows - 1,)).fetchone()
+    value = df['comment'].iloc[rows - 1]
+    return indexed is not None and indexed[0] == (None if pd.isna(value) else str(value))
+
+
+# Bring the index up to date with the dataset: new rows appended to the file are added, anything else
+# rebuilds the index. Cheap when nothing changed (a file stat and one query), so it runs before each search.
+# Returns the frame the index now matches and the number of rows added.
+def update_index():
+    connection = _connection()
+    version, df, _ = dataset_changes(DATASET, None)  # Current version and frame, read together
+    if _indexed_state(connection)[0] == version:
+        return df, 0
+    connection.execute('BEGIN IMMEDIATE')  # One writer at a time; the others wait and find the index updated
+    try:
+        indexed_version, rows = _indexed_state(connection)
+        added = 0
+        if indexed_version != version:
+            _, _, new_rows = dataset_changes(DATASET, indexed_version)
+            if new_rows is None and _same_prefix(connection, df, rows):
+                new_rows = df.iloc[rows:]
+            if new_rows is None:
+                connection.execute('DELETE FROM comments')
+                connection.execute('DELETE FROM facet_values')
+                new_rows, rows = df, 0
+            _insert_rows(connection, new_rows, rows)
+            added = len(new_rows)
+            connection.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                   [('version', version), ('rows', str(rows + added))])
+        connection.execute('COMMIT')
+        return df, added
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+
+
+####################### SEARCH ###############################
+# FTS5 query of the search text: every word and "quoted phrase" must appear in the comment (a trailing * matches
+# prefixes, also after a phrase). Terms are quoted so FTS5 operators typed by users are searched as plain words.
+# None without terms.
+def build_match_query(text):
+    terms = []
+    for phrase, star, word in re.findall(r'"([^"]*)"(\*?)|(\S+)', text or ''):
+        tokens = re.findall(r'\w+', phrase or word)
+        if not tokens:
+            continue
+        term = '"' + ' '.join(tokens) + '"'
+        terms.append(term + '*' if star or word.endswith('*') else term)
+    return f"comment : ({' '.join(terms)})" if terms else None
+
+
+# Escape the Markdown characters of a snippet and mark the matched terms in bold
+def _snippet_markdown(snippet):
+    text = re.sub(r'([\\`*_{}\[\]()#+\-.!|<>])', r'\\\1', snippet or '')
+    return text.replace(_MARK_START, '**').replace(_MARK_END, '**')
+
+
+# Match count of every value of each facet among the matching rows, each facet counted with the other facets
+# applied (what selecting one of its values would give), and the number of matches with every facet applied.
+# Each count is an FTS5 count(*) of the match and the facet value tokens, read from the index only, so no row of
+# the matches comes back from SQLite.
+def _facet_counts(connection, match_query, rows, filters):
+    tokens = _facet_tokens(connection)
+    selected = {column: f'facets : "{tokens.get((column, str(filters[column])), "none")}"' for column in FACETS
+                if filters.get(column) not in (None, '', 'All')}
+
+    # Number of matches of the search and some facet terms
+    def count(terms):
+        return connection.execute('SELECT count(*) FROM comments WHERE comments MATCH ? AND rowid < ?',
+                                  (' AND '.join([match_query] + terms), rows)).fetchone()[0]
+
+    facets = {}
+    for column in FACETS:
+        others = [term for other, term in selected.items() if other != column]
+        counts = [(value, count(others + [f'facets : "{token}"'])) for (facet, value), token in tokens.items()
+                  if facet == column]
+        facets[column] = sorted([item for item in counts if item[1]], key=lambda item: (-item[1], item[0]))
+    return facets, count(list(selected.values()))
+
+
+# Search the comments: best matches first (BM25 on the comment text), 'limit' results from 'offset', with
+# highlighted snippets, the total number of matches and the match counts of the facet values
+def search(text, filters=None, limit=25, offset=0):
+    start = time.perf_counter()
+    filters = filters or {}
+    match_query = build_match_query(text)
+    if match_query is None:
+        return {'total': 0, 'rows': [], 'facets': {column: [] for column in FACETS}, 'seconds': 0.0}
+    df, _ = update_index()
+    connection = _connection()
+
+    # Total and facet counts of the matches (no ranking needed), counted in SQLite
+    facets, total = _facet_counts(connection, match_query, len(df), filters)
+
+    # Ranked page of results, the facet filters being part of the match so only those rows are ranked
+    tokens = _facet_tokens(connection)
+    facet_terms = [f'"{tokens.get((column, str(filters[column])), "none")}"' for column in FACETS
+                   if filters.get(column) not in (None, '', 'All')]
+    query = ' AND '.join([match_query] + [f'facets : {term}' for term in facet_terms])
+    rows = connection.execute(
+        f"SELECT rowid, snippet(comments, 0, '{_MARK_START}', '{_MARK_END}', '…', 16) FROM comments "
+        "WHERE comments MATCH ? ORDER BY bm25(comments, 1.0, 0.0) LIMIT ? OFFSET ?",
+        (query, limit, offset)).fetchall()
+
+    details = format_dates(DATASET, df.iloc[[row_id for row_id, _ in rows if row_id < len(df)]])
+    results = [dict(row=row_id, snippet=_snippet_markdown(snippet),
+                    **{column: details[column].iloc[i] for column in FACETS + STORED})
+               for i, (row_id, snippet) in enumerate(row for row in rows if row[0] < len(df))]
+    return {'total': total, 'rows': results, 'facets': facets, 'seconds': time.perf_counter() - start}
+
+
+# Command line entry point: python -m utils.search_index (builds or updates the index)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or update the full-text index of the comments.")
+    parser.add_argument('--rebuild', action='store_true', help="Drop the index and index every comment again")
+    args = parser.parse_args()
+    if args.rebuild and os.path.exists(INDEX_PATH):
+        _connection().executescript('DELETE FROM comments; DELETE FROM facet_values; DELETE FROM meta;')
+    start = time.perf_counter()
+    _, rows = update_index()
+    print(f"Indexed {rows} new comments of {DATASET} in {time.perf_counter() - start:.1f} s ({INDEX_PATH})")
@@ -0,0 +1,109 @@
+import argparse  # Import argparse for the command line interface
+import hashlib  # Import hashlib to key the scores by comment content
+import os  # Import os for file paths and CPU count
+from concurrent.futures import ProcessPoolExecutor  # Import the process pool used to score in parallel
+import pandas as pd  # Import pandas for data manipulation
+from utils.data_store import ASSETS_DIR, get_dataset  # Import the shared dataset registry
+from utils.aggregates import get_aggregate  # Import the cache of pre-computed aggregates
+
+# File holding the VADER compound score of every comment, keyed by a hash of the comment text
+SCORES_PATH = os.path.join(ASSETS_DIR, 'reddit_comments_vader.parquet')
+
+# Folder with the bundled NLTK data, searched before the default NLTK folders. The VADER lexicon is bundled
+# once with 'python -m nltk.downloader -d nltk_data vader_lexicon', so no download is needed at run time.
+NLTK_DATA_DIR = os.environ.get('G21_NLTK_DATA', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nltk_data'))
+
+# Number of comments sent to a worker process at a time
+BATCH_SIZE = 2000
+
+# Sentiment analyzer of the current worker process (created once per process by _init_worker)
+_sia = None
+
+
+# Hash of a comment text; missing comments hash like an empty comment (scored as neutral)
+def comment_hash(comment):
+    text = '' if pd.isna(comment) else str(comment)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# Create the VADER analyzer from the bundled lexicon (never downloads anything, so it works on air-gapped hosts)
+def create_analyzer():
+    import nltk  # Imported here so the pages never load NLTK
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    try:
+        return SentimentIntensityAnalyzer()
+    except LookupError:
+        raise LookupError(f"VADER lexicon not found. Bundle it with "
+                          f"'python -m nltk.downloader -d {NLTK_DATA_DIR} vader_lexicon'") from None
+
+
+# Initialise a worker process of the pool
+def _init_worker():
+    global _sia
+    _sia = create_analyzer()
+
+
+# Score a batch of comments in a worker process
+def _score_batch(comments):
+    return [_sia.polarity_scores(comment)['compound'] if comment else 0.0 for comment in comments]
+
+
+# Score comments with VADER across a pool of processes and return their compound scores
+def score_comments(comments, processes=None):
+    comments = ['' if pd.isna(comment) else str(comment) for comment in comments]
+    batches = [comments[i:i + BATCH_SIZE] for i in range(0, len(comments), BATCH_SIZE)]
+    scores = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+        for batch_scores in pool.map(_score_batch, batches):
+            scores.extend(batch_scores)
+    return scores
+
+
+# Read the stored scores as a {hash: compound} Series (empty when nothing has been scored yet)
+def read_scores(path=SCORES_PATH):
+    if not os.path.exists(path):
+        return pd.Series(dtype='float64', name='compound')
+    stored = pd.read_parquet(path)
+    return pd.Series(stored['compound'].to_numpy(), index=stored['hash'], name='compound')
+
+
+# Score the comments of a dataset that are not stored yet (new or changed comments) and save all scores.
+# Scores of comments that are no longer in the dataset are dropped.
+def update_scores(dataset='reddit_comments', path=SCORES_PATH, processes=None):
+    hashes = get_dataset(dataset)['comment'].map(comment_hash)
+    stored = read_scores(path)
+
+    missing = ~hashes.isin(stored.index)
+    new_comments = get_dataset(dataset)['comment'][missing].drop_duplicates()
+    if len(new_comments):
+        new_scores = pd.Series(score_comments(new_comments, processes), index=hashes[new_comments.index])
+        stored = pd.concat([stored, new_scores])
+
+    stored = stored[stored.index.isin(hashes)]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pd.DataFrame({'hash': stored.index, 'compound': stored.to_numpy()}).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)  # Replace the file atomically so pages never read a partial file
+    return len(new_comments), len(stored)
+
+
+# Look up the stored score of every comment of the Reddit dataset (NaN for comments not scored yet)
+def build_comment_scores(df):
+    stored = read_scores()
+    return df['comment'].map(comment_hash).map(stored).rename('sentiment')
+
+
+# Return the cached VADER scores of the Reddit comments, aligned with the rows of the dataset
+def get_comment_scores():
+    scores_version = os.stat(SCORES_PATH).st_mtime_ns if os.path.exists(SCORES_PATH) else None
+    return get_aggregate('comment_scores', 'reddit_comments', build_comment_scores, scores_version)
+
+
+# Command line entry point: python -m utils.sentiment_scores [--processes N]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score new or changed Reddit comments with VADER.")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="Number of worker processes")
+    args = parser.parse_args()
+    scored, total = update_scores(processes=args.processes)
+    print(f"Scored {scored} new comments, {total} scores stored in {SCORES_PATH}")
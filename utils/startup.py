@@ -0,0 +1,90 @@
+import os  # Import os to read the configuration from the environment
+import threading  # Import threading for the background warm-up
+import time  # Import time to measure the startup steps
+from contextlib import contextmanager  # Import contextmanager for the import timer
+from importlib.machinery import SourceFileLoader  # Import the loader Dash uses to import the pages
+from utils.memory_report import format_memory_report  # Import the memory report printed after the warm-up
+
+# Set G21_WARMUP=0 to load the data only when a page first needs it (no background warm-up)
+WARMUP_ENABLED = os.environ.get('G21_WARMUP', '1') != '0'
+
+# Set G21_STARTUP_REPORT=1 to print the startup timing report
+REPORT_ENABLED = os.environ.get('G21_STARTUP_REPORT', '0') == '1'
+
+# Warm-up steps registered by the pages: [(page, step name, function)]
+_warmup_steps = []
+
+# Timings of the startup: import time of each page and duration of each warm-up step (in seconds)
+_report = {'imports': {}, 'warmup': {}, 'warmup_errors': {}}
+_warmup_thread = None
+
+
+# Register a function loading data of a page in the background after startup (pages call this at import)
+def register_warmup(page, name, func):
+    _warmup_steps.append((page, name, func))
+
+
+# Measure the import time of every module of the 'pages' package imported inside the 'with' block
+@contextmanager
+def time_page_imports():
+    original = SourceFileLoader.exec_module
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            return original(self, module)
+        finally:
+            if module.__name__.startswith('pages.'):
+                _report['imports'][module.__name__] = time.perf_counter() - start
+
+    SourceFileLoader.exec_module = exec_module
+    try:
+        yield _report['imports']
+    finally:
+        SourceFileLoader.exec_module = original
+
+
+# Run every registered warm-up step, one after the other, recording how long each one takes
+def run_warmup():
+    for page, name, func in _warmup_steps:
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            _report['warmup_errors'][f"{page}.{name}"] = str(e)  # The page will load the data (or fail) when used
+        _report['warmup'][f"{page}.{name}"] = time.perf_counter() - start
+    if REPORT_ENABLED:
+        print(format_warmup_report())
+        print(format_memory_report())
+
+
+# Start the warm-up in a daemon thread so the server can answer requests immediately
+def start_warmup():
+    global _warmup_thread
+    if WARMUP_ENABLED and _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=run_warmup, name='g21-warmup', daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+
+# Copy of the startup timings
+def startup_report():
+    return {key: dict(values) for key, values in _report.items()}
+
+
+# Text version of the startup report, slowest page first
+def format_startup_report():
+    lines = ['Page import times:']
+    for page, seconds in sorted(_report['imports'].items(), key=lambda item: -item[1]):
+        lines.append(f"  {page:<30} {seconds * 1000:8.1f} ms")
+    lines.append(f"  {'total':<30} {sum(_report['imports'].values()) * 1000:8.1f} ms")
+    return '\n'.join(lines)
+
+
+# Text version of the warm-up timings
+def format_warmup_report():
+    lines = ['Warm-up times:']
+    for step, seconds in _report['warmup'].items():
+        error = _report['warmup_errors'].get(step)
+        lines.append(f"  {step:<30} {seconds * 1000:8.1f} ms" + (f"  (failed: {error})" if error else ''))
+    return '\n'.join(lines)
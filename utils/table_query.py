@@ -0,0 +1,241 @@
+import io  # Import io for the buffer of the Parquet writer
+import zlib  # Import zlib for the gzip-compressed exports
+from functools import lru_cache  # Import lru_cache to keep the row order of recently used table views
+import numpy as np  # Import numpy for row index arrays
+import pandas as pd  # Import pandas for the column types
+from utils.data_store import DATASETS, format_dates, get_dataset, dataset_version  # Import the shared dataset registry
+from utils.metrics import phase  # Import the timer of the callback data-access phase
+
+# Number of rows converted at a time by an export: the memory of an export does not grow with its size
+EXPORT_CHUNK_ROWS = 10_000
+
+# Export formats: {format: (file extension, MIME type)}
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Filter operators of the Dash DataTable query language, longest first so 'ge' wins over 'gt' etc.
+OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='],
+             ['contains '], ['datestartswith ']]
+
+
+# Split a DataTable filter query into its parts (joined by ' && '), leaving quoted values whole
+def split_filter_query(filter_query):
+    parts, start, quote, i = [], 0, None, 0
+    while i < len(filter_query):
+        char = filter_query[i]
+        if quote:
+            if char == '\\':
+                i += 1  # Escaped character
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+        elif filter_query.startswith(' && ', i):
+            parts.append(filter_query[start:i])
+            start = i = i + 4
+            continue
+        i += 1
+    return parts + [filter_query[start:]]
+
+
+# Split one part of a DataTable filter query (e.g. "{country} eq 'UK'") into column, operator and value.
+# The operator is the one following the column name, so operators inside the value are left alone. Its case
+# prefix ('i' or 's', e.g. 'icontains', set by the case toggle of the filter cells) is ignored. The value is
+# kept as text (numbers are read by the comparisons of numeric columns, see _condition).
+def split_filter_part(filter_part):
+    name_start, name_end = filter_part.find('{'), filter_part.find('}')
+    if name_start < 0 or name_end < name_start:
+        return [None] * 3
+    name = filter_part[name_start + 1:name_end]
+    rest = filter_part[name_end + 1:].lstrip()
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            prefix = next((prefix for prefix in ('', 'i', 's') if rest.startswith(prefix + operator)), None)
+            if prefix is not None:
+                value_part = rest[len(prefix + operator):].strip()
+                v0 = value_part[0] if value_part else ''
+                if len(value_part) > 1 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + v0, v0)  # Quoted value
+                else:
+                    value = value_part
+                return name, operator_type[0].strip(), value
+    return [None] * 3
+
+
+# Boolean array of the values matching one filter condition, or None for an unknown operator
+def _condition(values, operator, filter_value):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return _date_condition(values, operator, filter_value)
+    if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+        # Compare numeric columns with the number of the value (NaN, matching nothing, when it is not a number)
+        # and text columns with its text
+        if pd.api.types.is_numeric_dtype(values):
+            filter_value = pd.to_numeric(filter_value, errors='coerce')
+        part = getattr(values, operator)(filter_value)
+    elif operator in ('contains', 'datestartswith'):
+        text = values.astype(str) if values.dtype == object else values
+        if operator == 'contains':
+            part = text.str.contains(str(filter_value), case=False, regex=False)
+        else:
+            part = text.str.startswith(str(filter_value))
+    else:
+        return None
+    return part.fillna(False).to_numpy(dtype=bool)
+
+
+# Boolean array of the dates matching one filter condition. Comparisons parse the value as a date (day first,
+# like the dates shown; ISO dates and years work too); text operators match the dates as shown ('date_format').
+# The condition is evaluated once per distinct date, then looked up by the row codes.
+def _date_condition(values, operator, filter_value, date_format='%Y-%m-%d'):
+    codes, dates = pd.factorize(values)
+    if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+        filter_value = pd.to_datetime(str(filter_value), dayfirst=True, errors='coerce')
+        if pd.isna(filter_value):
+            return np.zeros(len(values), dtype=bool) if operator != 'ne' else np.ones(len(values), dtype=bool)
+        part = getattr(pd.Series(dates), operator)(filter_value).to_numpy(dtype=bool)
+    elif operator in ('contains', 'datestartswith'):
+        text = pd.Series(dates.strftime(date_format))
+        if operator == 'contains':
+            part = text.str.contains(str(filter_value), case=False, regex=False).to_numpy(dtype=bool)
+        else:
+            part = text.str.startswith(str(filter_value)).to_numpy(dtype=bool)
+    else:
+        return None
+    return np.append(part, operator == 'ne')[codes]  # Code -1 (missing date) only matches 'ne'
+
+
+# Build the boolean row mask of a filter query with vectorised pandas comparisons.
+# On a categorical column the condition is evaluated once per category, then looked up by the row codes.
+# 'date_formats' gives the format dates are shown in ({column: format}), which text operators match.
+def filter_mask(df, filter_query, date_formats=None):
+    mask = np.ones(len(df), dtype=bool)
+    if not filter_query:
+        return mask
+
+    for filter_part in split_filter_query(filter_query):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue  # Ignore filters on unknown columns instead of failing the request
+        column = df[col_name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            part = _condition(pd.Series(column.cat.categories), operator, filter_value)
+            if part is not None:
+                part = np.append(part, False)[column.cat.codes.to_numpy()]  # Code -1 (missing) picks False
+        elif col_name in (date_formats or {}):
+            part = _date_condition(column, operator, filter_value, date_formats[col_name])
+        else:
+            part = _condition(column, operator, filter_value)
+        if part is not None:
+            mask &= part
+    return mask
+
+
+# Positions of the rows of a filtered and sorted view of a dataset.
+# Kept for the few most recent views so moving between pages of the same view only slices this array.
+@lru_cache(maxsize=16)
+def _view_index(name, version, filter_query, sort_key):
+    df = get_dataset(name)
+    index = np.flatnonzero(filter_mask(df, filter_query, DATASETS[name].get('dates')))
+    if sort_key:
+        columns = [column for column, _ in sort_key if column in df.columns]
+        ascending = [direction == 'asc' for column, direction in sort_key if column in df.columns]
+        if columns:
+            # Only the sort columns are copied, the order of their rows then indexes the filtered positions
+            order = df[columns].iloc[index].reset_index(drop=True).sort_values(
+                columns, ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+            index = index[order]
+    return index
+
+
+# Sort key of a DataTable sort_by property (a list of {'column_id', 'direction'}), ValueError when malformed
+def _sort_key(sort_by):
+    if not isinstance(sort_by, (list, tuple)):
+        raise ValueError(f'sort_by must be a list, not {sort_by!r}')
+    for item in sort_by:
+        if not (isinstance(item, dict) and isinstance(item.get('column_id'), str)
+                and item.get('direction') in ('asc', 'desc')):
+            raise ValueError(f"Invalid sort_by item {item!r} (expected {{'column_id': ..., 'direction': 'asc'}})")
+    return tuple((item['column_id'], item['direction']) for item in sort_by)
+
+
+# Positions of the rows matching the DataTable filter query, in the order given by its sort_by property
+def view_index(name, filter_query=None, sort_by=None):
+    return _view_index(name, dataset_version(name), filter_query or '', _sort_key(sort_by or []))
+
+
+# Return one page of a filtered and sorted view as DataTable records, with the total number of pages
+def get_page(name, page_current, page_size, filter_query=None, sort_by=None):
+    with phase('data'):
+        index = view_index(name, filter_query, sort_by)
+        start = page_current * page_size
+        page = format_dates(name, get_dataset(name).iloc[index[start:start + page_size]])
+        page_count = max(1, -(-len(index) // page_size))  # Ceiling division
+    return page.to_dict('records'), page_count, len(index)
+
+
+####################### EXPORT ###############################
+# Rows of a filtered and sorted view, EXPORT_CHUNK_ROWS at a time (only the row positions of the whole view are
+# kept, never a copy of its rows). An empty view gives one empty chunk, so the export still has its header.
+# With 'text_dates', dates are written in the format of the dataset file (CSV), otherwise kept as datetimes.
+def _view_chunks(name, index, text_dates=False):
+    df = get_dataset(name)
+    for start in range(0, max(len(index), 1), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[index[start:start + EXPORT_CHUNK_ROWS]]
+        yield format_dates(name, chunk) if text_dates else chunk
+
+
+# CSV bytes of the chunks, with the header line in the first one
+def _csv_stream(chunks):
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+# Gzip-compressed CSV bytes of the chunks
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for data in _csv_stream(chunks):
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# Parquet bytes of the chunks, one row group per chunk, passed on as soon as each row group is written
+def _parquet_stream(name, chunks):
+    import pyarrow as pa  # Optional dependency, the Parquet export is not available without it
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(get_dataset(name).head(0), preserve_index=False)
+    # Text columns have no type in an empty frame; declare them as strings
+    schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                        for field in schema], metadata=schema.metadata)
+    buffer = io.BytesIO()
+    writer = pq.ParquetWriter(buffer, schema)
+    for chunk in chunks:
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    writer.close()
+    yield buffer.getvalue()
+
+
+# Export a filtered and sorted view of a dataset (same DataTable filter query and sort_by as the table) as a
+# stream of bytes in one of EXPORT_FORMATS. Rows are converted chunk by chunk while the response is sent.
+# The filter and sort are applied here, so a malformed query fails before the response starts (ValueError).
+def export_view(name, export_format, filter_query=None, sort_by=None):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r} (one of: {', '.join(EXPORT_FORMATS)})")
+    index = view_index(name, filter_query, sort_by)
+    chunks = _view_chunks(name, index, text_dates=export_format != 'parquet')
+    if export_format == 'csv':
+        return _csv_stream(chunks)
+    if export_format == 'csv.gz':
+        return _gzip_stream(chunks)
+    import pyarrow.parquet  # noqa: F401 Fail before the response starts when pyarrow is missing
+    return _parquet_stream(name, chunks)
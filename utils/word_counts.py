@@ -0,0 +1,105 @@
+import numpy as np  # Import numpy for vector operations
+import pandas as pd  # Import pandas for data manipulation
+import scipy.sparse as sp  # Import scipy sparse matrices for the comment x word count matrix
+from utils.aggregates import get_aggregate  # Import the cache of pre-computed aggregates
+from utils.data_store import get_dataset  # Import the shared dataset registry
+from utils.network_index import build_comment_tokens  # Import the split of the comments into word codes
+
+# Dataset whose comments are counted, and the columns its word frequencies can be filtered by
+DATASET = 'energy_column_data'
+FILTERS = ['country', 'energy_source', 'sentiment']
+DATE_COLUMN = 'comment_date'
+
+# Number of words given to the word cloud
+CLOUD_WORDS = 200
+
+
+# Words left out of the frequencies: common English words (the stop words of the word cloud) and words of a
+# single character or only digits
+def _ignored_words(vocabulary):
+    from wordcloud import STOPWORDS  # Import the stop words here, they are only needed when the counts are built
+    words = pd.Series(vocabulary, dtype=object)
+    return (words.isin(STOPWORDS) | (words.str.len() < 2) | words.str.isdigit()).to_numpy()
+
+
+# Count the words of every comment once into a sparse comment x word matrix over a vocabulary shared by all
+# comments. The frequencies of any subset of comments are then the sum of its rows.
+def build_word_counts(df, vocabulary=None):
+    tokens = build_comment_tokens(df, vocabulary)
+    matrix = sp.csr_matrix((np.ones(len(tokens['codes']), dtype=np.int32), (tokens['documents'], tokens['codes'])),
+                           shape=(tokens['rows'], len(tokens['vocabulary'])))
+    matrix.sum_duplicates()
+    return {
+        'matrix': matrix,
+        'vocabulary': tokens['vocabulary'],
+        'ignored': _ignored_words(tokens['vocabulary']),
+        'totals': np.asarray(matrix.sum(axis=0)).ravel(),  # Frequencies of all comments
+    }
+
+
+# Add the rows of new comments (words not seen before are added at the end of the vocabulary)
+def update_word_counts(counts, new_rows):
+    new = build_word_counts(new_rows, counts['vocabulary'])
+    matrix = counts['matrix'].copy()
+    matrix.resize((matrix.shape[0], len(new['vocabulary'])))
+    totals = np.zeros(len(new['vocabulary']), dtype=counts['totals'].dtype)
+    totals[:len(counts['totals'])] = counts['totals']
+    return {
+        'matrix': sp.vstack([matrix, new['matrix']], format='csr'),
+        'vocabulary': new['vocabulary'],
+        'ignored': new['ignored'],
+        'totals': totals + new['totals'],
+    }
+
+
+# Return the cached word counts of the comments (updated with the new rows when comments are appended)
+def get_word_counts():
+    return get_aggregate('word_counts', DATASET, build_word_counts, updater=update_word_counts)
+
+
+# Boolean mask of the comments matching the filters ({column: value}, 'All' or None for every value) and the
+# year range [first, last], or None when nothing is filtered. Read from the categorical codes of the dataset.
+def filter_rows(df, filters=None, years=None):
+    mask = None
+    for column, value in (filters or {}).items():
+        if value in (None, '', 'All'):
+            continue
+        categories = df[column].cat.categories
+        code = categories.get_loc(value) if value in categories else -2
+        selected = df[column].cat.codes.to_numpy() == code
+        mask = selected if mask is None else mask & selected
+    if years:
+        row_years = df[DATE_COLUMN].dt.year.to_numpy(dtype=float)  # NaN for missing dates
+        selected = (row_years >= years[0]) & (row_years <= years[1])
+        mask = selected if mask is None else mask & selected
+    return mask
+
+
+# Frequencies of the words of the comments matching the filters: the sum of their rows of the count matrix
+# (the pre-computed totals when nothing is filtered), the top 'limit' words by a partial sort. Returns a frame
+# of words and frequencies, most frequent first.
+def word_frequencies(filters=None, years=None, limit=CLOUD_WORDS):
+    counts = get_word_counts()
+    df = get_dataset(DATASET)
+    mask = filter_rows(df, filters, years)
+    if mask is None:
+        frequencies = counts['totals'].copy()
+    else:
+        rows = np.flatnonzero(mask[:counts['matrix'].shape[0]])
+        frequencies = np.asarray(counts['matrix'][rows].sum(axis=0)).ravel()
+    frequencies[counts['ignored']] = 0
+
+    top = np.flatnonzero(frequencies)
+    if len(top) > limit:
+        top = top[np.argpartition(frequencies[top], -limit)[-limit:]]
+    words = counts['vocabulary'].to_numpy()[top]
+    order = np.lexsort((words, -frequencies[top]))
+    return pd.DataFrame({'word': words[order], 'frequency': frequencies[top][order]})
+
+
+# Values of the filters of the page ({column: values}) and the range of years of the comments
+def filter_choices():
+    df = get_dataset(DATASET)
+    choices = {column: [str(value) for value in df[column].cat.categories] for column in FILTERS}
+    years = df[DATE_COLUMN].dt.year.dropna()
+    return choices, (int(years.min()), int(years.max())) if len(years) else (2018, 2024)
@@ -0,0 +1,19 @@
+import gc  # Import gc to freeze the objects loaded before the workers are forked
+import os  # Import os to read the configuration from the environment
+
+# The data is loaded here, before the server forks its workers, instead of in a background thread of every worker
+os.environ['G21_WARMUP'] = '0'
+
+from app import app  # Import the Dash app (registers every page)
+from utils.startup import run_warmup  # Import the warm-up of the page data
+
+# Set G21_PRELOAD=0 to let every worker load the data on first use instead
+if os.environ.get('G21_PRELOAD', '1') != '0':
+    # Load all datasets and pre-computed aggregates once in the master process; the forked workers share
+    # these memory pages copy-on-write instead of each parsing the CSV files
+    run_warmup()
+    # Keep the garbage collector away from the loaded objects, so it does not write to (and copy) the shared pages
+    gc.freeze()
+
+# WSGI application for the production server, e.g. 'gunicorn -c gunicorn.conf.py'
+server = app.server